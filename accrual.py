@@ -0,0 +1,149 @@
+"""Daily profit accrual for active investments.
+
+An active investment earns its plan's profit_amount linearly over
+duration_days, counted from activated_at. A run accrues every active
+investment up to the start of the current UTC day (the end of the last whole
+period) in one set-based transaction:
+
+  1. one INSERT ... SELECT computes each investment's scheduled profit and
+     keeps only the rows where it exceeds what the engine has accrued so far
+     (a temp table);
+  2. the per-user sums are posted to the ledger (moving users.balance) and
+     added to user_portfolio.accrued_profit;
+  3. investments.current_profit is set to the scheduled profit plus the
+     admin adjustments;
+  4. an accrual_runs row for the period records rows, users, amount and duration.
+
+The accrual_runs row is written in the same transaction and keyed by period,
+so a period is applied at most once. Because targets are absolute, a re-run
+would add nothing anyway. Admin edits are kept apart in
+investments.profit_adjustment (current_profit = engine-accrued profit +
+adjustment), so an admin correction, up or down, is never accrued away.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import db
+import ledger
+import portfolio
+
+CHECK_INTERVAL = float(os.environ.get('ACCRUAL_CHECK_INTERVAL', 3600))
+
+RUNS_DDL = '''CREATE TABLE IF NOT EXISTS accrual_runs (
+    period TEXT PRIMARY KEY,
+    as_of TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    investments INTEGER NOT NULL DEFAULT 0,
+    users INTEGER NOT NULL DEFAULT 0,
+    amount REAL NOT NULL DEFAULT 0,
+    duration REAL
+)'''
+
+# Scheduled profit as of :as_of, rounded to cents, for active investments whose
+# plan has a duration. `accrued` is the engine's share of current_profit; only
+# rows that would move are kept, and `target` is the new current_profit.
+_BATCH_SQL = '''INSERT INTO temp.accrual_batch (investment_id, user_id, target, delta)
+    SELECT id, user_id, ROUND(scheduled + adjustment, 2), ROUND(scheduled - accrued, 2) FROM (
+        SELECT i.id, i.user_id, COALESCE(i.profit_adjustment, 0) AS adjustment,
+            COALESCE(i.current_profit, 0) - COALESCE(i.profit_adjustment, 0) AS accrued,
+            ROUND(COALESCE(p.profit_amount, 0)
+                  * MIN(MAX(julianday(:as_of) - julianday(COALESCE(i.activated_at, i.created_at)), 0), p.duration_days)
+                  / p.duration_days, 2) AS scheduled
+        FROM investments i JOIN investment_plans p ON p.id = i.plan_id
+        WHERE i.status = 'active' AND p.duration_days > 0 AND COALESCE(i.activated_at, i.created_at) IS NOT NULL)
+    WHERE scheduled > ROUND(accrued, 2)'''
+
+_USER_DELTAS = 'SELECT user_id, SUM(delta) AS delta FROM temp.accrual_batch GROUP BY user_id'
+
+_stats = {'runs': 0, 'skipped': 0, 'errors': 0}
+
+
+def current_period(now=None):
+    """(period key, as_of) for the last whole day: accrue through today's 00:00 UTC."""
+    now = now or datetime.utcnow()
+    as_of = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return (as_of - timedelta(days=1)).date().isoformat(), as_of.isoformat()
+
+
+def run(now=None):
+    """Apply the accrual for the current period. Returns the run's report, or None if already applied."""
+    period, as_of = current_period(now)
+    started = time.monotonic()
+
+    def apply(cur):
+        cur.execute(RUNS_DDL)
+        if cur.execute('SELECT 1 FROM accrual_runs WHERE period = ?', (period,)).fetchone():
+            return None
+        cur.execute('CREATE TEMP TABLE IF NOT EXISTS accrual_batch ('
+                    'investment_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, target REAL NOT NULL, delta REAL NOT NULL)')
+        cur.execute('DELETE FROM temp.accrual_batch')
+        cur.execute(_BATCH_SQL, {'as_of': as_of})
+        rows = cur.rowcount
+        users = ledger.post_deltas(cur, _USER_DELTAS, 'accrual', period)
+        portfolio.add_profit(cur, _USER_DELTAS)
+        cur.execute('UPDATE investments SET current_profit = b.target FROM temp.accrual_batch b WHERE investments.id = b.investment_id')
+        amount = cur.execute('SELECT COALESCE(SUM(delta), 0) FROM temp.accrual_batch').fetchone()[0]
+        cur.execute('DELETE FROM temp.accrual_batch')
+        duration = round(time.monotonic() - started, 3)
+        report = {'period': period, 'as_of': as_of, 'investments': rows, 'users': users,
+                  'amount': round(amount, 2), 'duration': duration}
+        cur.execute('INSERT INTO accrual_runs (period, as_of, started_at, finished_at, investments, users, amount, duration) '
+                    'VALUES (:period, :as_of, :started_at, :finished_at, :investments, :users, :amount, :duration)',
+                    dict(report, started_at=(datetime.utcnow() - timedelta(seconds=duration)).isoformat(),
+                         finished_at=datetime.utcnow().isoformat()))
+        return report
+
+    try:
+        report = db.write_transaction(apply, exclusive=True)
+    except Exception:
+        _stats['errors'] += 1
+        raise
+    _stats['runs' if report is not None else 'skipped'] += 1
+    return report
+
+
+def last_run():
+    conn = db.get_db(readonly=True)
+    try:
+        row = conn.execute('SELECT * FROM accrual_runs ORDER BY period DESC LIMIT 1').fetchone()
+        return dict(row) if row else None
+    except Exception:
+        return None
+    finally:
+        conn.close()
+
+
+def stats():
+    out = dict(_stats)
+    out['last_run'] = last_run()
+    return out
+
+
+# --- scheduler ---
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start():
+    """Start the scheduler thread (idempotent). It applies each new period once."""
+    global _scheduler
+    if _scheduler is not None and _scheduler.is_alive():
+        return
+    with _scheduler_lock:
+        if _scheduler is not None and _scheduler.is_alive():
+            return
+        _scheduler = threading.Thread(target=_run, name='profit-accrual', daemon=True)
+        _scheduler.start()
+
+
+def _run():
+    while True:
+        try:
+            run()
+        except Exception:
+            # counted in stats; retried on the next check
+            pass
+        time.sleep(CHECK_INTERVAL)
@@ -1,22 +1,37 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_from_directory, jsonify, make_response
-import io
-import csv
+from flask import Flask, render_template, request, redirect, url_for, flash, session, send_from_directory, send_file, jsonify, abort, g, has_app_context
 import json
+import uuid
+import mimetypes
 from werkzeug.security import generate_password_hash, check_password_hash
 import sqlite3
 import os
 from werkzeug.utils import secure_filename
-from PIL import Image, UnidentifiedImageError
-import uuid
 from datetime import datetime
+import accrual
+import assets
+import assistant_docs
+import assistant_tree
+import blobstore
+import catalog
+import configfile
 import currency
-import urllib.request
-import urllib.error
+import db
+import exports
+import images
+import ledger
+import llm
+import logqueue
+import migrations
+import pagination
+import portfolio
+import ratefeed
+import review
+import viewcounter
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-EXPORT_FOLDER = os.path.join(BASE_DIR, 'static', 'exports')
+EXPORT_FOLDER = exports.EXPORT_FOLDER
 os.makedirs(EXPORT_FOLDER, exist_ok=True)
 
 app = Flask(__name__)
@@ -26,74 +41,69 @@ app.config['MAX_CONTENT_LENGTH'] = 25 * 1024 * 1024  # 25MB global max
 app.config['MAX_VIDEO_FILE_SIZE'] = 20 * 1024 * 1024  # 20MB per-video limit
 
 
-DB_PATH = os.path.join(BASE_DIR, 'app.db')
+DB_PATH = db.DB_PATH
 
-def get_db():
-    # Use a short timeout and allow cross-thread access (Flask dev server may use threads).
-    # Also enable WAL mode for better concurrent read/write behavior.
-    conn = sqlite3.connect(DB_PATH, timeout=5, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    try:
-        cur = conn.cursor()
-        cur.execute('PRAGMA journal_mode = WAL')
-        cur.execute('PRAGMA foreign_keys = ON')
-    except Exception:
-        # If pragmas fail, continue with the connection — they are advisory
-        pass
+def get_db(readonly=False):
+    # Connections come pre-configured (WAL, foreign keys, busy timeout) from the
+    # shared pools in db.py; conn.close() hands them back. Anything a handler
+    # forgets to close is returned at teardown so the bounded pool never leaks.
+    conn = db.get_db(readonly=readonly)
+    if has_app_context():
+        g.setdefault('_db_conns', []).append((conn, conn._lease))
     return conn
 
+
+@app.teardown_appcontext
+def release_db(exc):
+    for conn, lease in g.pop('_db_conns', []):
+        conn.release_lease(lease)
+
+
 def init_db():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.executescript(open(os.path.join(BASE_DIR, 'schema.sql')).read())
-    conn.commit()
-    conn.close()
+    # create or upgrade the schema; every change lives in migrations.py
+    return migrations.migrate()
 
-# Ensure the database schema exists when the app starts under WSGI
-try:
-    if not os.path.exists(DB_PATH):
-        init_db()
-except Exception:
-    # Avoid crashing on import; errors will surface in logs
-    import sys
-    print('Warning: failed to initialize database schema', file=sys.stderr)
-
-# Ensure investments table has optional columns used by newer codepaths
-def ensure_investment_columns():
-    conn = None
+
+_started = False
+
+
+def create_app():
+    """Migrate the schema, start the background schedulers and return the app.
+
+    This is the server-start hook (`python app.py`, `waitress-serve --call
+    app:create_app`); nothing here runs at import, so image-pool workers, which
+    re-import the main module, never migrate or start threads. Runs once per process.
+    """
+    global _started
+    if _started:
+        return app
+    _started = True
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("PRAGMA table_info(investments)")
-        cols = [r[1] for r in cur.fetchall()]
-        needed = []
-        if 'amount_usd' not in cols:
-            needed.append("ALTER TABLE investments ADD COLUMN amount_usd REAL DEFAULT 0.0")
-        if 'amount_local' not in cols:
-            needed.append("ALTER TABLE investments ADD COLUMN amount_local REAL")
-        if 'currency_code' not in cols:
-            needed.append("ALTER TABLE investments ADD COLUMN currency_code TEXT")
-        if 'current_profit' not in cols:
-            needed.append("ALTER TABLE investments ADD COLUMN current_profit REAL DEFAULT 0.0")
-        for s in needed:
-            try:
-                cur.execute(s)
-            except Exception:
-                pass
-        conn.commit()
+        init_db()
     except Exception:
-        pass
-    finally:
-        try:
-            if conn:
-                conn.close()
-        except Exception:
-            pass
+        # keep serving; errors will surface in logs
+        import sys
+        print('Warning: failed to migrate database schema', file=sys.stderr)
+
+    # Periodic exchange-rate refresh (RATES_REFRESH_INTERVAL; 0 disables it)
+    if ratefeed.REFRESH_INTERVAL > 0:
+        ratefeed.start()
+
+    # Daily profit accrual (ACCRUAL_CHECK_INTERVAL; 0 disables the scheduler)
+    if accrual.CHECK_INTERVAL > 0:
+        accrual.start()
 
-try:
-    ensure_investment_columns()
-except Exception:
-    pass
+    # Background check of cached balances against the ledger (LEDGER_RECONCILE_INTERVAL; 0 disables it)
+    if ledger.RECONCILE_INTERVAL > 0:
+        ledger.start()
+
+    # Fingerprinted static assets; templates fall back to plain /static URLs without them
+    try:
+        assets.load()
+    except Exception:
+        import sys
+        print('Warning: failed to build static assets', file=sys.stderr)
+    return app
 
 @app.route('/')
 def index():
@@ -103,12 +113,24 @@ def index():
     except ValueError:
         page = 1
     PER_PAGE = 9
-    offset = (page - 1) * PER_PAGE
-    conn = get_db()
+    # active plans are served from the in-process catalog (no plan queries per hit);
+    # after/before cursors page by plan id, ?page= is kept for old links
+    after = pagination.decode_cursor(request.args.get('after'))
+    before = pagination.decode_cursor(request.args.get('before'))
+    try:
+        if after:
+            raw_plans, start, total = catalog.page_after(int(after[0]), PER_PAGE)
+        elif before:
+            raw_plans, start, total = catalog.page_before(int(before[0]), PER_PAGE)
+        else:
+            raw_plans, start, total = catalog.page(page, PER_PAGE)
+    except (TypeError, ValueError):
+        raw_plans, start, total = catalog.page(1, PER_PAGE)
+    page = start // PER_PAGE + 1
+    next_cursor = pagination.encode_cursor(raw_plans[-1].id) if raw_plans and start + len(raw_plans) < total else None
+    prev_cursor = pagination.encode_cursor(raw_plans[0].id) if raw_plans and start > 0 else None
+    conn = get_db(readonly=True)
     cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) as cnt FROM investment_plans WHERE status = 'active'")
-    count_row = cur.fetchone()
-    total = count_row['cnt'] if count_row and 'cnt' in count_row.keys() else 0
     # if logged in, fetch user to provide currency symbol in templates
     user = None
     if 'user_id' in session:
@@ -123,8 +145,6 @@ def index():
             user = dict(user)
         except Exception:
             pass
-    cur.execute("SELECT * FROM investment_plans WHERE status = 'active' ORDER BY id DESC LIMIT ? OFFSET ?", (PER_PAGE, offset))
-    raw_plans = cur.fetchall()
     # determine user's currency code and symbol
     user_currency = None
     user_symbol = None
@@ -142,30 +162,19 @@ def index():
     # prepare display plans with conversion (plans stored in USD)
     plans = []
     for p in raw_plans:
-        try:
-            amount_usd = float(p['minimum_amount'] or 0)
-        except Exception:
-            amount_usd = 0.0
-        try:
-            profit_usd = float(p['total_return'] or p['profit_amount'] or 0)
-        except Exception:
-            profit_usd = 0.0
-        display_amount = currency.convert_usd_to(user_currency, amount_usd) if user_currency else None
-        display_profit = currency.convert_usd_to(user_currency, profit_usd) if user_currency else None
-        # build a simple dict-like object for templates
+        # build a simple dict-like object for templates; amounts stay in USD and
+        # are converted at render time by the `money` filter
         plans.append({
-            'id': p['id'],
-            'name': p['plan_name'],
-            'duration': p['duration_days'],
-            'amount': amount_usd,
-            'profit': profit_usd,
-            'display_amount': display_amount,
-            'display_profit': display_profit,
+            'id': p.id,
+            'name': p.plan_name,
+            'duration': p.duration_days,
+            'amount': p.minimum_amount,
+            'profit': p.total_return or p.profit_amount,
             'currency_symbol': user_symbol or '₦',
-            'capital_back': p['capital_back'] if 'capital_back' in p.keys() else 1,
-            'funded_pct': float(p['funded_pct']) if 'funded_pct' in p.keys() and p['funded_pct'] is not None else 0.0,
-            'investors': int(p['investors']) if 'investors' in p.keys() and p['investors'] is not None else 0,
-            'views': int(p['views']) if 'views' in p.keys() and p['views'] is not None else 0
+            'capital_back': p.capital_back,
+            'funded_pct': 0.0,
+            'investors': 0,
+            'views': 0
         })
     # fetch active announcements for homepage
     now = datetime.utcnow().isoformat()
@@ -176,7 +185,8 @@ def index():
         announcements = []
     conn.close()
     total_pages = max(1, (total + PER_PAGE - 1) // PER_PAGE)
-    return render_template('index.html', plans=plans, page=page, total_pages=total_pages, announcements=announcements, user=user)
+    return render_template('index.html', plans=plans, page=page, total_pages=total_pages, next_cursor=next_cursor, prev_cursor=prev_cursor,
+                           announcements=announcements, user=user, currency_code=user_currency)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -189,58 +199,23 @@ def register():
         currency_symbol = request.form.get('currency_symbol')
         currency_name = request.form.get('currency_name')
         pw_hash = generate_password_hash(password)
-        conn = get_db()
-        cur = conn.cursor()
-        # Ensure `phone` column exists for older DBs
-        try:
-            cur.execute("PRAGMA table_info(users)")
-            cols = [r[1] for r in cur.fetchall()]
-            if 'phone' not in cols:
-                try:
-                    cur.execute("ALTER TABLE users ADD COLUMN phone TEXT")
-                    conn.commit()
-                except Exception:
-                    pass
-        except Exception:
-            pass
-        # determine whether this should be the first admin user
-        try:
-            cur.execute('SELECT COUNT(*) as cnt FROM users')
-            cnt = cur.fetchone()['cnt']
-        except Exception:
-            cnt = 0
-        is_admin_flag = 1 if cnt == 0 else 0
-        try:
+
+        def create(cur):
+            # determine whether this should be the first admin user
+            try:
+                cur.execute('SELECT COUNT(*) as cnt FROM users')
+                cnt = cur.fetchone()['cnt']
+            except Exception:
+                cnt = 0
+            is_admin_flag = 1 if cnt == 0 else 0
             cur.execute('INSERT INTO users (username, phone, password_hash, balance, policy_accepted, is_admin, country, currency_code, currency_symbol, currency_name, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
                         (username, phone, pw_hash, 0.0, 0, is_admin_flag, country, currency_code, currency_symbol, currency_name, datetime.utcnow()))
-            conn.commit()
+        try:
+            db.write_transaction(create)
             flash('Registered. Please login.', 'success')
             return redirect(url_for('login'))
-        except sqlite3.OperationalError as oe:
-            # older DB without currency columns: fallback to insert without them
-            if 'no column named country' in str(oe) or 'has no column' in str(oe):
-                try:
-                    cur.execute('INSERT INTO users (username, phone, password_hash, balance, policy_accepted, is_admin, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
-                                (username, phone, pw_hash, 0.0, 0, is_admin_flag, datetime.utcnow()))
-                    conn.commit()
-                    flash('Registered (legacy DB). Please login.', 'success')
-                    return redirect(url_for('login'))
-                except sqlite3.IntegrityError:
-                    flash('Username or phone already exists', 'danger')
-                except Exception:
-                    flash('Registration failed', 'danger')
-                finally:
-                    conn.close()
-            else:
-                conn.close()
-                raise
         except sqlite3.IntegrityError:
             flash('Username or phone already exists', 'danger')
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
     return render_template('register.html')
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -248,7 +223,7 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        conn = get_db()
+        conn = get_db(readonly=True)
         cur = conn.cursor()
         cur.execute('SELECT * FROM users WHERE username = ?', (username,))
         user = cur.fetchone()
@@ -297,132 +272,101 @@ def admin_required(fn):
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    conn = get_db()
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     cur.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],))
     user = cur.fetchone()
     if user:
-        try:
-            user = dict(user)
-        except Exception:
-            pass
-
-    # fetch plans
-    cur.execute('SELECT * FROM investment_plans')
-    raw_plans = cur.fetchall()
+        user = dict(user)
+
+    # totals come from the materialized summary row
+    summary = portfolio.get_summary(conn, session['user_id'])
+
+    # investment history, newest first, keyset-paginated
+    user_investments, next_cursor, prev_cursor = pagination.id_page(
+        cur, """SELECT i.id, i.plan_id, i.status, i.proof_image, i.amount_usd, i.current_profit, i.created_at, p.plan_name
+                FROM investments i LEFT JOIN investment_plans p ON p.id = i.plan_id
+                WHERE i.user_id = ?""", [session['user_id']], 'i.id',
+        pagination.decode_cursor(request.args.get('after')), pagination.decode_cursor(request.args.get('before')), 10)
+    # released before the cached lookups below, which may take a reader of their own on a miss
+    conn.close()
 
     # convert user balance to display currency
     display_balance = None
+    user_currency = None
     try:
-        user_currency = user['currency_code'] if user and 'currency_code' in user.keys() else session.get('currency_code')
+        user_currency = user['currency_code'] if user else session.get('currency_code')
         display_balance = currency.convert_usd_to(user_currency, user['balance']) if user_currency else None
     except Exception:
         display_balance = None
 
-    # prepare plans list similar to index
-    plans = []
-    for p in raw_plans:
-        amount_usd = float(p['minimum_amount'] or 0)
-        profit_usd = float(p['total_return'] or p['profit_amount'] or 0)
-        display_amount = currency.convert_usd_to(user_currency, amount_usd) if user_currency else None
-        display_profit = currency.convert_usd_to(user_currency, profit_usd) if user_currency else None
-        plans.append({
-            'id': p['id'],
-            'plan_name': p['plan_name'],
-            'duration_days': p['duration_days'],
-            'amount': amount_usd,
-            'profit': profit_usd,
-            'display_amount': display_amount,
-            'display_profit': display_profit,
-            'currency_symbol': (user['currency_symbol'] if user and 'currency_symbol' in user.keys() else session.get('currency_symbol')) or '₦'
-        })
-
-    # fetch user's investments to show on dashboard
-    try:
-        cur.execute('SELECT * FROM investments WHERE user_id = ? ORDER BY id DESC', (session['user_id'],))
-        user_investments = cur.fetchall()
-    except Exception:
-        user_investments = []
-
-    # compute aggregates for dashboard: active investments and current profit (USD)
-    active_investments_total = 0.0
-    current_profit_total = 0.0
-    # build plan minimum map for fallback when investments lack amount_usd column
-    plan_min_map = {}
-    try:
-        for p in raw_plans:
-            try:
-                plan_min_map[p['id']] = float(p['minimum_amount'] or 0)
-            except Exception:
-                plan_min_map[getattr(p, 'id', None)] = 0.0
-    except Exception:
-        plan_min_map = {}
-    try:
-        for inv in user_investments:
-            status = inv['status'] if 'status' in inv.keys() else None
-            if status and str(status).lower() == 'active':
-                if 'amount_usd' in inv.keys():
-                    try:
-                        amt = float(inv['amount_usd'] or 0)
-                    except Exception:
-                        amt = 0.0
-                else:
-                    amt = plan_min_map.get(inv['plan_id'], 0.0)
-                if 'current_profit' in inv.keys():
-                    try:
-                        prof = float(inv['current_profit'] or 0)
-                    except Exception:
-                        prof = 0.0
-                else:
-                    prof = 0.0
-                active_investments_total += amt
-                current_profit_total += prof
-    except Exception:
-        pass
-
-    conn.close()
-    return render_template('dashboard.html', user=user, plans=plans, display_balance=display_balance, user_investments=user_investments, active_investments=active_investments_total, current_profit=current_profit_total)
+    currency_symbol = (user['currency_symbol'] if user else None) or session.get('currency_symbol') or '₦'
+    plans = [{
+        'id': p.id,
+        'plan_name': p.plan_name,
+        'duration_days': p.duration_days,
+        'amount': p.minimum_amount,
+        'profit': p.total_return or p.profit_amount,
+        'currency_symbol': currency_symbol,
+    } for p in catalog.active_plans()]
+
+    # each investment in the user's currency at the rate in effect when it was made
+    local_amounts = {}
+    if user_currency and user_currency.upper() != 'USD' and user_investments:
+        values = currency.convert_many_usd_at(user_currency, [i['amount_usd'] for i in user_investments],
+                                              [i['created_at'] for i in user_investments])
+        if values:
+            local_amounts = {i['id']: v for i, v in zip(user_investments, values)}
+
+    return render_template('dashboard.html', user=user, plans=plans, display_balance=display_balance, user_investments=user_investments,
+                           local_amounts=local_amounts,
+                           active_investments=summary['active_principal'], current_profit=summary['accrued_profit'], summary=summary,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor, currency_code=user_currency)
 
 
 @app.route('/plans/<int:plan_id>')
 def plan_detail(plan_id):
-    conn = get_db()
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     cur.execute('SELECT * FROM investment_plans WHERE id = ?', (plan_id,))
     plan = cur.fetchone()
     if not plan:
         conn.close()
         return ('Plan not found', 404)
-    # increment view count in plan_stats (create or update)
+    # count the view in the write-behind buffer; the persisted total plus the
+    # not-yet-flushed delta is what we display
+    viewcounter.record_view(plan_id)
     try:
         cur.execute('SELECT total_views, total_investors FROM plan_stats WHERE plan_id = ?', (plan_id,))
-        stats = cur.fetchone()
-        if stats:
-            cur.execute('UPDATE plan_stats SET total_views = total_views + 1 WHERE plan_id = ?', (plan_id,))
-        else:
-            cur.execute('INSERT INTO plan_stats (plan_id, total_views, total_investors) VALUES (?, ?, ?)', (plan_id, 1, 0))
-        conn.commit()
-        cur.execute('SELECT total_views, total_investors FROM plan_stats WHERE plan_id = ?', (plan_id,))
-        stats = cur.fetchone()
+        row = cur.fetchone()
+        stats = dict(row) if row else {'total_views': 0, 'total_investors': 0}
     except Exception:
         stats = {'total_views': 0, 'total_investors': 0}
+    stats['total_views'] = (stats['total_views'] or 0) + viewcounter.pending_views(plan_id)
+    # rows for the logged-in view are read here; the connection is released
+    # before the currency lookups, which may take a reader of their own on a miss
+    user = settings_row = None
+    if 'user_id' in session:
+        try:
+            cur.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],))
+            user = cur.fetchone()
+            cur.execute('SELECT min_amount, max_amount FROM investment_settings LIMIT 1')
+            settings_row = cur.fetchone()
+        except Exception:
+            pass
+    conn.close()
     # convert amounts for display if user logged in
     display_amount = None
     display_profit = None
     currency_symbol = '₦'
     if 'user_id' in session:
         try:
-            cur.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],))
-            user = cur.fetchone()
             user_currency = user['currency_code'] if 'currency_code' in user.keys() else session.get('currency_code')
             currency_symbol = user['currency_symbol'] if 'currency_symbol' in user.keys() else session.get('currency_symbol') or '₦'
             amount_usd = float(plan['minimum_amount'] or 0)
             profit_usd = float(plan['total_return'] or plan['profit_amount'] or 0)
-            display_amount = currency.convert_usd_to(user_currency, amount_usd)
-            display_profit = currency.convert_usd_to(user_currency, profit_usd)
             try:
-                cur.execute('SELECT min_amount, max_amount FROM investment_settings LIMIT 1')
-                s = cur.fetchone()
+                s = settings_row
                 if s and 'min_amount' in s.keys():
                     min_usd = max(float(s['min_amount']), 10.0, amount_usd)
                     max_usd = float(s['max_amount'])
@@ -432,12 +376,12 @@ def plan_detail(plan_id):
             except Exception:
                 min_usd = max(amount_usd, 10.0)
                 max_usd = None
-            display_min_local = currency.convert_usd_to(user_currency, min_usd)
-            display_max_local = currency.convert_usd_to(user_currency, max_usd) if max_usd is not None else None
+            # one rate lookup for every figure shown on the page
+            converted = currency.convert_many_usd_to(user_currency, [amount_usd, profit_usd, min_usd, max_usd]) or [None] * 4
+            display_amount, display_profit, display_min_local, display_max_local = converted
             rate_for_display = currency.get_rate(user_currency)
         except Exception:
             pass
-    conn.close()
     plan_dict = dict(plan)
     plan_dict['display_amount'] = display_amount
     plan_dict['display_profit'] = display_profit
@@ -464,18 +408,16 @@ def policy():
 @app.route('/accept_policy', methods=['POST'])
 @login_required
 def accept_policy():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('UPDATE users SET policy_accepted = 1 WHERE id = ?', (session['user_id'],))
-    conn.commit()
-    conn.close()
+    user_id = session['user_id']
+    db.write_transaction(lambda cur: cur.execute('UPDATE users SET policy_accepted = 1 WHERE id = ?', (user_id,)))
     flash('Policy accepted', 'success')
     return redirect(url_for('dashboard'))
 
 @app.route('/invest', methods=['POST'])
 @login_required
 def invest():
-    conn = get_db()
+    user_id = session['user_id']
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     cur.execute('SELECT policy_accepted FROM users WHERE id = ?', (session['user_id'],))
     row = cur.fetchone()
@@ -486,17 +428,17 @@ def invest():
     plan_id = request.form.get('plan_id')
     # accept optional local amount (user-entered) else use plan minimum (USD)
     local_amount = request.form.get('local_amount')
-    conn2 = get_db()
-    cur2 = conn2.cursor()
-    cur2.execute('SELECT * FROM investment_plans WHERE id = ?', (plan_id,))
-    plan = cur2.fetchone()
+    cur.execute('SELECT * FROM investment_plans WHERE id = ?', (plan_id,))
+    plan = cur.fetchone()
     # determine user's currency code
     try:
-        cur2.execute('SELECT currency_code FROM users WHERE id = ?', (session['user_id'],))
-        urow = cur2.fetchone()
+        cur.execute('SELECT currency_code FROM users WHERE id = ?', (session['user_id'],))
+        urow = cur.fetchone()
         user_currency = urow['currency_code'] if urow and 'currency_code' in urow.keys() else session.get('currency_code')
     except Exception:
         user_currency = session.get('currency_code')
+    # released before the conversions, which may take a reader of their own on a cache miss
+    conn.close()
     # compute amounts
     try:
         if local_amount:
@@ -510,24 +452,57 @@ def invest():
     except Exception:
         amount_local = None
         amount_usd = float(plan['minimum_amount']) if plan else 0.0
-    finally:
-        try:
-            conn2.close()
-        except Exception:
-            pass
-    # create investment pending (no automatic credit)
-    # try to insert with new currency columns; fallback if older schema
-    try:
+
+    def create(cur):
+        # create investment pending (no automatic credit)
         cur.execute('INSERT INTO investments (user_id, plan_id, status, proof_image, amount_usd, amount_local, currency_code, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-                    (session['user_id'], plan_id, 'pending', '', amount_usd, amount_local, user_currency, datetime.utcnow()))
-    except sqlite3.OperationalError:
-        cur.execute('INSERT INTO investments (user_id, plan_id, status, proof_image, created_at) VALUES (?, ?, ?, ?, ?)',
-                    (session['user_id'], plan_id, 'pending', '', datetime.utcnow()))
-    conn.commit()
-    conn.close()
+                    (user_id, plan_id, 'pending', '', amount_usd, amount_local, user_currency, datetime.utcnow()))
+        portfolio.refresh(cur, user_id)
+    db.write_transaction(create)
     flash('Investment request created. Upload payment proof.', 'info')
     return redirect(url_for('dashboard'))
 
+def save_image_upload(file):
+    """Validate an uploaded image from its header, store it and queue its variants.
+
+    Returns the blob-store name; raises images.ImageRejected.
+    """
+    fmt, size, ext = images.probe(file.stream)
+    # extension follows the detected format, not the client's file name
+    name, created = blobstore.ingest(file.stream, ext)
+    if created:
+        # EXIF stripping, re-encode and thumbnails happen in the image process pool
+        images.submit(blobstore.path_for(name))
+    return name
+
+
+ALLOWED_VIDEO = ('.mp4', '.webm', '.ogg')
+
+
+def save_video_upload(vid):
+    """Store an uploaded video. Returns the blob-store name.
+
+    Raises ValueError for a disallowed type and blobstore.BlobTooLarge past MAX_VIDEO_FILE_SIZE.
+    """
+    vext = os.path.splitext(secure_filename(vid.filename))[1].lower()
+    if vext not in ALLOWED_VIDEO:
+        raise ValueError('Invalid video type')
+    name, created = blobstore.ingest(vid.stream, vext, max_size=app.config['MAX_VIDEO_FILE_SIZE'])
+    return name
+
+
+@app.template_global()
+def upload_url(name, variant='clean'):
+    """URL of an upload's clean/thumb/webp variant once the pipeline has produced it, else of the upload."""
+    if not name:
+        return ''
+    if variant:
+        derived = images.variant_name(name, variant)
+        if derived != name and os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], derived)):
+            name = derived
+    return url_for('uploaded_file', filename=name)
+
+
 @app.route('/upload_proof/<int:investment_id>', methods=['POST'])
 @login_required
 def upload_proof(investment_id):
@@ -539,29 +514,36 @@ def upload_proof(investment_id):
         flash('No selected file', 'danger')
         return redirect(url_for('dashboard'))
     filename = secure_filename(file.filename)
-    ALLOWED_EXT = ('.png', '.jpg', '.jpeg', '.gif')
-    if not filename.lower().endswith(ALLOWED_EXT):
+    if not filename.lower().endswith(images.ALLOWED_EXTENSIONS):
         flash('Invalid file extension', 'danger')
         return redirect(url_for('dashboard'))
-    # create a unique filename to avoid collisions
-    unique_name = f"{uuid.uuid4().hex}_{filename}"
-    save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_name)
-    # validate image content using Pillow
+    user_id = session['user_id']
+    # check ownership before storing anything, so foreign ids never reach the blob store or image pool
+    conn = get_db(readonly=True)
+    owned = conn.execute('SELECT 1 FROM investments WHERE id = ? AND user_id = ?', (investment_id, user_id)).fetchone()
+    conn.close()
+    if not owned:
+        flash('Investment not found', 'danger')
+        return redirect(url_for('dashboard'))
     try:
-        img = Image.open(file.stream)
-        img.verify()
-    except (UnidentifiedImageError, Exception):
-        flash('Uploaded file is not a valid image', 'danger')
+        unique_name = save_image_upload(file)
+    except images.ImageRejected as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('dashboard'))
+
+    def attach(cur):
+        cur.execute('SELECT proof_image FROM investments WHERE id = ? AND user_id = ?', (investment_id, user_id))
+        inv = cur.fetchone()
+        if not inv:
+            return False
+        cur.execute('UPDATE investments SET proof_image = ? WHERE id = ? AND user_id = ?',
+                    (unique_name, investment_id, user_id))
+        blobstore.swap(cur, inv['proof_image'], unique_name)
+        return True
+    if not db.write_transaction(attach):
+        # deleted between the check and the write; the unreferenced blob is left for collect()
+        flash('Investment not found', 'danger')
         return redirect(url_for('dashboard'))
-    # reset stream and save file
-    file.stream.seek(0)
-    file.save(save_path)
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('UPDATE investments SET proof_image = ? WHERE id = ? AND user_id = ?',
-                (unique_name, investment_id, session['user_id']))
-    conn.commit()
-    conn.close()
     flash('Proof uploaded', 'success')
     return redirect(url_for('dashboard'))
 
@@ -573,29 +555,28 @@ def withdraw():
     except ValueError:
         flash('Invalid amount', 'danger')
         return redirect(url_for('dashboard'))
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('SELECT balance FROM users WHERE id = ?', (session['user_id'],))
-    user = cur.fetchone()
-    if not user or amount <= 0:
-        flash('Invalid amount', 'danger')
-        conn.close()
-        return redirect(url_for('dashboard'))
-    cur.execute('SELECT min_amount, max_amount FROM withdrawal_settings LIMIT 1')
-    settings = cur.fetchone()
-    if settings:
-        if amount < settings['min_amount'] or amount > settings['max_amount']:
-            flash('Amount outside allowed withdrawal limits', 'danger')
-            conn.close()
-            return redirect(url_for('dashboard'))
-    if amount > user['balance']:
-        flash('Insufficient balance', 'danger')
-        conn.close()
+    user_id = session['user_id']
+
+    def create(cur):
+        # checked under the write lock, so the balance cannot move in between
+        cur.execute('SELECT balance FROM users WHERE id = ?', (user_id,))
+        user = cur.fetchone()
+        if not user or amount <= 0:
+            return 'Invalid amount'
+        cur.execute('SELECT min_amount, max_amount FROM withdrawal_settings LIMIT 1')
+        settings = cur.fetchone()
+        if settings:
+            if amount < settings['min_amount'] or amount > settings['max_amount']:
+                return 'Amount outside allowed withdrawal limits'
+        if amount > user['balance']:
+            return 'Insufficient balance'
+        cur.execute('INSERT INTO withdrawals (user_id, amount, status, requested_at) VALUES (?, ?, ?, ?)',
+                    (user_id, amount, 'pending', datetime.utcnow()))
+        portfolio.refresh(cur, user_id)
+    error = db.write_transaction(create)
+    if error:
+        flash(error, 'danger')
         return redirect(url_for('dashboard'))
-    cur.execute('INSERT INTO withdrawals (user_id, amount, status, requested_at) VALUES (?, ?, ?, ?)',
-                (session['user_id'], amount, 'pending', datetime.utcnow()))
-    conn.commit()
-    conn.close()
     flash('Withdrawal request created', 'info')
     return redirect(url_for('dashboard'))
 
@@ -603,18 +584,119 @@ def withdraw():
 @login_required
 @admin_required
 def admin_dashboard():
-    conn = get_db()
+    # aggregate counts only; the row lists live on their own paginated pages
+    conn = get_db(readonly=True)
     cur = conn.cursor()
-    cur.execute('SELECT * FROM users')
-    users = cur.fetchall()
-    cur.execute('SELECT * FROM investments WHERE status = ?', ('pending',))
-    investments = cur.fetchall()
-    cur.execute('SELECT * FROM withdrawals WHERE status = ?', ('pending',))
-    withdrawals = cur.fetchall()
+    cur.execute("""SELECT
+        (SELECT COUNT(*) FROM users) AS users,
+        (SELECT COALESCE(SUM(balance), 0) FROM users) AS total_balance,
+        (SELECT COUNT(*) FROM investments WHERE status = 'active') AS active_investments,
+        (SELECT COUNT(*) FROM investments WHERE status = 'pending') AS pending_investments,
+        (SELECT COALESCE(SUM(amount_usd), 0) FROM investments WHERE status = 'pending') AS pending_investments_usd,
+        (SELECT COUNT(*) FROM withdrawals WHERE status = 'pending') AS pending_withdrawals,
+        (SELECT COALESCE(SUM(amount), 0) FROM withdrawals WHERE status = 'pending') AS pending_withdrawals_usd""")
+    summary = cur.fetchone()
     cur.execute('SELECT * FROM withdrawal_settings LIMIT 1')
     settings = cur.fetchone()
     conn.close()
-    return render_template('admin/dashboard.html', users=users, investments=investments, withdrawals=withdrawals, settings=settings)
+    return render_template('admin/dashboard.html', summary=summary, settings=settings)
+
+
+ADMIN_PAGE_SIZE = 50
+
+
+def _user_search(q, alias='u'):
+    """WHERE fragment matching a username or phone prefix through their UNIQUE indexes."""
+    if not q:
+        return '', []
+    low, high = pagination.prefix_bounds(q)
+    return (f' AND (({alias}.username >= ? AND {alias}.username < ?) OR ({alias}.phone >= ? AND {alias}.phone < ?))',
+            [low, high, low, high])
+
+
+def _admin_list_args():
+    q = (request.args.get('q') or '').strip()
+    after = pagination.decode_cursor(request.args.get('after'))
+    before = pagination.decode_cursor(request.args.get('before'))
+    return q, after, before
+
+
+@app.route('/admin/users')
+@login_required
+@admin_required
+def admin_users():
+    q, after, before = _admin_list_args()
+    where, params = _user_search(q)
+    conn = get_db(readonly=True)
+    cur = conn.cursor()
+    rows, next_cursor, prev_cursor = pagination.id_page(
+        cur, """SELECT u.id, u.username, u.email, u.phone, u.balance, u.is_admin, u.currency_code, u.created_at
+                FROM users u WHERE 1=1""" + where, params, 'u.id', after, before, ADMIN_PAGE_SIZE)
+    conn.close()
+    return render_template('admin/users.html', users=rows, q=q, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
+@app.route('/admin/investments/pending')
+@login_required
+@admin_required
+def admin_pending_investments():
+    q, after, before = _admin_list_args()
+    where, params = _user_search(q)
+    conn = get_db(readonly=True)
+    cur = conn.cursor()
+    # oldest first: this is a work queue
+    rows, next_cursor, prev_cursor = pagination.id_page(
+        cur, """SELECT i.id, i.user_id, i.plan_id, i.proof_image, i.amount_usd, i.amount_local, i.currency_code, i.created_at,
+                       u.username, u.phone, p.plan_name
+                FROM investments i
+                JOIN users u ON u.id = i.user_id
+                LEFT JOIN investment_plans p ON p.id = i.plan_id
+                WHERE i.status = 'pending'""" + where, params, 'i.id', after, before, ADMIN_PAGE_SIZE, descending=False)
+    conn.close()
+    return render_template('admin/pending_investments.html', investments=rows, q=q, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
+@app.route('/admin/withdrawals/pending')
+@login_required
+@admin_required
+def admin_pending_withdrawals():
+    q, after, before = _admin_list_args()
+    where, params = _user_search(q)
+    conn = get_db(readonly=True)
+    cur = conn.cursor()
+    rows, next_cursor, prev_cursor = pagination.id_page(
+        cur, """SELECT w.id, w.user_id, w.amount, w.requested_at, u.username, u.phone, u.balance
+                FROM withdrawals w
+                JOIN users u ON u.id = w.user_id
+                WHERE w.status = 'pending'""" + where, params, 'w.id', after, before, ADMIN_PAGE_SIZE, descending=False)
+    conn.close()
+    return render_template('admin/pending_withdrawals.html', withdrawals=rows, q=q, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
+@app.route('/admin/metrics')
+@login_required
+@admin_required
+def admin_metrics():
+    return jsonify({
+        'db_pool': db.pool_stats(),
+        'rate_cache': currency.rate_cache_stats(),
+        'rate_refresh': ratefeed.status(),
+        'profit_accrual': accrual.stats(),
+        'ledger': ledger.stats(),
+        'plan_catalog': catalog.stats(),
+        'plan_views': viewcounter.stats(),
+        'assistant_tree': assistant_tree.stats(),
+        'assistant_docs': {name: doc.stats() for name, doc in (
+            ('config', assistant_docs.config), ('plans', assistant_docs.plans),
+            ('testimonials', assistant_docs.testimonials), ('info', assistant_docs.info),
+            ('contact', contact_document))},
+        'admin_contact_file': admin_contact_file.stats(),
+        'llm': llm.stats(),
+        'assistant_log_queue': logqueue.stats(),
+        'images': images.stats(),
+        'uploads': blobstore.stats(),
+        'assets': {'manifest': len(assets._manifest), 'brotli': assets.brotli is not None},
+    })
 
 
 @app.route('/admin/contact', methods=['GET', 'POST'])
@@ -641,7 +723,7 @@ def admin_contact():
 @login_required
 @admin_required
 def admin_exchange_rates():
-    conn = get_db()
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     try:
         cur.execute('SELECT currency_code, rate, updated_at FROM exchange_rates ORDER BY currency_code')
@@ -649,24 +731,28 @@ def admin_exchange_rates():
     except Exception:
         rates = []
     conn.close()
-    return render_template('admin/exchange_rates.html', rates=rates)
+    return render_template('admin/exchange_rates.html', rates=rates, refresh_status=ratefeed.status())
 
 
 @app.route('/admin/exchange_rates/<string:code>/edit', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_exchange_rate_edit(code):
-    conn = get_db()
-    cur = conn.cursor()
     if request.method == 'POST':
         try:
             rate = float(request.form.get('rate'))
-            cur.execute('INSERT OR REPLACE INTO exchange_rates (currency_code, rate, updated_at) VALUES (?, ?, ?)', (code.upper(), rate, datetime.utcnow().isoformat()))
-            conn.commit()
+
+            def store(cur):
+                currency.store_rates(cur, {code: rate})
+                db.bump_generation(cur.connection, currency.RATES_GENERATION)
+            db.write_transaction(store)
+            currency.invalidate_rates()
             flash('Rate updated', 'success')
             return redirect(url_for('admin_exchange_rates'))
         except Exception:
             flash('Failed to update rate', 'danger')
+    conn = get_db(readonly=True)
+    cur = conn.cursor()
     try:
         cur.execute('SELECT currency_code, rate, updated_at FROM exchange_rates WHERE currency_code = ?', (code.upper(),))
         r = cur.fetchone()
@@ -682,14 +768,9 @@ def admin_exchange_rate_edit(code):
 @login_required
 @admin_required
 def admin_exchange_rates_update():
-    # trigger the scripts/update_exchange_rates.py script to refresh rates
-    import subprocess, sys
-    script = os.path.join(BASE_DIR, 'scripts', 'update_exchange_rates.py')
-    try:
-        subprocess.check_call([sys.executable, script])
-        flash('Exchange rates updated (script ran)', 'success')
-    except Exception as e:
-        flash(f'Failed to update rates: {e}', 'danger')
+    # runs on the in-process refresher; the page shows its status
+    ratefeed.trigger()
+    flash('Exchange rate refresh started', 'success')
     return redirect(url_for('admin_exchange_rates'))
 
 
@@ -697,24 +778,25 @@ def admin_exchange_rates_update():
 @login_required
 @admin_required
 def admin_investment_settings():
-    conn = get_db()
-    cur = conn.cursor()
     if request.method == 'POST':
         try:
             min_amount = float(request.form.get('min_amount'))
             max_amount = float(request.form.get('max_amount'))
-            cur.execute('SELECT id FROM investment_settings LIMIT 1')
-            existing = cur.fetchone()
-            if existing:
-                cur.execute('UPDATE investment_settings SET min_amount = ?, max_amount = ?, updated_at = ? WHERE id = ?', (min_amount, max_amount, datetime.utcnow().isoformat(), existing['id']))
-            else:
-                cur.execute('INSERT INTO investment_settings (min_amount, max_amount, updated_at) VALUES (?, ?, ?)', (min_amount, max_amount, datetime.utcnow().isoformat()))
-            conn.commit()
+
+            def save(cur):
+                cur.execute('SELECT id FROM investment_settings LIMIT 1')
+                existing = cur.fetchone()
+                if existing:
+                    cur.execute('UPDATE investment_settings SET min_amount = ?, max_amount = ?, updated_at = ? WHERE id = ?', (min_amount, max_amount, datetime.utcnow().isoformat(), existing['id']))
+                else:
+                    cur.execute('INSERT INTO investment_settings (min_amount, max_amount, updated_at) VALUES (?, ?, ?)', (min_amount, max_amount, datetime.utcnow().isoformat()))
+            db.write_transaction(save)
             flash('Investment settings updated', 'success')
             return redirect(url_for('admin_investment_settings'))
         except Exception:
-            conn.rollback()
             flash('Failed to update settings', 'danger')
+    conn = get_db(readonly=True)
+    cur = conn.cursor()
     try:
         cur.execute('SELECT * FROM investment_settings LIMIT 1')
         s = cur.fetchone()
@@ -728,7 +810,7 @@ def admin_investment_settings():
 @login_required
 @admin_required
 def admin_plans():
-    conn = get_db()
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     cur.execute('SELECT * FROM investment_plans ORDER BY id DESC')
     plans = cur.fetchall()
@@ -748,12 +830,13 @@ def admin_plans_new():
         duration = int(request.form.get('duration_days') or 1)
         capital_back = 1 if request.form.get('capital_back') == 'on' else 0
         status = request.form.get('status') or 'inactive'
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute('INSERT INTO investment_plans (plan_name, minimum_amount, profit_amount, total_return, duration_days, capital_back, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                    (name, minimum, profit, total, duration, capital_back, status, datetime.utcnow(), datetime.utcnow()))
-        conn.commit()
-        conn.close()
+
+        def create(cur):
+            cur.execute('INSERT INTO investment_plans (plan_name, minimum_amount, profit_amount, total_return, duration_days, capital_back, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (name, minimum, profit, total, duration, capital_back, status, datetime.utcnow(), datetime.utcnow()))
+            db.bump_generation(cur.connection, catalog.PLANS_GENERATION)
+        db.write_transaction(create)
+        catalog.invalidate()
         flash('Plan created', 'success')
         return redirect(url_for('admin_plans'))
     return render_template('admin/plan_form.html', plan=None)
@@ -763,12 +846,12 @@ def admin_plans_new():
 @login_required
 @admin_required
 def admin_plans_edit(plan_id):
-    conn = get_db()
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     cur.execute('SELECT * FROM investment_plans WHERE id = ?', (plan_id,))
     plan = cur.fetchone()
+    conn.close()
     if not plan:
-        conn.close()
         flash('Plan not found', 'danger')
         return redirect(url_for('admin_plans'))
     if request.method == 'POST':
@@ -779,13 +862,15 @@ def admin_plans_edit(plan_id):
         duration = int(request.form.get('duration_days') or 1)
         capital_back = 1 if request.form.get('capital_back') == 'on' else 0
         status = request.form.get('status') or 'inactive'
-        cur.execute('UPDATE investment_plans SET plan_name = ?, minimum_amount = ?, profit_amount = ?, total_return = ?, duration_days = ?, capital_back = ?, status = ?, updated_at = ? WHERE id = ?',
-                    (name, minimum, profit, total, duration, capital_back, status, datetime.utcnow(), plan_id))
-        conn.commit()
-        conn.close()
+
+        def update(cur):
+            cur.execute('UPDATE investment_plans SET plan_name = ?, minimum_amount = ?, profit_amount = ?, total_return = ?, duration_days = ?, capital_back = ?, status = ?, updated_at = ? WHERE id = ?',
+                        (name, minimum, profit, total, duration, capital_back, status, datetime.utcnow(), plan_id))
+            db.bump_generation(cur.connection, catalog.PLANS_GENERATION)
+        db.write_transaction(update)
+        catalog.invalidate()
         flash('Plan updated', 'success')
         return redirect(url_for('admin_plans'))
-    conn.close()
     return render_template('admin/plan_form.html', plan=plan)
 
 
@@ -793,9 +878,7 @@ def admin_plans_edit(plan_id):
 @login_required
 @admin_required
 def admin_plans_delete(plan_id):
-    conn = get_db()
-    cur = conn.cursor()
-    try:
+    def delete(cur):
         # count dependents
         cur.execute('SELECT COUNT(*) as cnt FROM investments WHERE plan_id = ?', (plan_id,))
         cnt_row = cur.fetchone()
@@ -808,37 +891,24 @@ def admin_plans_delete(plan_id):
             except Exception:
                 cnt = 0
 
-        # delete dependent investments first (destructive)
+        # delete dependent investments first (destructive), release their proofs and rebuild their owners' summaries
         if cnt > 0:
-            try:
-                cur.execute('DELETE FROM investments WHERE plan_id = ?', (plan_id,))
-            except sqlite3.OperationalError:
-                # table may not exist on older DBs; ignore
-                pass
+            removed = cur.execute('DELETE FROM investments WHERE plan_id = ? RETURNING user_id, proof_image', (plan_id,)).fetchall()
+            for r in removed:
+                blobstore.release(cur, r['proof_image'])
+            portfolio.refresh_many(cur, [r['user_id'] for r in removed])
 
         # delete plan_stats and the plan
-        try:
-            cur.execute('DELETE FROM plan_stats WHERE plan_id = ?', (plan_id,))
-        except sqlite3.OperationalError:
-            # missing table is non-fatal
-            pass
-        try:
-            cur.execute('DELETE FROM investment_plans WHERE id = ?', (plan_id,))
-        except sqlite3.OperationalError:
-            # unexpected, re-raise to be caught below
-            raise
-        conn.commit()
-        conn.close()
+        cur.execute('DELETE FROM plan_stats WHERE plan_id = ?', (plan_id,))
+        cur.execute('DELETE FROM investment_plans WHERE id = ?', (plan_id,))
+        db.bump_generation(cur.connection, catalog.PLANS_GENERATION)
+        return cnt
+
+    try:
+        cnt = db.write_transaction(delete)
+        catalog.invalidate()
         flash(f'Plan deleted. Removed {cnt} dependent investment(s).', 'info')
     except Exception as e:
-        try:
-            conn.rollback()
-        except Exception:
-            pass
-        try:
-            conn.close()
-        except Exception:
-            pass
         flash(f'Failed to delete plan: {e}', 'danger')
     return redirect(url_for('admin_plans'))
 
@@ -847,129 +917,74 @@ def admin_plans_delete(plan_id):
 @login_required
 @admin_required
 def admin_plans_toggle(plan_id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('SELECT status FROM investment_plans WHERE id = ?', (plan_id,))
-    p = cur.fetchone()
-    if not p:
-        conn.close()
+    def toggle(cur):
+        cur.execute('SELECT status FROM investment_plans WHERE id = ?', (plan_id,))
+        p = cur.fetchone()
+        if not p:
+            return False
+        new_status = 'inactive' if p['status'] == 'active' else 'active'
+        cur.execute('UPDATE investment_plans SET status = ? WHERE id = ?', (new_status, plan_id))
+        db.bump_generation(cur.connection, catalog.PLANS_GENERATION)
+        return True
+
+    if not db.write_transaction(toggle):
         flash('Plan not found', 'danger')
         return redirect(url_for('admin_plans'))
-    new_status = 'inactive' if p['status'] == 'active' else 'active'
-    cur.execute('UPDATE investment_plans SET status = ? WHERE id = ?', (new_status, plan_id))
-    conn.commit()
-    conn.close()
+    catalog.invalidate()
     flash('Plan status updated', 'success')
     return redirect(url_for('admin_plans'))
 
+def _review(action, ids):
+    """Run a review.* action over ids in one write transaction; returns {id: outcome}."""
+    return db.write_transaction(lambda cur: action(cur, ids))
+
+
 @app.route('/admin/approve_investment/<int:inv_id>', methods=['POST'])
 @login_required
 @admin_required
 def approve_investment(inv_id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM investments WHERE id = ?', (inv_id,))
-    inv = cur.fetchone()
-    if not inv:
-        flash('Investment not found', 'danger')
-        conn.close()
-        return redirect(url_for('admin_dashboard'))
-    cur.execute('SELECT * FROM investment_plans WHERE id = ?', (inv['plan_id'],))
-    plan = cur.fetchone()
-    if plan:
-        cur.execute('SELECT balance FROM users WHERE id = ?', (inv['user_id'],))
-        user = cur.fetchone()
-        if user:
-            # plan stores amounts in USD (minimum_amount, profit_amount, total_return)
-            profit_usd = plan.get('profit_amount') if isinstance(plan, dict) else plan['profit_amount']
-            new_balance = user['balance'] + profit_usd
-            cur.execute('UPDATE users SET balance = ? WHERE id = ?', (new_balance, inv['user_id']))
-        # ensure investment row stores the amount and initializes current_profit when possible
-        try:
-            amount_val = None
-            try:
-                # if investment row already has amount_usd, leave it
-                amount_val = inv['amount_usd'] if 'amount_usd' in inv.keys() else None
-            except Exception:
-                amount_val = None
-            if amount_val is None:
-                # fallback to plan minimum_amount
-                try:
-                    amt = float(plan['minimum_amount'] if isinstance(plan, dict) else plan['minimum_amount'])
-                except Exception:
-                    amt = 0.0
-                # attempt to add columns if not present will raise OperationalError
-                try:
-                    cur.execute('UPDATE investments SET amount_usd = ?, current_profit = ? WHERE id = ?', (amt, 0.0, inv['id']))
-                except sqlite3.OperationalError:
-                    # older schema without those columns; ignore
-                    pass
-        except Exception:
-            pass
-    cur.execute('UPDATE investments SET status = ? WHERE id = ?', ('active', inv_id))
-    # increment plan_stats.total_investors if plan_stats table exists
-    try:
-        cur.execute('SELECT total_investors FROM plan_stats WHERE plan_id = ?', (inv['plan_id'],))
-        s = cur.fetchone()
-        if s:
-            cur.execute('UPDATE plan_stats SET total_investors = total_investors + 1 WHERE plan_id = ?', (inv['plan_id'],))
-        else:
-            cur.execute('INSERT INTO plan_stats (plan_id, total_views, total_investors) VALUES (?, ?, ?)', (inv['plan_id'], 0, 1))
-    except Exception:
-        pass
-    conn.commit()
-    conn.close()
-    flash('Investment approved and balance updated', 'success')
-    return redirect(url_for('admin_dashboard'))
+    outcome = _review(review.approve_investments, [inv_id])[inv_id]
+    if outcome == 'approved':
+        flash('Investment approved; profit will accrue daily', 'success')
+    else:
+        flash(f'Investment #{inv_id} {outcome}', 'danger')
+    return redirect(url_for('admin_pending_investments'))
 
 @app.route('/admin/reject_investment/<int:inv_id>', methods=['POST'])
 @login_required
 @admin_required
 def reject_investment(inv_id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('UPDATE investments SET status = ? WHERE id = ?', ('rejected', inv_id))
-    conn.commit()
-    conn.close()
-    flash('Investment rejected', 'info')
-    return redirect(url_for('admin_dashboard'))
+    outcome = _review(review.reject_investments, [inv_id])[inv_id]
+    if outcome == 'rejected':
+        flash('Investment rejected', 'info')
+    else:
+        flash(f'Investment #{inv_id} {outcome}', 'danger')
+    return redirect(url_for('admin_pending_investments'))
 
 @app.route('/admin/approve_withdrawal/<int:wid>', methods=['POST'])
 @login_required
 @admin_required
 def approve_withdrawal(wid):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM withdrawals WHERE id = ?', (wid,))
-    w = cur.fetchone()
-    if not w:
-        flash('Withdrawal not found', 'danger')
-        conn.close()
-        return redirect(url_for('admin_dashboard'))
-    cur.execute('SELECT balance FROM users WHERE id = ?', (w['user_id'],))
-    user = cur.fetchone()
-    if user and user['balance'] >= w['amount']:
-        new_bal = user['balance'] - w['amount']
-        cur.execute('UPDATE users SET balance = ? WHERE id = ?', (new_bal, w['user_id']))
-        cur.execute('UPDATE withdrawals SET status = ? WHERE id = ?', ('approved', wid))
-        conn.commit()
+    outcome = _review(review.approve_withdrawals, [wid])[wid]
+    if outcome == 'approved':
         flash('Withdrawal approved and balance deducted', 'success')
-    else:
+    elif outcome == 'insufficient balance':
         flash('Insufficient balance to approve', 'danger')
-    conn.close()
-    return redirect(url_for('admin_dashboard'))
+    else:
+        flash(f'Withdrawal #{wid} {outcome}', 'danger')
+    return redirect(url_for('admin_pending_withdrawals'))
 
 
 @app.route('/admin/investments/<int:inv_id>/edit', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_investment_edit(inv_id):
-    conn = get_db()
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     cur.execute('SELECT * FROM investments WHERE id = ?', (inv_id,))
     inv = cur.fetchone()
+    conn.close()
     if not inv:
-        conn.close()
         flash('Investment not found', 'danger')
         return redirect(url_for('admin_dashboard'))
     # normalize row to dict-like if possible
@@ -985,70 +1000,103 @@ def admin_investment_edit(inv_id):
             new_profit = float(new_profit_raw) if new_profit_raw not in (None, '') else None
         except ValueError:
             new_profit = None
-
-        # ensure column exists, attempt update, otherwise add column and retry
-        try:
-            # fetch existing values for delta computation
-            cur.execute('SELECT current_profit, status, user_id FROM investments WHERE id = ?', (inv_id,))
-            old = cur.fetchone()
-            old_profit = float(old['current_profit']) if old and old['current_profit'] is not None else 0.0
-            old_status = old['status'] if old and 'status' in old.keys() else None
-            user_id = old['user_id'] if old and 'user_id' in old.keys() else None
-
+        # one key per rendered form: a double submit posts the balance change once
+        form_key = request.form.get('idempotency_key')
+
+        def apply(cur):
+            # re-read under the write lock so the delta is against the committed profit
+            row = cur.execute('SELECT user_id, status, current_profit FROM investments WHERE id = ?', (inv_id,)).fetchone()
+            if not row:
+                return
+            old_profit = float(row['current_profit']) if row['current_profit'] is not None else 0.0
+            delta = float(new_profit) - old_profit if new_profit is not None else 0.0
+            if row['user_id'] and delta != 0:
+                # post first: a resubmitted form leaves the investment untouched too
+                if not ledger.post(cur, row['user_id'], delta, 'profit_adjustment', ref=f'investment:{inv_id}',
+                                   key=f'investment_edit:{inv_id}:{form_key}' if form_key else None):
+                    return False
             # update investment row; preserve existing status when possible
-            cur.execute('UPDATE investments SET current_profit = ?, status = ? WHERE id = ?', (new_profit, old_status or 'active', inv_id))
-        except sqlite3.OperationalError:
-            # add column then retry
-            try:
-                cur.execute('ALTER TABLE investments ADD COLUMN current_profit REAL')
-                conn.commit()
-            except Exception:
-                pass
-            cur.execute('SELECT current_profit, status, user_id FROM investments WHERE id = ?', (inv_id,))
-            old = cur.fetchone()
-            old_profit = float(old['current_profit']) if old and old['current_profit'] is not None else 0.0
-            old_status = old['status'] if old and 'status' in old.keys() else None
-            user_id = old['user_id'] if old and 'user_id' in old.keys() else None
-            cur.execute('UPDATE investments SET current_profit = ?, status = ? WHERE id = ?', (new_profit, old_status or 'active', inv_id))
-
-        # adjust user's balance by delta
-        try:
-            delta = 0.0
-            if new_profit is not None:
-                delta = float(new_profit) - float(old_profit)
-            if user_id and delta != 0:
-                cur.execute('SELECT balance FROM users WHERE id = ?', (user_id,))
-                u = cur.fetchone()
-                if u:
-                    new_bal = (u['balance'] or 0.0) + delta
-                    cur.execute('UPDATE users SET balance = ? WHERE id = ?', (new_bal, user_id))
-        except Exception:
-            pass
-
-        conn.commit()
-        conn.close()
+            # the change is recorded as an adjustment, which the accrual engine leaves alone
+            cur.execute('UPDATE investments SET current_profit = ?, profit_adjustment = COALESCE(profit_adjustment, 0) + ?, status = ? WHERE id = ?',
+                        (new_profit, delta, row['status'] or 'active', inv_id))
+            portfolio.refresh(cur, row['user_id'])
+            return True
+
+        if db.write_transaction(apply) is False:
+            flash('This form was already submitted; reload the investment to edit it again', 'warning')
+            return redirect(url_for('admin_dashboard'))
         flash('Investment updated', 'success')
         return redirect(url_for('admin_dashboard'))
 
-    conn.close()
-    return render_template('admin/investment_form.html', inv=inv_dict)
+    return render_template('admin/investment_form.html', inv=inv_dict, idempotency_key=uuid.uuid4().hex)
 
 @app.route('/admin/reject_withdrawal/<int:wid>', methods=['POST'])
 @login_required
 @admin_required
 def reject_withdrawal(wid):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('UPDATE withdrawals SET status = ? WHERE id = ?', ('rejected', wid))
-    conn.commit()
-    conn.close()
-    flash('Withdrawal rejected', 'info')
-    return redirect(url_for('admin_dashboard'))
+    outcome = _review(review.reject_withdrawals, [wid])[wid]
+    if outcome == 'rejected':
+        flash('Withdrawal rejected', 'info')
+    else:
+        flash(f'Withdrawal #{wid} {outcome}', 'danger')
+    return redirect(url_for('admin_pending_withdrawals'))
+
+
+# (review function, outcome that counts as done) per queue and action
+BULK_ACTIONS = {
+    'investments': {'approve': (review.approve_investments, 'approved'), 'reject': (review.reject_investments, 'rejected')},
+    'withdrawals': {'approve': (review.approve_withdrawals, 'approved'), 'reject': (review.reject_withdrawals, 'rejected')},
+}
+
+
+@app.route('/admin/<any(investments, withdrawals):kind>/bulk', methods=['POST'])
+@login_required
+@admin_required
+def admin_bulk_review(kind):
+    """Approve or reject many selected items at once; form posts or JSON ({"action", "ids"})."""
+    data = request.get_json(silent=True) or {}
+    wants_json = request.is_json or request.accept_mimetypes.best == 'application/json'
+    action = BULK_ACTIONS[kind].get(data.get('action') or request.form.get('action'))
+    ids = review.parse_ids(data.get('ids') or request.form.getlist('ids'))
+    back = redirect(url_for(f'admin_pending_{kind}', q=request.form.get('q') or None))
+    if action is None or not ids:
+        if wants_json:
+            return jsonify({'error': 'an action and at least one id are required'}), 400
+        flash('Select at least one item', 'danger')
+        return back
+    func, done = action
+    outcomes = _review(func, ids)
+    if wants_json:
+        return jsonify({'results': [{'id': i, 'outcome': o} for i, o in outcomes.items()]})
+    ok = all(o == done for o in outcomes.values())
+    flash(f'{kind.capitalize()}: {review.summarize(outcomes, done)}', 'success' if ok else 'info')
+    return back
 
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    parsed = blobstore.parse_name(filename)
+    if parsed is None:
+        # legacy uuid-named uploads
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    path = blobstore.path_for(filename)
+    if not os.path.isfile(path):
+        abort(404)
+    clean = images.variant_name(filename, 'clean') if parsed[1] in images.ALLOWED_FORMATS.values() else filename
+    if clean != filename and os.path.isfile(blobstore.path_for(clean)):
+        # an image original keeps its metadata; once the clean copy exists, serve that instead
+        return redirect(url_for('uploaded_file', filename=clean))
+    if blobstore.is_pending(filename):
+        # until the pipeline has run, this URL may still turn into a redirect to the clean copy
+        resp = send_file(path, conditional=True, max_age=0)
+        resp.cache_control.no_cache = True
+        return resp
+    # content-addressed: the name never refers to different bytes, so cache forever
+    digest, suffix = parsed
+    resp = send_file(path, conditional=True, etag=digest + suffix, max_age=31536000)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
 
 
 # Admin: Announcements CRUD
@@ -1056,7 +1104,7 @@ def uploaded_file(filename):
 @login_required
 @admin_required
 def admin_announcements():
-    conn = get_db()
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     try:
         cur.execute('SELECT * FROM announcements ORDER BY id DESC')
@@ -1084,64 +1132,31 @@ def admin_announcements_new():
         video_filename = request.form.get('video_file') or None
         # handle image upload
         if 'image' in request.files and request.files['image'].filename:
-            img = request.files['image']
-            filename = secure_filename(img.filename)
-            unique = f"{uuid.uuid4().hex}_{filename}"
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique)
             try:
-                img_obj = Image.open(img.stream)
-                img_obj.verify()
-                img.stream.seek(0)
-                img.save(save_path)
-                image_filename = unique
-            except Exception:
-                flash('Invalid image uploaded', 'danger')
+                image_filename = save_image_upload(request.files['image'])
+            except images.ImageRejected as e:
+                flash(str(e), 'danger')
                 return redirect(url_for('admin_announcements_new'))
         # handle video upload (optional) - only if not already uploaded via async uploader
         if not video_filename and 'video' in request.files and request.files['video'].filename:
-            vid = request.files['video']
-            vname = secure_filename(vid.filename)
-            vext = os.path.splitext(vname)[1].lower()
-            ALLOWED_VIDEO = ('.mp4', '.webm', '.ogg')
-            if vext not in ALLOWED_VIDEO:
+            try:
+                video_filename = save_video_upload(request.files['video'])
+            except blobstore.BlobTooLarge:
+                flash('Video exceeds maximum allowed size of 20MB', 'danger')
+                return redirect(url_for('admin_announcements_new'))
+            except ValueError:
                 flash('Invalid video type. Allowed: mp4, webm, ogg', 'danger')
                 return redirect(url_for('admin_announcements_new'))
-            unique_v = f"{uuid.uuid4().hex}_{vname}"
-            save_v = os.path.join(app.config['UPLOAD_FOLDER'], unique_v)
-            # stream-save with size check
-            try:
-                total = 0
-                with open(save_v, 'wb') as outp:
-                    chunk = vid.stream.read(8192)
-                    while chunk:
-                        total += len(chunk)
-                        if total > app.config['MAX_VIDEO_FILE_SIZE']:
-                            outp.close()
-                            os.remove(save_v)
-                            flash('Video exceeds maximum allowed size of 20MB', 'danger')
-                            return redirect(url_for('admin_announcements_new'))
-                        outp.write(chunk)
-                        chunk = vid.stream.read(8192)
-                video_filename = unique_v
             except Exception:
-                try:
-                    if os.path.exists(save_v):
-                        os.remove(save_v)
-                except Exception:
-                    pass
                 flash('Failed to save video', 'danger')
                 return redirect(url_for('admin_announcements_new'))
-        conn = get_db()
-        cur = conn.cursor()
-        # try to insert with new columns, fallback if table older
-        try:
+
+        def create(cur):
             cur.execute('INSERT INTO announcements (title, content, image_url, video_url, video_file, display_type, is_active, start_date, end_date, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
                         (title, content, image_filename, video_url, video_filename, display_type, is_active, start_date, end_date, datetime.utcnow().isoformat()))
-        except sqlite3.OperationalError:
-            cur.execute('INSERT INTO announcements (title, content, image_url, video_url, is_active, start_date, end_date, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-                        (title, content, image_filename, video_url, is_active, start_date, end_date, datetime.utcnow().isoformat()))
-        conn.commit()
-        conn.close()
+            blobstore.retain(cur, image_filename)
+            blobstore.retain(cur, video_filename)
+        db.write_transaction(create)
         flash('Announcement created', 'success')
         return redirect(url_for('admin_announcements'))
     return render_template('admin/announcement_form.html', announcement=None)
@@ -1151,12 +1166,12 @@ def admin_announcements_new():
 @login_required
 @admin_required
 def admin_announcements_edit(ann_id):
-    conn = get_db()
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     cur.execute('SELECT * FROM announcements WHERE id = ?', (ann_id,))
     ann = cur.fetchone()
+    conn.close()
     if not ann:
-        conn.close()
         flash('Announcement not found', 'danger')
         return redirect(url_for('admin_announcements'))
     if request.method == 'POST':
@@ -1171,64 +1186,37 @@ def admin_announcements_edit(ann_id):
         video_filename = request.form.get('video_file') or (ann['video_file'] if 'video_file' in ann.keys() else None)
         # handle image upload
         if 'image' in request.files and request.files['image'].filename:
-            img = request.files['image']
-            filename = secure_filename(img.filename)
-            unique = f"{uuid.uuid4().hex}_{filename}"
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique)
             try:
-                img_obj = Image.open(img.stream)
-                img_obj.verify()
-                img.stream.seek(0)
-                img.save(save_path)
-                image_filename = unique
-            except Exception:
-                flash('Invalid image uploaded', 'danger')
+                image_filename = save_image_upload(request.files['image'])
+            except images.ImageRejected as e:
+                flash(str(e), 'danger')
                 return redirect(url_for('admin_announcements_edit', ann_id=ann_id))
         # handle video upload (optional)
         if not video_filename and 'video' in request.files and request.files['video'].filename:
-            vid = request.files['video']
-            vname = secure_filename(vid.filename)
-            vext = os.path.splitext(vname)[1].lower()
-            ALLOWED_VIDEO = ('.mp4', '.webm', '.ogg')
-            if vext not in ALLOWED_VIDEO:
+            try:
+                video_filename = save_video_upload(request.files['video'])
+            except blobstore.BlobTooLarge:
+                flash('Video exceeds maximum allowed size of 20MB', 'danger')
+                return redirect(url_for('admin_announcements_edit', ann_id=ann_id))
+            except ValueError:
                 flash('Invalid video type. Allowed: mp4, webm, ogg', 'danger')
                 return redirect(url_for('admin_announcements_edit', ann_id=ann_id))
-            unique_v = f"{uuid.uuid4().hex}_{vname}"
-            save_v = os.path.join(app.config['UPLOAD_FOLDER'], unique_v)
-            # stream-save with size check
-            try:
-                total = 0
-                with open(save_v, 'wb') as outp:
-                    chunk = vid.stream.read(8192)
-                    while chunk:
-                        total += len(chunk)
-                        if total > app.config['MAX_VIDEO_FILE_SIZE']:
-                            outp.close()
-                            os.remove(save_v)
-                            flash('Video exceeds maximum allowed size of 20MB', 'danger')
-                            return redirect(url_for('admin_announcements_edit', ann_id=ann_id))
-                        outp.write(chunk)
-                        chunk = vid.stream.read(8192)
-                video_filename = unique_v
             except Exception:
-                try:
-                    if os.path.exists(save_v):
-                        os.remove(save_v)
-                except Exception:
-                    pass
                 flash('Failed to save video', 'danger')
                 return redirect(url_for('admin_announcements_edit', ann_id=ann_id))
-        try:
+
+        def update(cur):
+            # swap against the references stored now, not the ones read before the uploads
+            old = cur.execute('SELECT image_url, video_file FROM announcements WHERE id = ?', (ann_id,)).fetchone()
+            if not old:
+                return
             cur.execute('UPDATE announcements SET title = ?, content = ?, image_url = ?, video_url = ?, video_file = ?, display_type = ?, is_active = ?, start_date = ?, end_date = ? WHERE id = ?',
                         (title, content, image_filename, video_url, video_filename, display_type, is_active, start_date, end_date, ann_id))
-        except sqlite3.OperationalError:
-            cur.execute('UPDATE announcements SET title = ?, content = ?, image_url = ?, video_url = ?, is_active = ?, start_date = ?, end_date = ? WHERE id = ?',
-                        (title, content, image_filename, video_url, is_active, start_date, end_date, ann_id))
-        conn.commit()
-        conn.close()
+            blobstore.swap(cur, old['image_url'], image_filename)
+            blobstore.swap(cur, old['video_file'], video_filename)
+        db.write_transaction(update)
         flash('Announcement updated', 'success')
         return redirect(url_for('admin_announcements'))
-    conn.close()
     return render_template('admin/announcement_form.html', announcement=ann)
 
 
@@ -1241,45 +1229,29 @@ def admin_announcements_upload_video():
     vid = request.files['video']
     if vid.filename == '':
         return {'error': 'No selected file'}, 400
-    vname = secure_filename(vid.filename)
-    vext = os.path.splitext(vname)[1].lower()
-    ALLOWED_VIDEO = ('.mp4', '.webm', '.ogg')
-    if vext not in ALLOWED_VIDEO:
-        return {'error': 'Invalid video type'}, 400
-    unique_v = f"{uuid.uuid4().hex}_{vname}"
-    save_v = os.path.join(app.config['UPLOAD_FOLDER'], unique_v)
-    # stream-save with size check
     try:
-        total = 0
-        with open(save_v, 'wb') as outp:
-            chunk = vid.stream.read(8192)
-            while chunk:
-                total += len(chunk)
-                if total > app.config['MAX_VIDEO_FILE_SIZE']:
-                    outp.close()
-                    os.remove(save_v)
-                    return {'error': 'File too large'}, 400
-                outp.write(chunk)
-                chunk = vid.stream.read(8192)
-    except Exception as e:
-        try:
-            if os.path.exists(save_v):
-                os.remove(save_v)
-        except Exception:
-            pass
+        name = save_video_upload(vid)
+    except blobstore.BlobTooLarge:
+        return {'error': 'File too large'}, 400
+    except ValueError:
+        return {'error': 'Invalid video type'}, 400
+    except Exception:
         return {'error': 'Failed to save'}, 500
-    return {'filename': unique_v, 'url': url_for('uploaded_file', filename=unique_v)}
+    # unreferenced until an announcement is saved with it; collected otherwise
+    return {'filename': name, 'url': url_for('uploaded_file', filename=name)}
 
 
 @app.route('/admin/announcements/<int:ann_id>/delete', methods=['POST'])
 @login_required
 @admin_required
 def admin_announcements_delete(ann_id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('DELETE FROM announcements WHERE id = ?', (ann_id,))
-    conn.commit()
-    conn.close()
+    def delete(cur):
+        cur.execute('DELETE FROM announcements WHERE id = ? RETURNING image_url, video_file', (ann_id,))
+        ann = cur.fetchone()
+        if ann:
+            blobstore.release(cur, ann['image_url'])
+            blobstore.release(cur, ann['video_file'])
+    db.write_transaction(delete)
     flash('Announcement deleted', 'info')
     return redirect(url_for('admin_announcements'))
 
@@ -1288,69 +1260,71 @@ def admin_announcements_delete(ann_id):
 @login_required
 @admin_required
 def admin_announcements_toggle(ann_id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('SELECT is_active FROM announcements WHERE id = ?', (ann_id,))
-    row = cur.fetchone()
-    if not row:
-        conn.close()
+    def toggle(cur):
+        cur.execute('SELECT is_active FROM announcements WHERE id = ?', (ann_id,))
+        row = cur.fetchone()
+        if not row:
+            return False
+        new_status = 0 if row['is_active'] == 1 else 1
+        cur.execute('UPDATE announcements SET is_active = ? WHERE id = ?', (new_status, ann_id))
+        return True
+
+    if not db.write_transaction(toggle):
         flash('Announcement not found', 'danger')
         return redirect(url_for('admin_announcements'))
-    new_status = 0 if row['is_active'] == 1 else 1
-    cur.execute('UPDATE announcements SET is_active = ? WHERE id = ?', (new_status, ann_id))
-    conn.commit()
-    conn.close()
     flash('Announcement status updated', 'success')
     return redirect(url_for('admin_announcements'))
 
 
 # --- Assistant API & Admin ---
+def json_document_response(document):
+    """Serve an assistant_docs.JsonDocument, answering 304 when the client's copy is current."""
+    doc = document.get()
+    resp = app.response_class(doc.body, mimetype='application/json')
+    resp.set_etag(doc.etag)
+    resp.last_modified = doc.last_modified
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
+
 @app.route('/assistant/config')
 def assistant_config():
-    conn = get_db()
-    cur = conn.cursor()
+    return json_document_response(assistant_docs.config)
+
+
+@app.route('/assistant/tree')
+def assistant_tree_snapshot():
+    """The whole node/option graph as one document; the widget walks it locally."""
     try:
-        cur.execute('SELECT * FROM assistant_config WHERE id = 1')
-        cfg = cur.fetchone()
-        if cfg:
-            return jsonify({
-                'enabled': bool(cfg['enabled']),
-                'button_label': cfg['button_label'] or 'Help',
-                'assistant_name': cfg['assistant_name'] or 'Assistant',
-                'avatar_url': cfg['avatar_url']
-            })
+        snap = assistant_tree.snapshot()
     except Exception:
-        pass
-    return jsonify({'enabled': False})
+        return jsonify({'error': 'failed'}), 500
+    if snap.version in request.if_none_match:
+        resp = app.response_class(status=304)
+    else:
+        resp = app.response_class(snap.body, mimetype='application/json')
+    resp.set_etag(snap.version)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
 
 
 @app.route('/assistant/start')
 def assistant_start():
-    conn = get_db()
-    cur = conn.cursor()
     try:
-        cur.execute('SELECT * FROM assistant_nodes WHERE is_root = 1 LIMIT 1')
-        node = cur.fetchone()
-        if not node:
-            return jsonify({'error': 'No assistant configured'}), 404
-        cur.execute('SELECT * FROM assistant_options WHERE node_id = ? ORDER BY display_order', (node['id'],))
-        opts = cur.fetchall()
-        return jsonify({'node': dict(node), 'options': [dict(o) for o in opts]})
+        entry = assistant_tree.get_root()
     except Exception:
         return jsonify({'error': 'failed'}), 500
+    if not entry:
+        return jsonify({'error': 'No assistant configured'}), 404
+    return jsonify(entry)
 
 
 @app.route('/assistant/node/<int:node_id>')
 def assistant_node(node_id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM assistant_nodes WHERE id = ?', (node_id,))
-    node = cur.fetchone()
-    if not node:
+    entry = assistant_tree.get_node(node_id)
+    if not entry:
         return jsonify({'error': 'not found'}), 404
-    cur.execute('SELECT * FROM assistant_options WHERE node_id = ? ORDER BY display_order', (node_id,))
-    opts = cur.fetchall()
-    return jsonify({'node': dict(node), 'options': [dict(o) for o in opts]})
+    return jsonify(entry)
 
 
 @app.route('/assistant/log', methods=['POST'])
@@ -1360,16 +1334,8 @@ def assistant_log():
     option_id = data.get('option_id')
     user_id = data.get('user_id')
     metadata = data.get('metadata')
-    conn = get_db()
-    cur = conn.cursor()
-    try:
-        cur.execute('INSERT INTO assistant_logs (node_id, option_id, user_id, metadata, created_at) VALUES (?, ?, ?, ?, ?)',
-                    (node_id, option_id, user_id, metadata, datetime.utcnow().isoformat()))
-        conn.commit()
-    except Exception:
-        conn.rollback()
-    finally:
-        conn.close()
+    # written in batches by the background log writer
+    logqueue.enqueue(node_id, option_id, user_id, metadata)
     return jsonify({'status': 'ok'})
 
 
@@ -1400,102 +1366,35 @@ def assistant_query():
     model = os.environ.get('OPENAI_MODEL', 'gpt-3.5-turbo')
     reply = None
     if api_key:
-        payload = {
-            'model': model,
-            'messages': [
-                {'role': 'system', 'content': 'You are an investment assistant. Answer concisely and safely.'},
-                {'role': 'user', 'content': message}
-            ],
-            'max_tokens': 500
-        }
-        try:
-            req = urllib.request.Request('https://api.openai.com/v1/chat/completions', data=json.dumps(payload).encode('utf-8'),
-                                         headers={'Content-Type': 'application/json', 'Authorization': 'Bearer ' + api_key})
-            with urllib.request.urlopen(req, timeout=30) as resp:
-                res = json.load(resp)
-                if isinstance(res, dict) and res.get('choices'):
-                    choice = res['choices'][0]
-                    if isinstance(choice, dict) and choice.get('message'):
-                        reply = choice['message'].get('content', '')
-        except Exception:
-            # fall through to simple reply on any error
-            reply = None
+        # runs on the bounded llm pool; None when busy, late or failing
+        reply = llm.complete(message, api_key, model)
 
     if not reply:
         reply = _simple_assistant_reply(message)
 
     # Log the user query to assistant_logs for analytics
-    try:
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute('INSERT INTO assistant_logs (node_id, option_id, user_id, metadata, created_at) VALUES (?, ?, ?, ?, ?)',
-                    (None, None, user_id, json.dumps({'message': message, 'reply': reply}), datetime.utcnow().isoformat()))
-        conn.commit()
-    except Exception:
-        try:
-            conn.rollback()
-        except Exception:
-            pass
-    finally:
-        try:
-            if conn:
-                conn.close()
-        except Exception:
-            pass
+    logqueue.enqueue(None, None, user_id, json.dumps({'message': message, 'reply': reply}))
 
     return jsonify({'reply': reply})
 
 
 @app.route('/assistant/plans')
 def assistant_plans():
-    conn = get_db()
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT id, plan_name, minimum_amount, profit_amount, total_return, duration_days FROM investment_plans WHERE status = 'active' ORDER BY id")
-        rows = cur.fetchall()
-        plans = [dict(r) for r in rows]
-        return jsonify({'plans': plans})
-    except Exception:
-        return jsonify({'plans': []})
+    return json_document_response(assistant_docs.plans)
 
 
 @app.route('/assistant/testimonials')
 def assistant_testimonials():
-    # Prefer testimonials from DB if table exists, otherwise fall back to static list
-    try:
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute("SELECT name AS title, body FROM testimonials ORDER BY id DESC")
-        rows = cur.fetchall()
-        if rows:
-            return jsonify({'testimonials': [dict(r) for r in rows]})
-    except Exception:
-        pass
-    finally:
-        try:
-            if conn:
-                conn.close()
-        except Exception:
-            pass
-
-    testimonials = [
-        {'title': 'John M.', 'body': 'Turned $200 into consistent weekly profits.'},
-        {'title': 'Sarah K.', 'body': 'Recovered her starting capital in 3 weeks.'},
-        {'title': 'David A.', 'body': 'Upgraded from Starter to Gold within a month.'}
-    ]
-    return jsonify({'testimonials': testimonials})
+    return json_document_response(assistant_docs.testimonials)
 
 
 @app.route('/assistant/info')
 def assistant_info():
-    desc = 'This program helps members participate in our trading and investment system. Members choose a plan, activate their account, and monitor progress from their dashboard. Our goal is to make the process simple, transparent, and rewarding.'
-    return jsonify({'description': desc})
+    return json_document_response(assistant_docs.info)
 
 
-@app.route('/assistant/contact')
-def assistant_contact():
+def _public_contact(contact):
     # Pull admin contact from config file first, then env
-    contact = read_admin_contact()
     name = contact.get('name') or os.environ.get('ADMIN_NAME', 'Mr. Simon')
     phone = contact.get('phone') or os.environ.get('ADMIN_PHONE', '+234XXXXXXXXX')
     whatsapp_raw = contact.get('whatsapp') or os.environ.get('ADMIN_WHATSAPP', '')
@@ -1506,22 +1405,67 @@ def assistant_contact():
             wa = 'https://wa.me/' + whatsapp_raw.replace('+', '').replace(' ', '')
     else:
         wa = ''
-    return jsonify({'name': name, 'phone': phone, 'whatsapp': wa})
+    return {'name': name, 'phone': phone, 'whatsapp': wa}
+
+
+# rebuilt whenever admin_contact_file hands out a newly read dict
+contact_document = assistant_docs.JsonDocument(lambda: admin_contact_file.get(), _public_contact)
+
+
+@app.route('/assistant/contact')
+def assistant_contact():
+    return json_document_response(contact_document)
+
+
+@app.template_filter('money')
+def money_filter(amount_usd, currency_code=None):
+    # format a USD amount in the viewer's currency; falls back to the USD figure when no rate is known
+    value = currency.convert_usd_to(currency_code, amount_usd) if currency_code else None
+    if value is None:
+        try:
+            value = float(amount_usd or 0)
+        except (TypeError, ValueError):
+            value = 0.0
+    return '%.2f' % value
+
+
+@app.template_global()
+def asset_url(filename):
+    """Fingerprinted URL for a static asset, or the plain static URL if it was not built."""
+    hashed = assets.url_path(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('asset_file', filename=hashed)
+
+
+@app.route('/assets/<path:filename>')
+def asset_file(filename):
+    if not assets.is_fingerprinted(filename):
+        abort(404)
+    path, encoding = assets.pick_encoding(filename, request.accept_encodings)
+    resp = send_file(path, mimetype=mimetypes.guess_type(filename)[0], conditional=True,
+                     etag=f'{filename}:{encoding or "identity"}', max_age=31536000)
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    resp.vary.add('Accept-Encoding')
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
+
+
+admin_contact_file = configfile.JsonConfig(os.path.join(BASE_DIR, 'config', 'admin_contact.json'))
+# (contact dict, template variables derived from it)
+_contact_context = (None, None)
 
 
 @app.context_processor
 def inject_admin_contact():
     # expose admin contact info to all templates (reads from config file first, then env)
-    cfg_dir = os.path.join(BASE_DIR, 'config')
-    cfg_file = os.path.join(cfg_dir, 'admin_contact.json')
-    contact = {}
-    try:
-        if os.path.exists(cfg_file):
-            with open(cfg_file, 'r', encoding='utf-8') as f:
-                contact = json.load(f) or {}
-    except Exception:
-        contact = {}
-
+    global _contact_context
+    contact = admin_contact_file.get()
+    cached, context = _contact_context
+    if cached is contact:
+        return context
     name = contact.get('name') or os.environ.get('ADMIN_NAME', 'Mr. Simon')
     phone = contact.get('phone') or os.environ.get('ADMIN_PHONE', '+16727023654')
     whatsapp_raw = contact.get('whatsapp') or os.environ.get('ADMIN_WHATSAPP', '')
@@ -1532,53 +1476,39 @@ def inject_admin_contact():
             wa = 'https://wa.me/' + whatsapp_raw.replace('+', '').replace(' ', '')
     else:
         wa = ''
-    return dict(ADMIN_NAME=name, ADMIN_PHONE=phone, ADMIN_WHATSAPP_URL=wa, ADMIN_WHATSAPP_RAW=whatsapp_raw, ADMIN_CONTACT=contact)
-
-
-def _ensure_config_dir():
-    cfg_dir = os.path.join(BASE_DIR, 'config')
-    os.makedirs(cfg_dir, exist_ok=True)
-    return cfg_dir
+    context = dict(ADMIN_NAME=name, ADMIN_PHONE=phone, ADMIN_WHATSAPP_URL=wa, ADMIN_WHATSAPP_RAW=whatsapp_raw, ADMIN_CONTACT=contact)
+    _contact_context = (contact, context)
+    return context
 
 
 def read_admin_contact():
-    cfg_dir = _ensure_config_dir()
-    cfg_file = os.path.join(cfg_dir, 'admin_contact.json')
-    if os.path.exists(cfg_file):
-        try:
-            with open(cfg_file, 'r', encoding='utf-8') as f:
-                return json.load(f) or {}
-        except Exception:
-            return {}
-    return {}
+    return dict(admin_contact_file.get())
 
 
 def write_admin_contact(data):
-    cfg_dir = _ensure_config_dir()
-    cfg_file = os.path.join(cfg_dir, 'admin_contact.json')
-    try:
-        with open(cfg_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception:
-        return False
+    return admin_contact_file.write(data)
 
 
 @app.route('/admin/assistant/logs')
 @login_required
 @admin_required
 def admin_assistant_logs():
+    try:
+        # include clicks still waiting in the log queue
+        logqueue.flush()
+    except Exception:
+        pass
     node_id = request.args.get('node_id')
     option_id = request.args.get('option_id')
     user_id = request.args.get('user_id')
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    try:
-        page = int(request.args.get('page', 1))
-    except ValueError:
-        page = 1
+    # keyset pagination on (created_at, id): deep pages cost the same as the first
+    after = pagination.decode_cursor(request.args.get('after'), 2)
+    before = pagination.decode_cursor(request.args.get('before'), 2)
+    want_count = request.args.get('count') == '1'
     PER_PAGE = 50
-    conn = get_db()
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     # build where clauses
     where = 'WHERE 1=1'
@@ -1598,21 +1528,41 @@ def admin_assistant_logs():
     if end_date:
         where += ' AND l.created_at <= ?'
         params.append(end_date)
-
-    count_sql = 'SELECT COUNT(*) as cnt FROM assistant_logs l LEFT JOIN assistant_nodes a ON l.node_id = a.id LEFT JOIN assistant_options o ON l.option_id = o.id ' + where
+    filtered = len(params) > 0
+
+    page_where = where
+    page_params = list(params)
+    order = 'DESC'
+    if after:
+        page_where += ' AND (l.created_at, l.id) < (?, ?)'
+        page_params += after
+    elif before:
+        page_where += ' AND (l.created_at, l.id) > (?, ?)'
+        page_params += before
+        order = 'ASC'
+    total = None
+    total_is_estimate = False
     try:
-        cur.execute(count_sql, params)
-        total = cur.fetchone()['cnt']
-
-        offset = (page - 1) * PER_PAGE
         sql = '''SELECT l.*, a.question as node_question, o.option_text as option_text
                  FROM assistant_logs l
                  LEFT JOIN assistant_nodes a ON l.node_id = a.id
                  LEFT JOIN assistant_options o ON l.option_id = o.id
-        ''' + where + ' ORDER BY l.created_at DESC LIMIT ? OFFSET ?'
-        exec_params = list(params) + [PER_PAGE, offset]
-        cur.execute(sql, exec_params)
+        ''' + page_where + f' ORDER BY l.created_at {order}, l.id {order} LIMIT ?'
+        # one extra row tells us whether another page exists
+        cur.execute(sql, page_params + [PER_PAGE + 1])
         rows = cur.fetchall()
+        has_more = len(rows) > PER_PAGE
+        rows = rows[:PER_PAGE]
+        if before:
+            rows.reverse()
+        if want_count:
+            cur.execute('SELECT COUNT(*) as cnt FROM assistant_logs l ' + where, params)
+            total = cur.fetchone()['cnt']
+        elif not filtered:
+            # ids are only ever appended, so MAX(id) is an O(1) estimate of the row count
+            cur.execute('SELECT MAX(id) as cnt FROM assistant_logs')
+            total = cur.fetchone()['cnt'] or 0
+            total_is_estimate = True
         # fetch nodes/options for filters
         cur.execute('SELECT id, question FROM assistant_nodes ORDER BY id')
         nodes = cur.fetchall()
@@ -1623,114 +1573,104 @@ def admin_assistant_logs():
         rows = []
         nodes = []
         options = []
-        total = 0
+        has_more = False
     finally:
         conn.close()
 
-    total_pages = max(1, (total + PER_PAGE - 1) // PER_PAGE)
-    return render_template('admin/assistant_logs.html', rows=rows, nodes=nodes, options=options, filters=request.args, page=page, total_pages=total_pages)
+    next_cursor = None
+    prev_cursor = None
+    if rows:
+        if has_more or before:
+            next_cursor = pagination.encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+        if after or (before and has_more):
+            prev_cursor = pagination.encode_cursor(rows[0]['created_at'], rows[0]['id'])
+    filters = {k: v for k, v in request.args.items() if k not in ('after', 'before', 'page')}
+    return render_template('admin/assistant_logs.html', rows=rows, nodes=nodes, options=options, filters=filters,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor, total=total, total_is_estimate=total_is_estimate)
 
 
 @app.route('/admin/assistant/logs/export')
 @login_required
 @admin_required
 def admin_assistant_logs_export():
-    node_id = request.args.get('node_id')
-    option_id = request.args.get('option_id')
-    user_id = request.args.get('user_id')
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    conn = get_db()
-    cur = conn.cursor()
-    sql = '''SELECT l.*, a.question as node_question, o.option_text as option_text
-             FROM assistant_logs l
-             LEFT JOIN assistant_nodes a ON l.node_id = a.id
-             LEFT JOIN assistant_options o ON l.option_id = o.id
-             WHERE 1=1'''
-    params = []
-    if node_id:
-        sql += ' AND l.node_id = ?'
-        params.append(node_id)
-    if option_id:
-        sql += ' AND l.option_id = ?'
-        params.append(option_id)
-    if user_id:
-        sql += ' AND l.user_id = ?'
-        params.append(user_id)
-    if start_date:
-        sql += ' AND l.created_at >= ?'
-        params.append(start_date)
-    if end_date:
-        sql += ' AND l.created_at <= ?'
-        params.append(end_date)
-    sql += ' ORDER BY l.created_at DESC'
     try:
-        cur.execute(sql, params)
-        rows = cur.fetchall()
-    except sqlite3.OperationalError:
-        # missing tables; return empty CSV
-        rows = []
-
-    # build CSV
-    si = io.StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['id','created_at','user_id','node_id','node_question','option_id','option_text','metadata'])
-    for r in rows:
-        # r may be sqlite3.Row or dict-like
-        try:
-            node_q = r.get('node_question') if hasattr(r, 'get') else (r['node_question'] if 'node_question' in r.keys() else None)
-        except Exception:
-            node_q = None
-        try:
-            opt_text = r.get('option_text') if hasattr(r, 'get') else (r['option_text'] if 'option_text' in r.keys() else None)
-        except Exception:
-            opt_text = None
-        cw.writerow([r['id'], r['created_at'], r['user_id'], r['node_id'], node_q, r['option_id'], opt_text, r['metadata']])
-    csv_content = si.getvalue()
-    # persist export file for history
-    filename = f"assistant_logs_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex}.csv"
-    save_path = os.path.join(EXPORT_FOLDER, filename)
-    try:
-        with open(save_path, 'w', encoding='utf-8', newline='') as f:
-            f.write(csv_content)
-        # record in assistant_exports table if it exists
-        try:
-            filters_json = json.dumps(dict(request.args))
-            cur.execute('INSERT INTO assistant_exports (filename, filters, created_at) VALUES (?, ?, ?)', (filename, filters_json, datetime.utcnow().isoformat()))
-            conn.commit()
-        except Exception:
-            # if table missing or insert fails, ignore
-            conn.rollback()
+        # include clicks still waiting in the log queue
+        logqueue.flush()
     except Exception:
-        # if saving file fails, continue to return CSV directly
         pass
-    output = make_response(csv_content)
-    output.headers['Content-Type'] = 'text/csv'
+    filters = {k: request.args.get(k) for k in exports.FILTER_KEYS if request.args.get(k)}
+    compress = request.args.get('gzip') == '1'
+    filename = exports.new_filename(compress)
+    # streamed page by page, each on a short-lived reader; a copy is saved under static/exports
+    output = app.response_class(exports.stream_export(filters, filename, compress=compress),
+                                mimetype='application/gzip' if compress else 'text/csv')
     output.headers['Content-Disposition'] = f'attachment; filename={filename}'
-    conn.close()
     return output
 
 
+@app.route('/admin/assistant/logs/export/job', methods=['POST'])
+@login_required
+@admin_required
+def admin_assistant_logs_export_job():
+    try:
+        logqueue.flush()
+    except Exception:
+        pass
+    filters = {k: request.form.get(k) for k in exports.FILTER_KEYS if request.form.get(k)}
+    job_id = exports.enqueue_job(filters)
+    flash(f'Export #{job_id} queued', 'info')
+    return redirect(url_for('admin_assistant_exports'))
+
+
 @app.route('/admin/assistant/exports')
 @login_required
 @admin_required
 def admin_assistant_exports():
-    conn = get_db()
+    # (re)start the worker so jobs queued before a restart get picked up
+    exports.start_worker()
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     try:
-        cur.execute('SELECT * FROM assistant_exports ORDER BY id DESC')
-        exports = cur.fetchall()
+        cur.execute('SELECT * FROM assistant_exports ORDER BY id DESC LIMIT 200')
+        rows = cur.fetchall()
     except Exception:
-        exports = []
+        rows = []
     conn.close()
-    return render_template('admin/assistant_exports.html', exports=exports)
+    active = any(r['status'] in ('queued', 'running') for r in rows)
+    return render_template('admin/assistant_exports.html', exports=rows, active=active)
+
+
+@app.route('/admin/assistant/exports/<int:export_id>/status')
+@login_required
+@admin_required
+def admin_assistant_export_status(export_id):
+    job = exports.get_job(export_id)
+    if not job:
+        return jsonify({'error': 'not found'}), 404
+    return jsonify({k: job[k] for k in ('id', 'status', 'rows_processed', 'bytes_written', 'error', 'created_at', 'finished_at')})
+
+
+@app.route('/admin/assistant/exports/<int:export_id>/download')
+@login_required
+@admin_required
+def admin_assistant_export_download(export_id):
+    job = exports.get_job(export_id)
+    if not job or job['status'] != 'done':
+        flash('Export not available', 'warning')
+        return redirect(url_for('admin_assistant_exports'))
+    path = os.path.join(EXPORT_FOLDER, os.path.basename(job['filename']))
+    if not os.path.isfile(path):
+        flash('Export file has been removed', 'warning')
+        return redirect(url_for('admin_assistant_exports'))
+    # conditional=True answers Range / If-Range requests, so interrupted downloads resume
+    return send_file(path, as_attachment=True, download_name=job['filename'], conditional=True, max_age=0)
 
 
 @app.route('/admin/assistant')
 @login_required
 @admin_required
 def admin_assistant_list():
-    conn = get_db()
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     cur.execute('SELECT * FROM assistant_nodes ORDER BY id DESC')
     nodes = cur.fetchall()
@@ -1738,6 +1678,26 @@ def admin_assistant_list():
     return render_template('admin/assistant_list.html', nodes=nodes)
 
 
+def _assistant_option_rows():
+    """(option_text, next_node_id, action_type, action_payload, display_order) rows from the node form."""
+    rows = []
+    texts = request.form.getlist('option_text[]')
+    nexts = request.form.getlist('option_next[]')
+    actions = request.form.getlist('option_action[]')
+    payloads = request.form.getlist('option_payload[]')
+    for i, t in enumerate(texts):
+        if not t.strip():
+            continue
+        nxt = int(nexts[i]) if nexts and i < len(nexts) and nexts[i].isdigit() else None
+        act = actions[i] if actions and i < len(actions) else None
+        pay = payloads[i] if payloads and i < len(payloads) else None
+        rows.append((t, nxt, act, pay, i))
+    return rows
+
+
+_OPTION_INSERT = 'INSERT INTO assistant_options (node_id, option_text, next_node_id, action_type, action_payload, display_order) VALUES (?, ?, ?, ?, ?, ?)'
+
+
 @app.route('/admin/assistant/new', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -1745,29 +1705,20 @@ def admin_assistant_new():
     if request.method == 'POST':
         question = request.form.get('question')
         is_root = 1 if request.form.get('is_root') == 'on' else 0
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute('INSERT INTO assistant_nodes (question, is_root, created_at) VALUES (?, ?, ?)', (question, is_root, datetime.utcnow().isoformat()))
-        nid = cur.lastrowid
-        # insert options
-        texts = request.form.getlist('option_text[]')
-        nexts = request.form.getlist('option_next[]')
-        actions = request.form.getlist('option_action[]')
-        payloads = request.form.getlist('option_payload[]')
-        for i, t in enumerate(texts):
-            if not t.strip():
-                continue
-            nxt = int(nexts[i]) if nexts and i < len(nexts) and nexts[i].isdigit() else None
-            act = actions[i] if actions and i < len(actions) else None
-            pay = payloads[i] if payloads and i < len(payloads) else None
-            cur.execute('INSERT INTO assistant_options (node_id, option_text, next_node_id, action_type, action_payload, display_order) VALUES (?, ?, ?, ?, ?, ?)',
-                        (nid, t, nxt, act, pay, i))
-        conn.commit()
-        conn.close()
+        options = _assistant_option_rows()
+
+        def create(cur):
+            cur.execute('INSERT INTO assistant_nodes (question, is_root, created_at) VALUES (?, ?, ?)', (question, is_root, datetime.utcnow().isoformat()))
+            nid = cur.lastrowid
+            # insert options
+            cur.executemany(_OPTION_INSERT, [(nid,) + row for row in options])
+            db.bump_generation(cur.connection, assistant_tree.TREE_GENERATION)
+        db.write_transaction(create)
+        assistant_tree.invalidate()
         flash('Assistant node created', 'success')
         return redirect(url_for('admin_assistant_list'))
     # fetch nodes for possible next targets
-    conn = get_db()
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     cur.execute('SELECT id, question FROM assistant_nodes ORDER BY id')
     nodes = cur.fetchall()
@@ -1779,7 +1730,7 @@ def admin_assistant_new():
 @login_required
 @admin_required
 def admin_assistant_edit(node_id):
-    conn = get_db()
+    conn = get_db(readonly=True)
     cur = conn.cursor()
     cur.execute('SELECT * FROM assistant_nodes WHERE id = ?', (node_id,))
     node = cur.fetchone()
@@ -1790,23 +1741,17 @@ def admin_assistant_edit(node_id):
     if request.method == 'POST':
         question = request.form.get('question')
         is_root = 1 if request.form.get('is_root') == 'on' else 0
-        cur.execute('UPDATE assistant_nodes SET question = ?, is_root = ? WHERE id = ?', (question, is_root, node_id))
-        # replace options
-        cur.execute('DELETE FROM assistant_options WHERE node_id = ?', (node_id,))
-        texts = request.form.getlist('option_text[]')
-        nexts = request.form.getlist('option_next[]')
-        actions = request.form.getlist('option_action[]')
-        payloads = request.form.getlist('option_payload[]')
-        for i, t in enumerate(texts):
-            if not t.strip():
-                continue
-            nxt = int(nexts[i]) if nexts and i < len(nexts) and nexts[i].isdigit() else None
-            act = actions[i] if actions and i < len(actions) else None
-            pay = payloads[i] if payloads and i < len(payloads) else None
-            cur.execute('INSERT INTO assistant_options (node_id, option_text, next_node_id, action_type, action_payload, display_order) VALUES (?, ?, ?, ?, ?, ?)',
-                        (node_id, t, nxt, act, pay, i))
-        conn.commit()
+        options = _assistant_option_rows()
         conn.close()
+
+        def update(cur):
+            cur.execute('UPDATE assistant_nodes SET question = ?, is_root = ? WHERE id = ?', (question, is_root, node_id))
+            # replace options
+            cur.execute('DELETE FROM assistant_options WHERE node_id = ?', (node_id,))
+            cur.executemany(_OPTION_INSERT, [(node_id,) + row for row in options])
+            db.bump_generation(cur.connection, assistant_tree.TREE_GENERATION)
+        db.write_transaction(update)
+        assistant_tree.invalidate()
         flash('Node updated', 'success')
         return redirect(url_for('admin_assistant_list'))
     cur.execute('SELECT * FROM assistant_options WHERE node_id = ? ORDER BY display_order', (node_id,))
@@ -1821,16 +1766,14 @@ def admin_assistant_edit(node_id):
 @login_required
 @admin_required
 def admin_assistant_delete(node_id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute('DELETE FROM assistant_options WHERE node_id = ?', (node_id,))
-    cur.execute('DELETE FROM assistant_nodes WHERE id = ?', (node_id,))
-    conn.commit()
-    conn.close()
+    def delete(cur):
+        cur.execute('DELETE FROM assistant_options WHERE node_id = ?', (node_id,))
+        cur.execute('DELETE FROM assistant_nodes WHERE id = ?', (node_id,))
+        db.bump_generation(cur.connection, assistant_tree.TREE_GENERATION)
+    db.write_transaction(delete)
+    assistant_tree.invalidate()
     flash('Node deleted', 'info')
     return redirect(url_for('admin_assistant_list'))
 
 if __name__ == '__main__':
-    if not os.path.exists(DB_PATH):
-        init_db()
-    app.run(debug=True)
+    create_app().run(debug=True)
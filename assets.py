@@ -0,0 +1,121 @@
+"""Fingerprinted, precompressed static assets.
+
+build() copies each file in ASSETS to static/dist/<dir>/<name>.<hash><ext>,
+naming it after the first 12 hex digits of its SHA-256. It also writes .gz
+(and .br when the brotli package is installed) siblings and records the
+mapping in static/dist/manifest.json. Templates call asset_url('css/style.css')
+and the /assets/ route serves the best encoding the client accepts. A
+fingerprinted name never changes content, so responses are cached as
+immutable.
+
+Run `python scripts/build_assets.py` on deploy; app start also rebuilds when
+the manifest is missing or older than a source file.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+import db
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+STATIC_DIR = os.path.join(db.BASE_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+ASSETS = (
+    'css/style.css',
+    'css/assistant_widget.css',
+    'js/app.js',
+    'js/assistant_widget.js',
+)
+# (suffix, Content-Encoding) in order of preference
+ENCODINGS = (('.br', 'br'), ('.gz', 'gzip'))
+
+_manifest = {}
+
+
+def _write(path, data):
+    # a unique temp file per writer: workers starting together may build at once
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp creates 0600; static files must stay readable by a front web server
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def build():
+    """Fingerprint and precompress every asset. Returns the manifest."""
+    manifest = {}
+    for logical in ASSETS:
+        with open(os.path.join(STATIC_DIR, logical), 'rb') as f:
+            data = f.read()
+        stem, ext = os.path.splitext(logical)
+        hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        target = os.path.join(DIST_DIR, hashed)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            _write(target, data)
+            # mtime=0 keeps the .gz bytes reproducible across builds
+            _write(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write(target + '.br', brotli.compress(data, quality=11))
+        manifest[logical] = hashed
+    os.makedirs(DIST_DIR, exist_ok=True)
+    _write(MANIFEST_PATH, json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def _stale():
+    try:
+        built = os.path.getmtime(MANIFEST_PATH)
+    except OSError:
+        return True
+    for logical in ASSETS:
+        try:
+            if os.path.getmtime(os.path.join(STATIC_DIR, logical)) > built:
+                return True
+        except OSError:
+            pass
+    return False
+
+
+def load(rebuild_if_stale=True):
+    """Load the manifest into memory, building it first if needed."""
+    global _manifest
+    if rebuild_if_stale and _stale():
+        _manifest = build()
+    else:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            _manifest = json.load(f)
+    return _manifest
+
+
+def url_path(logical):
+    """dist-relative fingerprinted path for `logical`, or None if it is not a built asset."""
+    return _manifest.get(logical)
+
+
+def is_fingerprinted(path):
+    return path in _manifest.values()
+
+
+def pick_encoding(path, accept_encodings):
+    """(file path on disk, Content-Encoding or None) for the best variant the client accepts."""
+    full = os.path.join(DIST_DIR, *path.split('/'))
+    for suffix, encoding in ENCODINGS:
+        if accept_encodings[encoding] and os.path.exists(full + suffix):
+            return full + suffix, encoding
+    return full, None
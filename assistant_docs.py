@@ -0,0 +1,144 @@
+"""Pre-serialized JSON bodies for the public assistant endpoints.
+
+/assistant/config, /plans, /testimonials, /info and /contact change rarely,
+but the widget fetches them every time it opens. Each endpoint keeps a
+JsonDocument. The document serializes its payload once per version of its
+source and serves the bytes with a strong content-hash ETag and a
+Last-Modified. Repeat requests become a 304 without touching the database.
+The plan catalog tracks its own changes. assistant_config and testimonials
+have no writer in the app (they are edited by scripts or by hand), so they
+are re-read every RELOAD_INTERVAL seconds instead.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import catalog
+import db
+
+RELOAD_INTERVAL = 30.0
+
+Document = namedtuple('Document', 'etag last_modified body')
+
+DEFAULT_TESTIMONIALS = (
+    {'title': 'John M.', 'body': 'Turned $200 into consistent weekly profits.'},
+    {'title': 'Sarah K.', 'body': 'Recovered her starting capital in 3 weeks.'},
+    {'title': 'David A.', 'body': 'Upgraded from Starter to Gold within a month.'},
+)
+INFO = {'description': 'This program helps members participate in our trading and investment system. Members choose a plan, activate their account, and monitor progress from their dashboard. Our goal is to make the process simple, transparent, and rewarding.'}
+
+
+class JsonDocument:
+    """`render(source())` as JSON bytes, rebuilt only when source() returns a new object.
+
+    Sources are caches that hand out the same object until their data changes,
+    so the identity check is the whole cost of a hit.
+    """
+
+    def __init__(self, source, render=None):
+        self.source = source
+        self.render = render or (lambda value: value)
+        # (source value, Document)
+        self._state = None
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self):
+        value = self.source()
+        state = self._state
+        if state is not None and state[0] is value:
+            return state[1]
+        with self._lock:
+            state = self._state
+            if state is not None and state[0] is value:
+                return state[1]
+            body = json.dumps(self.render(value), separators=(',', ':')).encode('utf-8')
+            etag = hashlib.sha1(body).hexdigest()[:16]
+            if state is not None and state[1].etag == etag:
+                # same bytes under a new source version: keep the old Last-Modified
+                doc = state[1]
+            else:
+                doc = Document(etag=etag, last_modified=datetime.now(timezone.utc).replace(microsecond=0), body=body)
+                self.builds += 1
+            self._state = (value, doc)
+            return doc
+
+    def stats(self):
+        state = self._state
+        return {'builds': self.builds, 'etag': state[1].etag if state else None}
+
+
+class Reloading:
+    """loader() re-run at most once every `interval` seconds.
+
+    An unchanged result keeps the previous object, so documents built on it
+    stay cached.
+    """
+
+    def __init__(self, loader, interval=RELOAD_INTERVAL):
+        self.loader = loader
+        self.interval = interval
+        # (value, loaded_at)
+        self._state = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        state = self._state
+        if state is not None and time.monotonic() - state[1] < self.interval:
+            return state[0]
+        with self._lock:
+            state = self._state
+            if state is not None and time.monotonic() - state[1] < self.interval:
+                return state[0]
+            value = self.loader()
+            if state is not None and state[0] == value:
+                value = state[0]
+            self._state = (value, time.monotonic())
+            return value
+
+
+def _render_plans(plans):
+    return {'plans': [
+        {'id': p.id, 'plan_name': p.plan_name, 'minimum_amount': p.minimum_amount, 'profit_amount': p.profit_amount,
+         'total_return': p.total_return, 'duration_days': p.duration_days}
+        for p in reversed(plans)
+    ]}
+
+
+def _load_config():
+    conn = db.get_db(readonly=True)
+    try:
+        cfg = conn.execute('SELECT * FROM assistant_config WHERE id = 1').fetchone()
+    except Exception:
+        cfg = None
+    finally:
+        conn.close()
+    if not cfg:
+        return {'enabled': False}
+    return {
+        'enabled': bool(cfg['enabled']),
+        'button_label': cfg['button_label'] or 'Help',
+        'assistant_name': cfg['assistant_name'] or 'Assistant',
+        'avatar_url': cfg['avatar_url'],
+    }
+
+
+def _load_testimonials():
+    # Prefer testimonials from DB if table exists, otherwise fall back to static list
+    conn = db.get_db(readonly=True)
+    try:
+        rows = conn.execute('SELECT name AS title, body FROM testimonials ORDER BY id DESC').fetchall()
+    except Exception:
+        rows = []
+    finally:
+        conn.close()
+    return {'testimonials': [dict(r) for r in rows] if rows else list(DEFAULT_TESTIMONIALS)}
+
+
+config = JsonDocument(Reloading(_load_config).get)
+testimonials = JsonDocument(Reloading(_load_testimonials).get)
+plans = JsonDocument(catalog.active_plans, _render_plans)
+info = JsonDocument(lambda: INFO)
@@ -0,0 +1,64 @@
+"""Whole-graph snapshot of the assistant decision tree.
+
+The nodes and options are read once into a single JSON document, serialised
+once, and tagged with a content-hash version that is also served as its ETag.
+The widget caches it in localStorage and walks the tree client-side.
+Admin edits bump TREE_GENERATION and call invalidate().
+"""
+import hashlib
+import json
+from collections import namedtuple
+
+import db
+
+TREE_GENERATION = 'assistant_tree'
+
+Snapshot = namedtuple('Snapshot', 'version root_id nodes body')
+
+
+def _load_tree():
+    conn = db.get_db(readonly=True)
+    try:
+        node_rows = conn.execute('SELECT * FROM assistant_nodes ORDER BY id').fetchall()
+        option_rows = conn.execute('SELECT * FROM assistant_options ORDER BY node_id, display_order').fetchall()
+    finally:
+        conn.close()
+    nodes = {}
+    root_id = None
+    for n in node_rows:
+        nodes[n['id']] = {'node': dict(n), 'options': []}
+        if root_id is None and n['is_root'] == 1:
+            root_id = n['id']
+    for o in option_rows:
+        entry = nodes.get(o['node_id'])
+        if entry is not None:
+            entry['options'].append(dict(o))
+    content = json.dumps({'root_id': root_id, 'nodes': nodes}, sort_keys=True, separators=(',', ':'))
+    version = hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+    body = json.dumps({'version': version, 'root_id': root_id, 'nodes': nodes}, separators=(',', ':')).encode('utf-8')
+    return Snapshot(version=version, root_id=root_id, nodes=nodes, body=body)
+
+
+_cache = db.GenerationCache(TREE_GENERATION, _load_tree)
+
+
+def snapshot():
+    return _cache.get()
+
+
+def get_node(node_id):
+    """Return {'node': ..., 'options': [...]} for node_id, or None."""
+    return snapshot().nodes.get(node_id)
+
+
+def get_root():
+    snap = snapshot()
+    return snap.nodes.get(snap.root_id) if snap.root_id is not None else None
+
+
+def invalidate():
+    _cache.invalidate()
+
+
+def stats():
+    return _cache.stats()
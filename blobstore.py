@@ -0,0 +1,198 @@
+"""Content-addressed storage for uploads.
+
+Each upload is hashed (SHA-256) while it is streamed to a temp file, then
+stored once under a sharded path named after its digest:
+static/uploads/ab/cd/abcd...<64 hex>.jpg. Identical uploads resolve to the
+same name, and the second copy is discarded.
+
+upload_blobs tracks how many rows (investments.proof_image,
+announcements.image_url and announcements.video_file) point at each blob. Writers call retain(),
+release() or swap() on the cursor of the same transaction that changes the reference.
+A background collector deletes blobs that have stayed unreferenced for
+GC_GRACE seconds, together with their image variants.
+
+Because a name is derived from content, a stored blob never changes, and the
+image pipeline writes its output as separate variants (images.py), so blobs
+and variants can be cached forever.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import db
+import images
+
+UPLOAD_FOLDER = os.path.join(db.BASE_DIR, 'static', 'uploads')
+CHUNK_SIZE = 64 * 1024
+GC_GRACE = 3600
+GC_INTERVAL = 600.0
+
+BLOBS_DDL = '''CREATE TABLE IF NOT EXISTS upload_blobs (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    released_at TEXT
+)'''
+
+# <2 hex>/<2 hex>/<64 hex digest>[.thumb|.clean].<ext>
+_NAME_RE = re.compile(r'^([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})((?:\.thumb|\.clean)?\.[a-z0-9]+)$')
+
+# metrics
+ingested = 0
+deduplicated = 0
+collected = 0
+
+
+class BlobTooLarge(ValueError):
+    """The upload exceeded the caller's size limit."""
+
+
+def parse_name(name):
+    """(digest, suffix) for a blob-store name, or None for anything else (e.g. legacy uploads)."""
+    m = _NAME_RE.match(name or '')
+    return (m.group(3), m.group(4)) if m else None
+
+
+def path_for(name):
+    return os.path.join(UPLOAD_FOLDER, *name.split('/'))
+
+
+def is_pending(name):
+    """True while an image original still awaits the pipeline (its variants do not exist yet)."""
+    parsed = parse_name(name)
+    if parsed is None or parsed[1].startswith('.thumb'):
+        return False
+    if parsed[1] not in images.ALLOWED_FORMATS.values():
+        return False
+    return not os.path.exists(path_for(images.variant_name(name, 'thumb')))
+
+
+def ingest(stream, ext, max_size=None):
+    """Store the contents of `stream`, hashing while copying. Returns (name, created).
+
+    `created` is False when identical content was already stored.
+    """
+    global ingested, deduplicated
+    tmp_dir = os.path.join(UPLOAD_FOLDER, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise BlobTooLarge(f'upload exceeds {max_size} bytes')
+                digest.update(chunk)
+                out.write(chunk)
+        hexdigest = digest.hexdigest()
+        name = f'{hexdigest[:2]}/{hexdigest[2:4]}/{hexdigest}{ext.lower()}'
+        path = path_for(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            # link() refuses to overwrite, so two concurrent identical uploads
+            # cannot clobber a copy the image pipeline is already reading
+            os.link(tmp_path, path)
+            created = True
+        except FileExistsError:
+            created = False
+        except OSError:
+            # filesystem without hard links
+            if os.path.exists(path):
+                created = False
+            else:
+                os.replace(tmp_path, path)
+                created = True
+    finally:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    _register(name, size)
+    ingested += 1
+    if not created:
+        deduplicated += 1
+    _ensure_collector()
+    return name, created
+
+
+def _register(name, size):
+    # a fresh or revived unreferenced blob gets a new grace period, so the
+    # collector cannot remove it before the caller's row references it
+    now = datetime.utcnow().isoformat()
+    db.write_transaction(lambda cur: cur.execute(
+        'INSERT INTO upload_blobs (name, size, refcount, created_at, released_at) VALUES (?, ?, 0, ?, ?) '
+        'ON CONFLICT(name) DO UPDATE SET released_at = excluded.released_at WHERE refcount = 0',
+        (name, size, now, now)))
+
+
+def retain(cur, name):
+    """Count one more reference to `name` (no-op for legacy, non-blob names)."""
+    if name and parse_name(name):
+        cur.execute('UPDATE upload_blobs SET refcount = refcount + 1 WHERE name = ?', (name,))
+
+
+def release(cur, name):
+    if name and parse_name(name):
+        cur.execute('UPDATE upload_blobs SET refcount = MAX(refcount - 1, 0), released_at = ? WHERE name = ?',
+                    (datetime.utcnow().isoformat(), name))
+
+
+def swap(cur, old, new):
+    if old != new:
+        release(cur, old)
+        retain(cur, new)
+
+
+def collect(grace=None):
+    """Delete blobs unreferenced for longer than `grace` seconds. Returns how many were removed."""
+    global collected
+    grace = GC_GRACE if grace is None else grace
+    cutoff = (datetime.utcnow() - timedelta(seconds=grace)).isoformat()
+    names = db.write_transaction(lambda cur: [r['name'] for r in cur.execute(
+        'DELETE FROM upload_blobs WHERE refcount = 0 AND released_at <= ? RETURNING name', (cutoff,)).fetchall()])
+    for name in names:
+        for variant in (name, images.variant_name(name, 'clean'), images.variant_name(name, 'webp'), images.variant_name(name, 'thumb')):
+            try:
+                os.remove(path_for(variant))
+            except OSError:
+                pass
+    collected += len(names)
+    return len(names)
+
+
+_collector = None
+_collector_lock = threading.Lock()
+
+
+def _ensure_collector():
+    global _collector
+    if _collector is not None and _collector.is_alive():
+        return
+    with _collector_lock:
+        if _collector is not None and _collector.is_alive():
+            return
+        _collector = threading.Thread(target=_run_collector, name='upload-gc', daemon=True)
+        _collector.start()
+
+
+def _run_collector():
+    while True:
+        time.sleep(GC_INTERVAL)
+        try:
+            collect()
+        except Exception:
+            pass
+
+
+def stats():
+    return {'ingested': ingested, 'deduplicated': deduplicated, 'collected': collected}
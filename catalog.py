@@ -0,0 +1,79 @@
+"""In-process catalog of active investment plans.
+
+The homepage and /assistant/plans are served from an immutable snapshot of
+plan records. Admin plan writes bump the PLANS_GENERATION counter and call
+invalidate() so the snapshot is rebuilt only when plans actually change.
+"""
+import bisect
+from collections import namedtuple
+
+import db
+
+PLANS_GENERATION = 'investment_plans'
+
+Plan = namedtuple('Plan', 'id plan_name minimum_amount profit_amount total_return duration_days capital_back')
+
+
+def _load_plans():
+    conn = db.get_db(readonly=True)
+    try:
+        rows = conn.execute("SELECT * FROM investment_plans WHERE status = 'active' ORDER BY id DESC").fetchall()
+    except Exception:
+        rows = []
+    finally:
+        conn.close()
+    plans = []
+    for r in rows:
+        keys = r.keys()
+        plans.append(Plan(
+            id=r['id'],
+            plan_name=r['plan_name'],
+            minimum_amount=float(r['minimum_amount'] or 0),
+            profit_amount=float(r['profit_amount'] or 0),
+            total_return=float(r['total_return'] or 0),
+            duration_days=r['duration_days'],
+            capital_back=r['capital_back'] if 'capital_back' in keys else 1,
+        ))
+    return tuple(plans)
+
+
+_cache = db.GenerationCache(PLANS_GENERATION, _load_plans)
+
+
+def active_plans():
+    """All active plans, newest first."""
+    return _cache.get()
+
+
+def _neg_id(plan):
+    return -plan.id
+
+
+def page(page_number, per_page):
+    """Return (plans on that page, index of its first plan, total active plans)."""
+    plans = active_plans()
+    start = max(page_number - 1, 0) * per_page
+    return plans[start:start + per_page], start, len(plans)
+
+
+def page_after(plan_id, per_page):
+    """Keyset page: the next `per_page` plans older than plan_id, as (plans, start, total)."""
+    plans = active_plans()
+    start = bisect.bisect_right(plans, -plan_id, key=_neg_id)
+    return plans[start:start + per_page], start, len(plans)
+
+
+def page_before(plan_id, per_page):
+    """Keyset page: the `per_page` plans just newer than plan_id, as (plans, start, total)."""
+    plans = active_plans()
+    end = bisect.bisect_left(plans, -plan_id, key=_neg_id)
+    start = max(end - per_page, 0)
+    return plans[start:end], start, len(plans)
+
+
+def invalidate():
+    _cache.invalidate()
+
+
+def stats():
+    return _cache.stats()
@@ -0,0 +1,81 @@
+"""JSON config files (config/*.json) cached in memory.
+
+get() returns the parsed file and re-reads it only when its inode, mtime or
+size changes. The stat itself is throttled to once per `check_interval`
+seconds, so a hot page costs no file I/O. write() replaces the file
+atomically (temp file + rename), so a reader in any process sees either the
+old or the new contents, never a partial write.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class JsonConfig:
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        # (value, file signature, checked_at); value is shared, callers must not mutate it
+        self._state = None
+        self._lock = threading.Lock()
+        self.reads = 0
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _read(self):
+        self.reads += 1
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f) or {}
+        except Exception:
+            return {}
+
+    def get(self):
+        state = self._state
+        if state is not None and time.monotonic() - state[2] < self.check_interval:
+            return state[0]
+        with self._lock:
+            state = self._state
+            if state is not None and time.monotonic() - state[2] < self.check_interval:
+                return state[0]
+            signature = self._signature()
+            if state is not None and state[1] == signature:
+                value = state[0]
+            else:
+                value = self._read() if signature is not None else {}
+            self._state = (value, signature, time.monotonic())
+            return value
+
+    def write(self, data):
+        """Atomically replace the file with `data`. Returns True on success."""
+        folder = os.path.dirname(self.path)
+        try:
+            os.makedirs(folder, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=folder, prefix='.tmp-', suffix='.json')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+        except Exception:
+            return False
+        with self._lock:
+            self._state = (dict(data), self._signature(), time.monotonic())
+        return True
+
+    def stats(self):
+        return {'reads': self.reads}
@@ -1,33 +1,181 @@
-import sqlite3
-import os
+import bisect
 from datetime import datetime
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, 'app.db')
+import db
+
+try:
+    import numpy
+except Exception:
+    numpy = None
+
+DB_PATH = db.DB_PATH
+# converted amounts are always rounded to this many decimal places
+MONEY_PLACES = 2
 
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # rate lookups are read-only; borrow a connection from the shared reader pool
+    return db.get_db(readonly=True)
 
-def get_rate(currency_code):
-    """Return rate as float: 1 USD = rate * currency_code. If not found, returns 1.0 for USD or None."""
+# Process-wide rate table: loaded once, then served from memory. Other
+# processes signal changes through the RATES_GENERATION counter, which is
+# re-read at most once every RATE_CHECK_INTERVAL seconds.
+RATES_GENERATION = 'exchange_rates'
+RATE_CHECK_INTERVAL = 2.0
+
+
+def _load_rates():
+    conn = get_db()
+    try:
+        rows = conn.execute('SELECT currency_code, rate FROM exchange_rates').fetchall()
+    except Exception:
+        rows = []
+    finally:
+        conn.close()
+    rates = {}
+    for r in rows:
+        try:
+            rates[r['currency_code'].upper()] = float(r['rate'])
+        except Exception:
+            pass
+    return rates
+
+
+_rates_cache = db.GenerationCache(RATES_GENERATION, _load_rates, RATE_CHECK_INTERVAL)
+
+
+def get_rates():
+    """Return the in-memory {currency_code: rate} table, reloading it if another writer changed it."""
+    return _rates_cache.get()
+
+
+def invalidate_rates():
+    """Drop this process's rate table and rate history. Writers call it after
+    committing, having bumped the generation with db.bump_generation(conn,
+    RATES_GENERATION) inside the same transaction as the rate change so other
+    processes reload too."""
+    _rates_cache.invalidate()
+    _history_cache.invalidate()
+
+
+def rate_cache_stats():
+    return {'rates': _rates_cache.stats(), 'history': _history_cache.stats()}
+
+
+# --- rate history ---
+# exchange_rate_history is append-only: store_rates() adds a row whenever a
+# currency's rate differs from its latest recorded one. For as-of lookups the
+# whole table is held in memory as per-currency sorted timestamp/rate arrays
+# (same generation as the current-rate table), so rate_at() is a binary search.
+HISTORY_DDL = '''CREATE TABLE IF NOT EXISTS exchange_rate_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    currency_code TEXT NOT NULL,
+    rate REAL NOT NULL,
+    effective_at TEXT NOT NULL
+)'''
+
+_UPSERT_SQL = ('INSERT INTO exchange_rates (currency_code, rate, updated_at) VALUES (?, ?, ?) '
+               'ON CONFLICT(currency_code) DO UPDATE SET rate = excluded.rate, updated_at = excluded.updated_at')
+_HISTORY_SQL = ('INSERT INTO exchange_rate_history (currency_code, rate, effective_at) SELECT ?1, ?2, ?3 '
+                'WHERE (SELECT rate FROM exchange_rate_history WHERE currency_code = ?1 '
+                'ORDER BY effective_at DESC, id DESC LIMIT 1) IS NOT ?2')
+
+
+def store_rates(cur, rates, when=None):
+    """Upsert {code: rate} into exchange_rates and append changed rates to the history.
+
+    The caller bumps RATES_GENERATION and commits."""
+    when = when or datetime.utcnow().isoformat()
+    rows = [(code.upper(), float(rate), when) for code, rate in sorted(rates.items())]
+    cur.executemany(_UPSERT_SQL, rows)
+    cur.executemany(_HISTORY_SQL, rows)
+
+
+def _ts(value):
+    # stored timestamps mix 'YYYY-MM-DD HH:MM:SS' (sqlite adapter) and isoformat's
+    # 'T' separator; one separator keeps them comparable as text
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return str(value).replace('T', ' ')
+
+
+def _load_history():
+    conn = get_db()
+    try:
+        rows = conn.execute('SELECT currency_code, rate, effective_at FROM exchange_rate_history '
+                            'ORDER BY currency_code, effective_at, id').fetchall()
+    except Exception:
+        rows = []
+    finally:
+        conn.close()
+    series = {}
+    for r in rows:
+        times, values = series.setdefault(r['currency_code'].upper(), ([], []))
+        times.append(_ts(r['effective_at']))
+        values.append(float(r['rate']))
+    return series
+
+
+_history_cache = db.GenerationCache(RATES_GENERATION, _load_history, RATE_CHECK_INTERVAL)
+
+
+def _rate_in(series, when):
+    times, values = series
+    i = bisect.bisect_right(times, _ts(when)) - 1
+    # before the first recorded rate, the earliest one is the best estimate
+    return values[max(i, 0)]
+
+
+def rate_at(currency_code, when):
+    """Rate in effect for currency_code at `when` (datetime or stored timestamp), or None."""
     if not currency_code:
         return None
     if currency_code.upper() == 'USD':
         return 1.0
-    conn = get_db()
-    cur = conn.cursor()
+    series = _history_cache.get().get(currency_code.upper())
+    if series is None or when is None:
+        return get_rate(currency_code)
+    return _rate_in(series, when)
+
+
+def convert_usd_to_at(currency_code, amount_usd, when):
+    """convert_usd_to() at the rate in effect at `when`."""
     try:
-        cur.execute('SELECT rate FROM exchange_rates WHERE currency_code = ?', (currency_code.upper(),))
-        r = cur.fetchone()
-        if r:
-            return float(r['rate'])
+        rate = rate_at(currency_code, when)
+        if rate is None:
+            return None
+        return round(float(amount_usd) * rate, MONEY_PLACES)
     except Exception:
-        pass
-    finally:
-        conn.close()
-    return None
+        return None
+
+
+def convert_many_usd_at(currency_code, amounts_usd, whens):
+    """Revalue many (amount, timestamp) pairs in one pass: one history lookup,
+    then a binary search per item. Returns a list (None for unparseable
+    entries), or None when no rate is known for currency_code."""
+    if not currency_code:
+        return None
+    code = currency_code.upper()
+    series = None if code == 'USD' else _history_cache.get().get(code)
+    current = get_rate(code)
+    if series is None and current is None:
+        return None
+    converted = []
+    for amount, when in zip(amounts_usd, whens):
+        rate = _rate_in(series, when) if series is not None and when is not None else current
+        try:
+            converted.append(round(float(amount) * rate, MONEY_PLACES))
+        except (TypeError, ValueError):
+            converted.append(None)
+    return converted
+
+
+def get_rate(currency_code):
+    """Return rate as float: 1 USD = rate * currency_code. If not found, returns 1.0 for USD or None."""
+    if not currency_code:
+        return None
+    if currency_code.upper() == 'USD':
+        return 1.0
+    return get_rates().get(currency_code.upper())
 
 
 def convert_usd_to(currency_code, amount_usd):
@@ -36,11 +184,30 @@ def convert_usd_to(currency_code, amount_usd):
         rate = get_rate(currency_code)
         if rate is None:
             return None
-        return round(float(amount_usd) * float(rate), 2)
+        return round(float(amount_usd) * float(rate), MONEY_PLACES)
     except Exception:
         return None
 
 
+def convert_many_usd_to(currency_code, amounts_usd):
+    """Convert a list (or numpy array) of USD amounts with a single rate lookup.
+
+    Returns a list of rounded floats (None for unparseable entries), a numpy
+    array when given one, or None when no rate is known for currency_code."""
+    rate = get_rate(currency_code)
+    if rate is None:
+        return None
+    if numpy is not None and isinstance(amounts_usd, numpy.ndarray):
+        return numpy.round(amounts_usd.astype(float) * rate, MONEY_PLACES)
+    converted = []
+    for amount in amounts_usd:
+        try:
+            converted.append(round(float(amount) * rate, MONEY_PLACES))
+        except (TypeError, ValueError):
+            converted.append(None)
+    return converted
+
+
 def convert_to_usd(currency_code, amount_local):
     """Convert a local currency amount to USD using stored rate. Returns float USD or None."""
     try:
@@ -0,0 +1,578 @@
+"""Shared SQLite connection pools used by app.py, currency.py and scripts/.
+
+Connections are opened once, configured once (WAL, synchronous, cache and
+mmap sizes, busy timeout) and then handed out from a bounded pool. Calling
+``close()`` on a pooled connection returns it to its pool instead of closing
+the underlying handle, so existing ``conn = get_db() ... conn.close()`` code
+keeps working unchanged.
+"""
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.environ.get('APP_DB_PATH') or os.path.join(BASE_DIR, 'app.db')
+
+WRITER_POOL_SIZE = int(os.environ.get('DB_WRITER_POOL_SIZE', 4))
+READER_POOL_SIZE = int(os.environ.get('DB_READER_POOL_SIZE', 8))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+BUSY_TIMEOUT_MS = 5000
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection became free within the pool timeout."""
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to its owning pool."""
+
+    _pool = None
+    _checked_out = False
+    _lease = 0
+
+    def close(self):
+        pool = self._pool
+        if pool is None:
+            return sqlite3.Connection.close(self)
+        if self._checked_out:
+            pool.release(self)
+
+    def release_lease(self, lease):
+        # give the connection back only if this exact checkout still holds it
+        if self._checked_out and self._lease == lease:
+            self.close()
+
+    def really_close(self):
+        self._pool = None
+        sqlite3.Connection.close(self)
+
+
+def configure_connection(conn, readonly=False):
+    cur = conn.cursor()
+    # journal_mode is persistent in the database file; the rest are per-connection
+    for pragma in (
+        'PRAGMA journal_mode = WAL',
+        'PRAGMA synchronous = NORMAL',
+        'PRAGMA foreign_keys = ON',
+        'PRAGMA cache_size = -8000',
+        'PRAGMA mmap_size = 67108864',
+        'PRAGMA temp_store = MEMORY',
+        f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}',
+    ):
+        try:
+            cur.execute(pragma)
+        except sqlite3.DatabaseError:
+            # pragmas are advisory; keep the connection usable
+            pass
+    if readonly:
+        cur.execute('PRAGMA query_only = ON')
+    cur.close()
+
+
+class ConnectionPool:
+    """Bounded pool of pre-configured connections to one database file."""
+
+    def __init__(self, path, size, readonly=False, timeout=POOL_TIMEOUT):
+        self.path = path
+        self.size = max(1, int(size))
+        self.readonly = readonly
+        self.timeout = timeout
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._pid = os.getpid()
+        # metrics
+        self.acquired = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000.0,
+                               check_same_thread=False, factory=PooledConnection)
+        conn.row_factory = sqlite3.Row
+        configure_connection(conn, readonly=self.readonly)
+        conn._pool = self
+        return conn
+
+    def _reset_after_fork(self):
+        # connections must never be shared across processes
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._pid = os.getpid()
+
+    def acquire(self, timeout=None):
+        if os.getpid() != self._pid:
+            self._reset_after_fork()
+        timeout = self.timeout if timeout is None else timeout
+        started = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    conn = None
+                    break
+                if started is None:
+                    started = time.monotonic()
+                    self.waits += 1
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f'no database connection available after {timeout:.1f}s')
+                self._cond.wait(remaining)
+            if started is not None:
+                waited = time.monotonic() - started
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+            self.acquired += 1
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+        conn._lease += 1
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn):
+        conn._checked_out = False
+        broken = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            broken = True
+        with self._cond:
+            if broken or conn._pool is not self:
+                self._created -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+        if broken:
+            try:
+                conn.really_close()
+            except Exception:
+                pass
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for conn in idle:
+            try:
+                conn.really_close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            created = self._created
+        return {
+            'size': self.size,
+            'open': created,
+            'idle': idle,
+            'in_use': created - idle,
+            'acquired': self.acquired,
+            'waits': self.waits,
+            'timeouts': self.timeouts,
+            'wait_time_total_ms': round(self.wait_time_total * 1000, 3),
+            'wait_time_max_ms': round(self.wait_time_max * 1000, 3),
+        }
+
+
+writer_pool = ConnectionPool(DB_PATH, WRITER_POOL_SIZE)
+reader_pool = ConnectionPool(DB_PATH, READER_POOL_SIZE, readonly=True)
+
+
+def get_db(readonly=False):
+    """Check out a pooled connection; call close() on it to give it back."""
+    pool = reader_pool if readonly else writer_pool
+    return pool.acquire()
+
+
+def pool_stats():
+    return {'writer': writer_pool.stats(), 'reader': reader_pool.stats(), 'transactions': dict(transaction_stats),
+            'write_queue': write_queue.stats()}
+
+
+def close_pools():
+    writer_pool.close_all()
+    reader_pool.close_all()
+
+
+# --- write transactions ---
+# All writes made through write_transaction() are funnelled to one writer
+# thread with its own connection, so request threads never queue on SQLite's
+# write lock (and never sit out busy_timeout). The writer takes whatever jobs
+# have piled up while it was busy and commits them together: one BEGIN
+# IMMEDIATE, one SAVEPOINT per job (a failing job rolls back alone), one
+# COMMIT. Each caller gets a Future that resolves once its job is durable.
+# Reads keep using the reader pool. Jobs run on the writer thread, so they
+# must only touch the database (no request/session, no network). Schema
+# migrations (migrations.py) and the one-shot scripts/ keep their own writer
+# connections. DB_WRITE_QUEUE=0 runs each transaction on a pooled writer
+# connection instead.
+WRITE_QUEUE = os.environ.get('DB_WRITE_QUEUE', '1') != '0'
+# most jobs sharing one commit
+GROUP_MAX = 64
+# busy_timeout already makes BEGIN IMMEDIATE wait for the write lock; these
+# retries cover the rarer SQLITE_BUSY that still escapes it under heavy load
+# (other processes, or pooled connections writing outside the queue).
+WRITE_ATTEMPTS = 5
+WRITE_BACKOFF = 0.05
+transaction_stats = {'committed': 0, 'retries': 0, 'failed': 0}
+
+
+def _is_busy(exc):
+    msg = str(exc).lower()
+    return 'locked' in msg or 'busy' in msg
+
+
+class _Job:
+    __slots__ = ('fn', 'future', 'exclusive', 'attempts', 'submitted')
+
+    def __init__(self, fn, exclusive, attempts):
+        self.fn = fn
+        self.future = Future()
+        self.exclusive = exclusive
+        self.attempts = attempts
+        self.submitted = time.monotonic()
+
+
+class WriteQueue:
+    """One writer thread that runs and group-commits submitted write jobs."""
+
+    def __init__(self, path, group_max=GROUP_MAX):
+        self.path = path
+        self.group_max = group_max
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._conn = None
+        self._carry = None
+        self._pid = os.getpid()
+        # metrics
+        self.submitted = 0
+        self.jobs = 0
+        self.batches = 0
+        self.batch_max = 0
+        self.depth_max = 0
+        self.commit_time_total = 0.0
+        self.commit_time_max = 0.0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _ensure_thread(self):
+        if os.getpid() != self._pid:
+            # a forked child starts with its own queue, thread and connection
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._reset()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+            self._thread.start()
+
+    def in_writer(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, fn, exclusive=False, attempts=WRITE_ATTEMPTS):
+        """Queue fn(cur) for the writer. Returns a Future for fn's result.
+
+        exclusive=True gives the job a transaction of its own (large batch
+        work) instead of sharing a commit with other small writes. `attempts`
+        bounds the busy retries; a shared commit retries as often as its most
+        patient job allows.
+        """
+        self._ensure_thread()
+        job = _Job(fn, exclusive, max(1, attempts))
+        self._queue.put(job)
+        depth = self._queue.qsize()
+        with self._lock:
+            self.submitted += 1
+            self.depth_max = max(self.depth_max, depth)
+        return job.future
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        configure_connection(conn)
+        return conn
+
+    def _next_batch(self):
+        first = self._carry or self._queue.get()
+        self._carry = None
+        batch = [first]
+        if first.exclusive:
+            return batch
+        # group whatever arrived while the previous commit was running
+        while len(batch) < self.group_max:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job.exclusive:
+                self._carry = job
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [job for job in self._next_batch() if job.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self._execute_safely(batch)
+
+    def _execute_safely(self, batch):
+        try:
+            if self._conn is None:
+                self._conn = self._connect()
+            self._execute(batch)
+        except Exception as e:
+            # transaction-level failure: drop the connection, fail what is left
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+            for job in batch:
+                if not job.future.done():
+                    transaction_stats['failed'] += 1
+                    job.future.set_exception(e)
+
+    def _attempt(self, batch):
+        """Run the batch in one transaction. Returns [(ok, value)] once committed."""
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        outcomes = []
+        try:
+            for job in batch:
+                conn.execute('SAVEPOINT job')
+                try:
+                    value = job.fn(conn.cursor())
+                except Exception as e:
+                    if not conn.in_transaction:
+                        # SQLite aborted the whole transaction, not just this job
+                        raise
+                    conn.execute('ROLLBACK TO job')
+                    conn.execute('RELEASE job')
+                    outcomes.append((False, e))
+                else:
+                    conn.execute('RELEASE job')
+                    outcomes.append((True, value))
+            conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        return outcomes
+
+    def _execute(self, batch):
+        started = time.monotonic()
+        attempts = max(job.attempts for job in batch)
+        for attempt in range(attempts):
+            try:
+                outcomes = self._attempt(batch)
+                break
+            except sqlite3.OperationalError as e:
+                if _is_busy(e) and attempt < attempts - 1:
+                    transaction_stats['retries'] += 1
+                    time.sleep(WRITE_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+                    continue
+                if len(batch) > 1 and not _is_busy(e):
+                    # one job broke the shared transaction; give each its own
+                    for job in batch:
+                        self._execute_safely([job])
+                    return
+                raise
+            except Exception:
+                if len(batch) > 1:
+                    for job in batch:
+                        self._execute_safely([job])
+                    return
+                raise
+        finished = time.monotonic()
+        elapsed = finished - started
+        with self._lock:
+            self.batches += 1
+            self.jobs += len(batch)
+            self.batch_max = max(self.batch_max, len(batch))
+            self.commit_time_total += elapsed
+            self.commit_time_max = max(self.commit_time_max, elapsed)
+            for job in batch:
+                waited = finished - job.submitted
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+        for job, (ok, value) in zip(batch, outcomes):
+            if ok:
+                transaction_stats['committed'] += 1
+                job.future.set_result(value)
+            else:
+                transaction_stats['failed'] += 1
+                job.future.set_exception(value)
+
+    def stats(self):
+        with self._lock:
+            batches = self.batches or 1
+            jobs = self.jobs or 1
+            return {
+                'depth': self._queue.qsize(),
+                'depth_max': self.depth_max,
+                'submitted': self.submitted,
+                'jobs': self.jobs,
+                'batches': self.batches,
+                'batch_avg': round(self.jobs / batches, 2),
+                'batch_max': self.batch_max,
+                'commit_time_avg_ms': round(self.commit_time_total / batches * 1000, 3),
+                'commit_time_max_ms': round(self.commit_time_max * 1000, 3),
+                'wait_time_avg_ms': round(self.wait_time_total / jobs * 1000, 3),
+                'wait_time_max_ms': round(self.wait_time_max * 1000, 3),
+            }
+
+
+write_queue = WriteQueue(DB_PATH)
+
+
+def write_transaction(fn, attempts=WRITE_ATTEMPTS, exclusive=False):
+    """Run fn(cur) in a write transaction and commit. Returns fn's result.
+
+    The write lock is held before fn runs, so reads inside fn see the data its
+    writes apply to. With the write queue, fn runs on the writer thread and
+    may share its commit with other small jobs (unless `exclusive`); a call
+    made from inside a job simply joins that job's transaction. On busy/locked
+    errors the transaction is rolled back and retried with jittered
+    exponential backoff, up to `attempts` times in either mode; fn must
+    therefore only touch the database.
+    """
+    if WRITE_QUEUE:
+        if write_queue.in_writer():
+            return fn(write_queue._conn.cursor())
+        return write_queue.submit(fn, exclusive=exclusive, attempts=attempts).result()
+    for attempt in range(attempts):
+        conn = get_db()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            result = fn(conn.cursor())
+            conn.commit()
+            transaction_stats['committed'] += 1
+            return result
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            if not _is_busy(e) or attempt == attempts - 1:
+                transaction_stats['failed'] += 1
+                raise
+            transaction_stats['retries'] += 1
+        except Exception:
+            conn.rollback()
+            transaction_stats['failed'] += 1
+            raise
+        finally:
+            conn.close()
+        time.sleep(WRITE_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+
+
+# --- cache generations ---
+# Each in-process cache (exchange rates, plan catalog, ...) is tagged with a
+# named generation counter stored in the database. Writers bump the counter in
+# the same transaction as their change; other processes notice the new value
+# on their next (throttled) check and rebuild.
+GENERATIONS_DDL = '''CREATE TABLE IF NOT EXISTS cache_generations (
+    name TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL DEFAULT 0
+)'''
+
+
+def bump_generation(conn, name):
+    """Increment generation `name` on `conn`; the caller commits."""
+    cur = conn.cursor()
+    cur.execute(GENERATIONS_DDL)
+    cur.execute('INSERT INTO cache_generations (name, generation) VALUES (?, 1) '
+                'ON CONFLICT(name) DO UPDATE SET generation = generation + 1', (name,))
+
+
+def get_generation(name):
+    conn = get_db(readonly=True)
+    try:
+        row = conn.execute('SELECT generation FROM cache_generations WHERE name = ?', (name,)).fetchone()
+        return row['generation'] if row else 0
+    except sqlite3.OperationalError:
+        # table not created yet: nothing has ever been invalidated
+        return 0
+    finally:
+        conn.close()
+
+
+class GenerationCache:
+    """A value built by `loader` and kept until generation `name` moves.
+
+    The generation is re-read at most once every `check_interval` seconds, so a
+    hit costs no database access. invalidate() drops this process's copy
+    immediately (call it after committing a bump_generation()).
+    """
+
+    def __init__(self, name, loader, check_interval=2.0):
+        self.name = name
+        self.loader = loader
+        self.check_interval = check_interval
+        # (value, generation, checked_at) swapped as one tuple so readers never
+        # see a half-updated state without taking the lock
+        self._state = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self):
+        state = self._state
+        if state is not None and time.monotonic() - state[2] < self.check_interval:
+            return state
+        return None
+
+    def get(self):
+        state = self._fresh()
+        if state is not None:
+            self.hits += 1
+            return state[0]
+        with self._lock:
+            state = self._fresh()
+            if state is None:
+                generation = get_generation(self.name)
+                if self._state is not None and self._state[1] == generation:
+                    self.hits += 1
+                    value = self._state[0]
+                else:
+                    self.misses += 1
+                    value = self.loader()
+                state = (value, generation, time.monotonic())
+                self._state = state
+            else:
+                self.hits += 1
+            return state[0]
+
+    def invalidate(self):
+        with self._lock:
+            self._state = None
+
+    def stats(self):
+        state = self._state
+        return {'hits': self.hits, 'misses': self.misses, 'generation': state[1] if state else None}
@@ -0,0 +1,308 @@
+"""CSV exports of assistant_logs.
+
+Rows are read in CHUNK_ROWS keyset pages and encoded chunk by chunk. Each
+chunk goes to the HTTP response and to the saved copy in static/exports.
+Memory therefore stays flat however many rows match. With gzip the same
+compressed bytes are sent and saved as .csv.gz.
+
+Large exports can instead be queued as background jobs: an assistant_exports
+row with status queued -> running -> done/failed, filled in by a worker thread
+that records rows processed and bytes written as it goes. Finished files are
+evicted by prune() once older than EXPORT_MAX_AGE_DAYS or once the folder
+exceeds EXPORT_MAX_BYTES (oldest first).
+"""
+import csv
+import io
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+
+import db
+
+EXPORT_FOLDER = os.path.join(db.BASE_DIR, 'static', 'exports')
+CHUNK_ROWS = 1000
+EXPORT_MAX_AGE_DAYS = float(os.environ.get('EXPORT_MAX_AGE_DAYS', 7))
+EXPORT_MAX_BYTES = int(os.environ.get('EXPORT_MAX_BYTES', 500 * 1024 * 1024))
+PROGRESS_INTERVAL = 1.0
+# a running job with no progress for this long is assumed orphaned and re-queued
+STALE_AFTER = 300
+POLL_INTERVAL = 60.0
+HEADER = ['id', 'created_at', 'user_id', 'node_id', 'node_question', 'option_id', 'option_text', 'metadata']
+FILTER_KEYS = ('node_id', 'option_id', 'user_id', 'start_date', 'end_date')
+
+
+def build_query(filters, after=None):
+    """SQL and params for the filtered log join, newest first.
+
+    after=(created_at, id) resumes below that row; the created_at index is
+    ordered by (created_at, rowid), so each page is a range scan.
+    """
+    sql = '''SELECT l.id, l.created_at, l.user_id, l.node_id, a.question AS node_question,
+                    l.option_id, o.option_text AS option_text, l.metadata
+             FROM assistant_logs l
+             LEFT JOIN assistant_nodes a ON l.node_id = a.id
+             LEFT JOIN assistant_options o ON l.option_id = o.id
+             WHERE 1=1'''
+    params = []
+    for key, clause in (
+        ('node_id', ' AND l.node_id = ?'),
+        ('option_id', ' AND l.option_id = ?'),
+        ('user_id', ' AND l.user_id = ?'),
+        ('start_date', ' AND l.created_at >= ?'),
+        ('end_date', ' AND l.created_at <= ?'),
+    ):
+        if filters.get(key):
+            sql += clause
+            params.append(filters[key])
+    if after is not None:
+        sql += ' AND l.created_at <= ? AND (l.created_at < ? OR l.id < ?)'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY l.created_at DESC, l.id DESC'
+    return sql, params
+
+
+def new_filename(compress):
+    ext = '.csv.gz' if compress else '.csv'
+    return f"assistant_logs_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex}{ext}"
+
+
+def _csv_chunk(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerows(rows)
+    return buf.getvalue().encode('utf-8')
+
+
+def iter_csv(filters, on_rows=None):
+    """Yield the export as encoded CSV chunks; on_rows(n) is called after each chunk.
+
+    Every chunk is read on its own pooled connection and the next one resumes
+    from the last row seen, so a slow download never holds a reader while the
+    client catches up.
+    """
+    yield _csv_chunk([HEADER])
+    after = None
+    while True:
+        sql, params = build_query(filters, after)
+        conn = db.get_db(readonly=True)
+        try:
+            rows = conn.execute(sql + ' LIMIT ?', params + [CHUNK_ROWS]).fetchall()
+        except Exception:
+            # missing tables: header-only CSV
+            return
+        finally:
+            conn.close()
+        if not rows:
+            break
+        after = (rows[-1]['created_at'], rows[-1]['id'])
+        yield _csv_chunk([tuple(r) for r in rows])
+        if on_rows:
+            on_rows(len(rows))
+        if len(rows) < CHUNK_ROWS:
+            break
+
+
+def iter_compressed(chunks):
+    """gzip-encode a stream of byte chunks without buffering it."""
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def record_export(filename, filters, size=None):
+    now = datetime.utcnow().isoformat()
+    return db.write_transaction(lambda cur: cur.execute(
+        "INSERT INTO assistant_exports (filename, filters, created_at, status, bytes_written, finished_at) VALUES (?, ?, ?, 'done', ?, ?)",
+        (filename, json.dumps(filters), now, size or 0, now)).lastrowid)
+
+
+def stream_export(filters, filename, compress=False):
+    """Yield the export for the response while saving the same bytes to EXPORT_FOLDER.
+
+    The file is written under a temporary name and only renamed and recorded in
+    assistant_exports once the last chunk has gone out; an aborted download
+    leaves nothing behind.
+    """
+    chunks = iter_csv(filters)
+    if compress:
+        chunks = iter_compressed(chunks)
+    path = os.path.join(EXPORT_FOLDER, filename)
+    tmp_path = path + '.part'
+    try:
+        f = open(tmp_path, 'wb')
+    except OSError:
+        # cannot persist: still serve the download
+        f = None
+    done = False
+    try:
+        for chunk in chunks:
+            if f is not None:
+                f.write(chunk)
+            yield chunk
+        done = True
+    finally:
+        chunks.close()
+        if f is not None:
+            f.close()
+            if done:
+                try:
+                    os.replace(tmp_path, path)
+                    record_export(filename, filters, os.path.getsize(path))
+                except Exception:
+                    pass
+            else:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+
+# --- background jobs ---
+_wakeup = threading.Event()
+_worker_lock = threading.Lock()
+_worker = None
+
+
+def start_worker():
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(target=_run, name='export-worker', daemon=True)
+        _worker.start()
+
+
+def enqueue_job(filters):
+    """Queue a compressed export of the filtered logs. Returns the assistant_exports id."""
+    now = datetime.utcnow().isoformat()
+    job_id = db.write_transaction(lambda cur: cur.execute(
+        "INSERT INTO assistant_exports (filename, filters, created_at, status, updated_at) VALUES (?, ?, ?, 'queued', ?)",
+        (new_filename(True), json.dumps(filters), now, now)).lastrowid)
+    start_worker()
+    _wakeup.set()
+    return job_id
+
+
+def get_job(job_id):
+    conn = db.get_db(readonly=True)
+    try:
+        return conn.execute('SELECT * FROM assistant_exports WHERE id = ?', (job_id,)).fetchone()
+    finally:
+        conn.close()
+
+
+def _claim():
+    # the status check inside the UPDATE makes the claim atomic across processes
+    def claim(cur):
+        stale = (datetime.utcnow() - timedelta(seconds=STALE_AFTER)).isoformat()
+        cur.execute("UPDATE assistant_exports SET status = 'queued' WHERE status = 'running' AND updated_at < ?", (stale,))
+        rows = cur.execute(
+            "UPDATE assistant_exports SET status = 'running', rows_processed = 0, bytes_written = 0, updated_at = ? "
+            "WHERE id = (SELECT id FROM assistant_exports WHERE status = 'queued' ORDER BY id LIMIT 1) AND status = 'queued' "
+            'RETURNING id, filename, filters', (datetime.utcnow().isoformat(),)).fetchall()
+        return dict(rows[0]) if rows else None
+    return db.write_transaction(claim)
+
+
+def _update_job(job_id, sql, params):
+    db.write_transaction(lambda cur: cur.execute(f'UPDATE assistant_exports SET {sql} WHERE id = ?', tuple(params) + (job_id,)))
+
+
+def run_job(job):
+    job_id = job['id']
+    try:
+        filters = json.loads(job['filters'] or '{}')
+    except ValueError:
+        filters = {}
+    path = os.path.join(EXPORT_FOLDER, job['filename'])
+    tmp_path = path + '.part'
+    progress = {'rows': 0, 'bytes': 0, 'reported': time.monotonic()}
+
+    def on_rows(n):
+        progress['rows'] += n
+
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in iter_compressed(iter_csv(filters, on_rows=on_rows)):
+                f.write(chunk)
+                progress['bytes'] += len(chunk)
+                if time.monotonic() - progress['reported'] >= PROGRESS_INTERVAL:
+                    progress['reported'] = time.monotonic()
+                    _update_job(job_id, 'rows_processed = ?, bytes_written = ?, updated_at = ?',
+                                (progress['rows'], progress['bytes'], datetime.utcnow().isoformat()))
+        os.replace(tmp_path, path)
+    except Exception as e:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        now = datetime.utcnow().isoformat()
+        _update_job(job_id, "status = 'failed', error = ?, updated_at = ?, finished_at = ?", (str(e)[:500], now, now))
+        return False
+    now = datetime.utcnow().isoformat()
+    _update_job(job_id, "status = 'done', rows_processed = ?, bytes_written = ?, updated_at = ?, finished_at = ?",
+                (progress['rows'], os.path.getsize(path), now, now))
+    return True
+
+
+def _run():
+    while True:
+        try:
+            job = _claim()
+            if job is not None:
+                run_job(job)
+                prune()
+                continue
+            prune()
+        except Exception:
+            # keep the worker alive; the job row records its own failure
+            pass
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def prune(max_age_days=None, max_bytes=None):
+    """Delete export files past the age limit, then oldest-first down to the size cap.
+
+    Returns the number of files removed. Matching assistant_exports rows are
+    marked 'expired' so the history page keeps them without a download link.
+    """
+    max_age = (EXPORT_MAX_AGE_DAYS if max_age_days is None else max_age_days) * 86400
+    max_bytes = EXPORT_MAX_BYTES if max_bytes is None else max_bytes
+    files = []
+    try:
+        with os.scandir(EXPORT_FOLDER) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.startswith('assistant_logs_'):
+                    st = entry.stat()
+                    files.append((st.st_mtime, st.st_size, entry.name))
+    except OSError:
+        return 0
+    files.sort()
+    now = time.time()
+    total = sum(size for _, size, _ in files)
+    removed = []
+    for mtime, size, name in files:
+        too_old = now - mtime > max_age
+        # in-progress .part files only go when they are stale by age
+        if not too_old and (name.endswith('.part') or total <= max_bytes):
+            continue
+        try:
+            os.remove(os.path.join(EXPORT_FOLDER, name))
+        except OSError:
+            continue
+        total -= size
+        removed.append(name)
+    expired = [(n,) for n in removed if not n.endswith('.part')]
+    if expired:
+        db.write_transaction(lambda cur: cur.executemany("UPDATE assistant_exports SET status = 'expired' WHERE filename = ?", expired))
+    return len(removed)
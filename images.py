@@ -0,0 +1,160 @@
+"""Upload image pipeline.
+
+Request threads only run probe(): Image.open() reads the header, which gives
+format and dimensions without decoding pixels. Files that are not an allowed
+format, or whose dimensions exceed the decompression-bomb limits, are rejected
+there. The bytes are then saved as-is and process() is queued on a process
+pool. The pool decodes the image, applies and drops the EXIF orientation, and
+writes a re-encoded copy without metadata (the 'clean' variant), a full-size
+WebP and a small WebP thumbnail next to the original. The original itself is
+never rewritten: its name is the hash of its bytes (blobstore.py).
+
+This module must stay importable on its own (no app/db imports): pool workers
+are spawned processes that import only it.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 40_000_000))
+MAX_SIDE = 12000
+THUMB_SIZE = 320
+WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+ALLOWED_FORMATS = {'PNG': '.png', 'JPEG': '.jpg', 'GIF': '.gif', 'WEBP': '.webp'}
+# file-name extensions accepted before probing; probe() has the final say
+ALLOWED_EXTENSIONS = tuple(sorted(set(ALLOWED_FORMATS.values()) | {'.jpeg'}))
+
+# Pillow's own guard, applied in pool workers too: anything this big fails to open
+Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+
+
+class ImageRejected(ValueError):
+    """The upload is not an acceptable image; the message is safe to show."""
+
+
+def probe(stream):
+    """Header-only check of an uploaded file. Returns (format, (width, height), extension)."""
+    pos = stream.tell()
+    try:
+        with Image.open(stream) as im:
+            fmt, size = im.format, im.size
+    except Image.DecompressionBombError:
+        raise ImageRejected('Image dimensions are too large')
+    except (UnidentifiedImageError, OSError, ValueError):
+        raise ImageRejected('Uploaded file is not a valid image')
+    finally:
+        stream.seek(pos)
+    if fmt not in ALLOWED_FORMATS:
+        raise ImageRejected('Unsupported image type')
+    width, height = size
+    if width < 1 or height < 1 or width > MAX_SIDE or height > MAX_SIDE or width * height > MAX_PIXELS:
+        raise ImageRejected('Image dimensions are too large')
+    return fmt, size, ALLOWED_FORMATS[fmt]
+
+
+def variant_name(name, variant):
+    """File name of a derived variant ('clean', 'thumb' or 'webp') of upload `name`."""
+    stem, ext = os.path.splitext(name)
+    if variant == 'thumb':
+        return stem + '.thumb.webp'
+    if variant == 'clean':
+        # GIF carries no EXIF and is kept as uploaded to preserve animation
+        return name if ext.lower() == '.gif' else stem + '.clean' + ext
+    if variant == 'webp':
+        return variant_name(name, 'clean') if ext.lower() == '.webp' else stem + '.webp'
+    raise ValueError(variant)
+
+
+def process(path):
+    """Write the metadata-free copy and WebP variants of the original at `path`. Runs in the pool."""
+    folder, name = os.path.split(path)
+    written = []
+    with Image.open(path) as im:
+        fmt = im.format
+        if fmt == 'GIF':
+            # keep animations intact; GIF carries no EXIF. Variants use frame one.
+            clean = im.convert('RGBA')
+        else:
+            clean = ImageOps.exif_transpose(im)
+            clean_name = variant_name(name, 'clean')
+            tmp = os.path.join(folder, clean_name + '.tmp')
+            # encoder options only: nothing from im.info (EXIF, XMP, comments) is carried over
+            options = {'quality': 90, 'optimize': True} if fmt == 'JPEG' else {}
+            if fmt == 'PNG':
+                options['optimize'] = True
+            clean.save(tmp, format=fmt, **options)
+            os.replace(tmp, os.path.join(folder, clean_name))
+            written.append(clean_name)
+    has_alpha = clean.mode in ('RGBA', 'LA', 'PA') or (clean.mode == 'P' and 'transparency' in clean.info)
+    rgb = clean.convert('RGBA' if has_alpha else 'RGB')
+    if fmt != 'WEBP':
+        webp = variant_name(name, 'webp')
+        rgb.save(os.path.join(folder, webp + '.tmp'), format='WEBP', quality=82, method=4)
+        os.replace(os.path.join(folder, webp + '.tmp'), os.path.join(folder, webp))
+        written.append(webp)
+    rgb.thumbnail((THUMB_SIZE, THUMB_SIZE))
+    thumb = variant_name(name, 'thumb')
+    rgb.save(os.path.join(folder, thumb + '.tmp'), format='WEBP', quality=75, method=4)
+    os.replace(os.path.join(folder, thumb + '.tmp'), os.path.join(folder, thumb))
+    written.append(thumb)
+    return written
+
+
+# --- pool ---
+_pool = None
+_pool_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {'submitted': 0, 'processed': 0, 'failed': 0, 'thread_fallbacks': 0}
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn, not fork: the web process has threads and open sqlite handles
+                _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def _done(future):
+    _count('failed' if future.exception() is not None else 'processed')
+
+
+def _run_in_thread(path):
+    try:
+        process(path)
+        _count('processed')
+    except Exception:
+        _count('failed')
+
+
+def submit(path):
+    """Queue background processing of a saved upload. Never blocks on the work itself."""
+    _count('submitted')
+    try:
+        future = _get_pool().submit(process, path)
+    except Exception:
+        # no usable process pool (e.g. broken after a worker crash): do it off-thread here
+        global _pool
+        _pool = None
+        _count('thread_fallbacks')
+        threading.Thread(target=_run_in_thread, args=(path,), name='image-process', daemon=True).start()
+        return None
+    future.add_done_callback(_done)
+    return future
+
+
+def stats():
+    with _stats_lock:
+        out = dict(_stats)
+    out['workers'] = WORKERS
+    return out
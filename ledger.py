@@ -0,0 +1,165 @@
+"""Append-only ledger of balance changes.
+
+users.balance is a cached per-user sum of ledger_entries.amount. Every balance
+change goes through post(), or post_deltas() / post_many() for batches, on the
+cursor of the transaction that causes it (see db.write_transaction). The entry
+is inserted and the balance moved with `balance = balance + ?` in that same
+transaction; no balance is read into Python and written back. A unique
+idempotency key makes a retried or double-submitted operation a no-op.
+
+reconcile() compares the cached balances with the ledger sums. A background
+thread runs it every LEDGER_RECONCILE_INTERVAL seconds and reports the
+mismatches in stats(); repair=True resets the affected balances to the ledger.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+import db
+
+RECONCILE_INTERVAL = float(os.environ.get('LEDGER_RECONCILE_INTERVAL', 3600))
+# REAL sums drift by fractions of a cent; anything below this is not a mismatch
+TOLERANCE = 0.005
+
+LEDGER_DDL = '''CREATE TABLE IF NOT EXISTS ledger_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    kind TEXT NOT NULL,
+    ref TEXT,
+    idempotency_key TEXT UNIQUE,
+    created_at TEXT NOT NULL,
+    FOREIGN KEY(user_id) REFERENCES users(id)
+)'''
+
+_stats = {'posted': 0, 'duplicates': 0, 'reconciled': 0}
+_last_reconcile = None
+
+
+def post(cur, user_id, amount, kind, ref=None, key=None):
+    """Record `amount` for user_id and apply it to the balance. Returns False if `key` was already posted."""
+    row = cur.execute('INSERT INTO ledger_entries (user_id, amount, kind, ref, idempotency_key, created_at) '
+                      'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(idempotency_key) DO NOTHING RETURNING id',
+                      (user_id, amount, kind, ref, key, datetime.utcnow().isoformat())).fetchone()
+    if row is None:
+        _stats['duplicates'] += 1
+        return False
+    cur.execute('UPDATE users SET balance = COALESCE(balance, 0) + ? WHERE id = ?', (amount, user_id))
+    _stats['posted'] += 1
+    return True
+
+
+def post_deltas(cur, deltas_sql, kind, ref, params=()):
+    """Post one entry per (user_id, delta) row of `deltas_sql`, keyed kind:ref:user_id.
+
+    Balances move by exactly the entries inserted here, so users already
+    posted under the same key are skipped. Returns the number of entries.
+    """
+    mark = _mark(cur)
+    # WHERE true: lets SQLite parse ON CONFLICT after INSERT ... SELECT
+    cur.execute(f"""INSERT INTO ledger_entries (user_id, amount, kind, ref, idempotency_key, created_at)
+                    SELECT d.user_id, d.delta, ?, ?, ? || ':' || ? || ':' || d.user_id, ?
+                    FROM ({deltas_sql}) d WHERE true
+                    ON CONFLICT(idempotency_key) DO NOTHING""",
+                (kind, ref, kind, ref, datetime.utcnow().isoformat()) + tuple(params))
+    posted = cur.rowcount
+    _apply_since(cur, mark)
+    _stats['posted'] += posted
+    return posted
+
+
+def post_many(cur, entries, kind):
+    """Post (user_id, amount, ref, key) entries with one INSERT and one balance UPDATE.
+
+    Entries whose key was already posted are skipped and move no balance.
+    Returns the number of entries inserted.
+    """
+    if not entries:
+        return 0
+    mark = _mark(cur)
+    now = datetime.utcnow().isoformat()
+    cur.executemany('INSERT INTO ledger_entries (user_id, amount, kind, ref, idempotency_key, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(idempotency_key) DO NOTHING',
+                    [(user_id, amount, kind, ref, key, now) for user_id, amount, ref, key in entries])
+    posted = cur.rowcount
+    _apply_since(cur, mark)
+    _stats['posted'] += posted
+    _stats['duplicates'] += len(entries) - posted
+    return posted
+
+
+def _mark(cur):
+    return cur.execute('SELECT COALESCE(MAX(id), 0) FROM ledger_entries').fetchone()[0]
+
+
+def _apply_since(cur, mark):
+    # the caller holds the write lock, so every id above the mark is ours
+    cur.execute('UPDATE users SET balance = COALESCE(balance, 0) + e.amount '
+                'FROM (SELECT user_id, SUM(amount) AS amount FROM ledger_entries WHERE id > ? GROUP BY user_id) e '
+                'WHERE users.id = e.user_id', (mark,))
+
+
+_MISMATCH_SQL = '''SELECT u.id AS user_id, COALESCE(u.balance, 0) AS balance, COALESCE(l.total, 0) AS ledger
+    FROM users u LEFT JOIN (SELECT user_id, SUM(amount) AS total FROM ledger_entries GROUP BY user_id) l
+        ON l.user_id = u.id
+    WHERE ABS(COALESCE(u.balance, 0) - COALESCE(l.total, 0)) > ?'''
+
+
+def reconcile(repair=False):
+    """Find users whose cached balance differs from their ledger sum. Returns the mismatches."""
+    global _last_reconcile
+    started = time.monotonic()
+    if repair:
+        def fix(cur):
+            rows = [dict(r) for r in cur.execute(_MISMATCH_SQL, (TOLERANCE,)).fetchall()]
+            cur.executemany('UPDATE users SET balance = ? WHERE id = ?', [(r['ledger'], r['user_id']) for r in rows])
+            return rows
+        mismatches = db.write_transaction(fix, exclusive=True)
+    else:
+        conn = db.get_db(readonly=True)
+        try:
+            mismatches = [dict(r) for r in conn.execute(_MISMATCH_SQL, (TOLERANCE,)).fetchall()]
+        finally:
+            conn.close()
+    _stats['reconciled'] += 1
+    _last_reconcile = {
+        'checked_at': datetime.utcnow().isoformat(),
+        'duration': round(time.monotonic() - started, 3),
+        'mismatches': len(mismatches),
+        'sample': mismatches[:10],
+        'repaired': bool(repair and mismatches),
+    }
+    return mismatches
+
+
+def stats():
+    out = dict(_stats)
+    out['last_reconcile'] = _last_reconcile
+    return out
+
+
+# --- reconciler ---
+_reconciler = None
+_reconciler_lock = threading.Lock()
+
+
+def start():
+    """Start the background reconciliation thread (idempotent)."""
+    global _reconciler
+    if _reconciler is not None and _reconciler.is_alive():
+        return
+    with _reconciler_lock:
+        if _reconciler is not None and _reconciler.is_alive():
+            return
+        _reconciler = threading.Thread(target=_run, name='ledger-reconcile', daemon=True)
+        _reconciler.start()
+
+
+def _run():
+    while True:
+        time.sleep(RECONCILE_INTERVAL)
+        try:
+            reconcile()
+        except Exception:
+            pass
@@ -0,0 +1,151 @@
+"""Upstream chat-completions calls for /assistant/query.
+
+Calls run on a small dedicated thread pool rather than on the web worker
+threads. Each pool thread keeps its own keep-alive HTTP(S) connection to the
+upstream. At most MAX_CONCURRENCY calls are in flight; when the cap is
+reached, or a call misses its deadline, complete() returns None straight away
+and the caller falls back to its local reply.
+
+Point LLM_API_URL at a local stub (e.g. http://127.0.0.1:8765/v1/chat/completions)
+to test without the real API.
+"""
+import http.client
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from urllib.parse import urlsplit
+
+API_URL = os.environ.get('LLM_API_URL', 'https://api.openai.com/v1/chat/completions')
+MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 4))
+DEADLINE = float(os.environ.get('LLM_DEADLINE', 15))
+SYSTEM_PROMPT = 'You are an investment assistant. Answer concisely and safely.'
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {'calls': 0, 'ok': 0, 'errors': 0, 'timeouts': 0, 'rejected': 0, 'in_flight': 0, 'connections_opened': 0}
+
+
+def _count(key, delta=1):
+    with _stats_lock:
+        _stats[key] += delta
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix='llm')
+    return _executor
+
+
+def _connection(url):
+    # one persistent connection per pool thread, reopened if the target changes
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'key', None) != key:
+        if conn is not None:
+            conn.close()
+        cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        conn = cls(parts.netloc, timeout=DEADLINE)
+        _local.conn, _local.key = conn, key
+        _count('connections_opened')
+    return conn
+
+
+def _drop_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+    _local.conn = None
+
+
+def _post(url, body, headers):
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    # a kept-alive connection may have been closed by the server meanwhile;
+    # retry once on a fresh one
+    for attempt in (1, 2):
+        conn = _connection(url)
+        try:
+            conn.request('POST', path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            _drop_connection()
+            if attempt == 2:
+                raise
+            continue
+        except Exception:
+            _drop_connection()
+            raise
+        if resp.will_close:
+            _drop_connection()
+        return resp.status, data
+
+
+def _call(message, api_key, model):
+    try:
+        payload = {
+            'model': model,
+            'messages': [
+                {'role': 'system', 'content': SYSTEM_PROMPT},
+                {'role': 'user', 'content': message}
+            ],
+            'max_tokens': 500
+        }
+        status, data = _post(API_URL, json.dumps(payload).encode('utf-8'),
+                             {'Content-Type': 'application/json', 'Authorization': 'Bearer ' + api_key})
+        if status != 200:
+            return None
+        res = json.loads(data)
+        if isinstance(res, dict) and res.get('choices'):
+            choice = res['choices'][0]
+            if isinstance(choice, dict) and choice.get('message'):
+                return choice['message'].get('content', '')
+        return None
+    finally:
+        _count('in_flight', -1)
+        _slots.release()
+
+
+def complete(message, api_key, model, deadline=None):
+    """Ask the upstream for a reply. Returns the text, or None on overload, timeout or error."""
+    if not _slots.acquire(blocking=False):
+        _count('rejected')
+        return None
+    _count('calls')
+    _count('in_flight')
+    try:
+        future = _get_executor().submit(_call, message, api_key, model)
+    except Exception:
+        _count('in_flight', -1)
+        _slots.release()
+        _count('errors')
+        return None
+    try:
+        reply = future.result(timeout=DEADLINE if deadline is None else deadline)
+    except FutureTimeout:
+        # the pool thread keeps its slot until the socket timeout frees it
+        _count('timeouts')
+        return None
+    except Exception:
+        _count('errors')
+        return None
+    _count('ok' if reply else 'errors')
+    return reply
+
+
+def stats():
+    with _stats_lock:
+        out = dict(_stats)
+    out['max_concurrency'] = MAX_CONCURRENCY
+    out['deadline_s'] = DEADLINE
+    return out
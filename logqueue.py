@@ -0,0 +1,149 @@
+"""Asynchronous, batched ingestion for assistant_logs.
+
+/assistant/log and /assistant/query enqueue their row and return at once; a
+background writer drains the queue and inserts whatever has accumulated (up to
+BATCH_SIZE rows) with one executemany, run on the database writer thread
+(db.write_transaction). The queue is bounded: when it is full new rows are
+dropped and counted rather than blocking the request. Remaining rows are
+flushed at shutdown.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import db
+
+MAX_QUEUE = int(os.environ.get('ASSISTANT_LOG_QUEUE_SIZE', 10000))
+BATCH_SIZE = 500
+# after the first row arrives, wait this long for more to share its commit
+BATCH_WAIT = 0.05
+IDLE_WAIT = 1.0
+
+INSERT_SQL = 'INSERT INTO assistant_logs (node_id, option_id, user_id, metadata, created_at) VALUES (?, ?, ?, ?, ?)'
+
+_queue = queue.Queue(maxsize=MAX_QUEUE)
+_lock = threading.Lock()
+_write_lock = threading.Lock()
+_wakeup = threading.Event()
+_thread = None
+
+# metrics
+queued = 0
+written = 0
+dropped = 0
+batches = 0
+write_errors = 0
+
+
+def _ensure_thread():
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_run, name='assistant-log-writer', daemon=True)
+        _thread.start()
+
+
+def enqueue(node_id, option_id, user_id, metadata):
+    """Queue one assistant_logs row. Returns False if it was dropped because the queue is full."""
+    global queued, dropped
+    row = (node_id, option_id, user_id, metadata, datetime.utcnow().isoformat())
+    try:
+        _queue.put_nowait(row)
+    except queue.Full:
+        with _lock:
+            dropped += 1
+        return False
+    with _lock:
+        queued += 1
+    _ensure_thread()
+    _wakeup.set()
+    return True
+
+
+def _drain(rows, limit):
+    while len(rows) < limit:
+        try:
+            rows.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return rows
+
+
+def _write(rows):
+    # caller holds _write_lock
+    global written, batches, write_errors, dropped
+    try:
+        db.write_transaction(lambda cur: cur.executemany(INSERT_SQL, rows))
+    except Exception:
+        # put the batch back for the next pass; whatever no longer fits is lost
+        lost = 0
+        for row in rows:
+            try:
+                _queue.put_nowait(row)
+            except queue.Full:
+                lost += 1
+        with _lock:
+            write_errors += 1
+            dropped += lost
+        raise
+    with _lock:
+        written += len(rows)
+        batches += 1
+
+
+def _run():
+    while True:
+        if not _wakeup.wait(IDLE_WAIT):
+            continue
+        _wakeup.clear()
+        # let more rows arrive to share the commit; they stay in the queue meanwhile
+        time.sleep(BATCH_WAIT)
+        try:
+            flush()
+        except Exception:
+            # back off briefly so a locked or missing table does not spin
+            time.sleep(IDLE_WAIT)
+            _wakeup.set()
+
+
+def flush():
+    """Write everything queued so far. Returns the number of rows written.
+
+    Rows only leave the queue under _write_lock, so this also waits for a
+    batch the background writer is in the middle of.
+    """
+    total = 0
+    with _write_lock:
+        while True:
+            rows = _drain([], BATCH_SIZE)
+            if not rows:
+                return total
+            _write(rows)
+            total += len(rows)
+
+
+def stats():
+    with _lock:
+        return {
+            'queued': queued,
+            'written': written,
+            'dropped': dropped,
+            'pending': _queue.qsize(),
+            'batches': batches,
+            'write_errors': write_errors,
+            'max_queue': MAX_QUEUE,
+        }
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        pass
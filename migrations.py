@@ -0,0 +1,348 @@
+"""Versioned schema migrations tracked through PRAGMA user_version.
+
+Each migration runs in its own BEGIN IMMEDIATE transaction together with the
+user_version bump, so concurrent workers starting at once apply it exactly
+once. Run on app start, or by hand with `python scripts/migrate.py`.
+"""
+import os
+import sqlite3
+
+import db
+
+SCHEMA_FILE = os.path.join(db.BASE_DIR, 'schema.sql')
+
+# The SQL below is frozen as each migration first shipped it. The modules that
+# own these tables keep their own copies and may change them; a migration must
+# keep producing the schema of its version, so later changes get a new one.
+_GENERATIONS_DDL = '''CREATE TABLE IF NOT EXISTS cache_generations (
+    name TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL DEFAULT 0
+)'''
+
+_PORTFOLIO_DDL = '''CREATE TABLE IF NOT EXISTS user_portfolio (
+    user_id INTEGER PRIMARY KEY,
+    active_principal REAL NOT NULL DEFAULT 0,
+    accrued_profit REAL NOT NULL DEFAULT 0,
+    active_investments INTEGER NOT NULL DEFAULT 0,
+    pending_investments INTEGER NOT NULL DEFAULT 0,
+    pending_withdrawals INTEGER NOT NULL DEFAULT 0,
+    last_activity TEXT,
+    FOREIGN KEY(user_id) REFERENCES users(id)
+)'''
+
+# every user's summary rebuilt from their investments and withdrawals
+_PORTFOLIO_BACKFILL = '''INSERT INTO user_portfolio (user_id, active_principal, accrued_profit, active_investments,
+                                  pending_investments, pending_withdrawals, last_activity)
+    SELECT u.id,
+        COALESCE((SELECT SUM(amount_usd) FROM investments WHERE user_id = u.id AND status = 'active'), 0),
+        COALESCE((SELECT SUM(current_profit) FROM investments WHERE user_id = u.id AND status = 'active'), 0),
+        (SELECT COUNT(*) FROM investments WHERE user_id = u.id AND status = 'active'),
+        (SELECT COUNT(*) FROM investments WHERE user_id = u.id AND status = 'pending'),
+        (SELECT COUNT(*) FROM withdrawals WHERE user_id = u.id AND status = 'pending'),
+        (SELECT MAX(t) FROM (
+            SELECT MAX(created_at) AS t FROM investments WHERE user_id = u.id
+            UNION ALL SELECT MAX(requested_at) FROM withdrawals WHERE user_id = u.id))
+    FROM users u WHERE 1=1
+    ON CONFLICT(user_id) DO UPDATE SET
+        active_principal = excluded.active_principal,
+        accrued_profit = excluded.accrued_profit,
+        active_investments = excluded.active_investments,
+        pending_investments = excluded.pending_investments,
+        pending_withdrawals = excluded.pending_withdrawals,
+        last_activity = COALESCE(excluded.last_activity, user_portfolio.last_activity)'''
+
+_UPLOAD_BLOBS_DDL = '''CREATE TABLE IF NOT EXISTS upload_blobs (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    released_at TEXT
+)'''
+
+_RATE_REFRESH_STATUS_DDL = '''CREATE TABLE IF NOT EXISTS rate_refresh_status (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    provider TEXT,
+    running_since TEXT,
+    last_attempt_at TEXT,
+    last_success_at TEXT,
+    last_duration REAL,
+    rates_count INTEGER,
+    last_error TEXT
+)'''
+
+_RATE_HISTORY_DDL = '''CREATE TABLE IF NOT EXISTS exchange_rate_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    currency_code TEXT NOT NULL,
+    rate REAL NOT NULL,
+    effective_at TEXT NOT NULL
+)'''
+
+_ACCRUAL_RUNS_DDL = '''CREATE TABLE IF NOT EXISTS accrual_runs (
+    period TEXT PRIMARY KEY,
+    as_of TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    investments INTEGER NOT NULL DEFAULT 0,
+    users INTEGER NOT NULL DEFAULT 0,
+    amount REAL NOT NULL DEFAULT 0,
+    duration REAL
+)'''
+
+_LEDGER_DDL = '''CREATE TABLE IF NOT EXISTS ledger_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    kind TEXT NOT NULL,
+    ref TEXT,
+    idempotency_key TEXT UNIQUE,
+    created_at TEXT NOT NULL,
+    FOREIGN KEY(user_id) REFERENCES users(id)
+)'''
+
+
+def _column_names(cur, table):
+    cur.execute(f'PRAGMA table_info({table})')
+    return {r[1] for r in cur.fetchall()}
+
+
+def _add_columns(cur, table, columns):
+    existing = _column_names(cur, table)
+    for name, spec in columns:
+        if name not in existing:
+            cur.execute(f'ALTER TABLE {table} ADD COLUMN {name} {spec}')
+
+
+def _schema_statements():
+    statement = ''
+    with open(SCHEMA_FILE, encoding='utf-8') as f:
+        for line in f:
+            statement += line
+            if sqlite3.complete_statement(statement):
+                yield statement.strip()
+                statement = ''
+
+
+def _baseline(cur):
+    # Everything schema.sql and the old scripts/create_*.py / migrate_*.py
+    # produced. Written to be safe on databases that already ran some of them.
+    for statement in _schema_statements():
+        # connection pragmas are set by db.configure_connection
+        if not statement.upper().startswith('PRAGMA'):
+            cur.execute(statement)
+    _add_columns(cur, 'users', [
+        ('phone', 'TEXT'),
+        ('country', 'TEXT'),
+        ('currency_code', 'TEXT'),
+        ('currency_symbol', 'TEXT'),
+        ('currency_name', 'TEXT'),
+    ])
+    _add_columns(cur, 'investment_plans', [
+        ('capital_back', 'INTEGER DEFAULT 1'),
+        ('created_at', 'TEXT'),
+        ('updated_at', 'TEXT'),
+    ])
+    _add_columns(cur, 'investments', [
+        ('amount_usd', 'REAL DEFAULT 0.0'),
+        ('amount_local', 'REAL'),
+        ('currency_code', 'TEXT'),
+        ('current_profit', 'REAL DEFAULT 0.0'),
+    ])
+    cur.execute('''CREATE TABLE IF NOT EXISTS announcements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        content TEXT,
+        image_url TEXT,
+        video_url TEXT,
+        is_active INTEGER DEFAULT 0,
+        start_date TEXT,
+        end_date TEXT,
+        created_at TEXT
+    )''')
+    _add_columns(cur, 'announcements', [
+        ('display_type', 'TEXT'),
+        ('video_file', 'TEXT'),
+    ])
+    cur.execute('''CREATE TABLE IF NOT EXISTS assistant_nodes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question TEXT NOT NULL,
+        is_root INTEGER DEFAULT 0,
+        created_at TEXT
+    )''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS assistant_options (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        node_id INTEGER NOT NULL,
+        option_text TEXT NOT NULL,
+        next_node_id INTEGER,
+        action_type TEXT,
+        action_payload TEXT,
+        display_order INTEGER DEFAULT 0,
+        FOREIGN KEY(node_id) REFERENCES assistant_nodes(id)
+    )''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS assistant_config (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        enabled INTEGER DEFAULT 1,
+        button_label TEXT DEFAULT 'Help',
+        assistant_name TEXT DEFAULT 'InvestPro Assistant',
+        avatar_url TEXT
+    )''')
+    cur.execute("INSERT OR IGNORE INTO assistant_config (id, enabled, button_label, assistant_name) VALUES (1, 1, 'Help', 'InvestPro Assistant')")
+    cur.execute('''CREATE TABLE IF NOT EXISTS assistant_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        node_id INTEGER,
+        option_id INTEGER,
+        user_id INTEGER,
+        metadata TEXT,
+        created_at TEXT
+    )''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS assistant_exports (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT NOT NULL,
+        filters TEXT,
+        created_at TEXT
+    )''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS exchange_rates (
+        currency_code TEXT PRIMARY KEY,
+        rate REAL,
+        updated_at TEXT
+    )''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS investment_settings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        min_amount REAL DEFAULT 10.0,
+        max_amount REAL DEFAULT 100000.0,
+        updated_at TEXT
+    )''')
+    cur.execute("INSERT INTO investment_settings (min_amount, max_amount, updated_at) SELECT 10.0, 100000.0, datetime('now') WHERE NOT EXISTS (SELECT 1 FROM investment_settings)")
+    cur.execute('''CREATE TABLE IF NOT EXISTS plan_stats (
+        plan_id INTEGER PRIMARY KEY,
+        total_views INTEGER DEFAULT 0,
+        total_investors INTEGER DEFAULT 0,
+        FOREIGN KEY(plan_id) REFERENCES investment_plans(id)
+    )''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS testimonials (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        body TEXT NOT NULL,
+        created_at TEXT
+    )''')
+    for name, body in (
+        ('John M.', 'Turned $200 into consistent weekly profits.'),
+        ('Sarah K.', 'Recovered her starting capital in 3 weeks.'),
+        ('David A.', 'Upgraded from Starter to Gold within a month.'),
+    ):
+        cur.execute("INSERT INTO testimonials (name, body, created_at) SELECT ?, ?, datetime('now') WHERE NOT EXISTS (SELECT 1 FROM testimonials WHERE name = ?)", (name, body, name))
+    cur.execute(_GENERATIONS_DDL)
+
+
+def _profit_accrual(cur):
+    _add_columns(cur, 'investments', [('activated_at', 'TEXT')])
+    cur.execute('UPDATE investments SET activated_at = created_at WHERE activated_at IS NULL AND status = ?', ('active',))
+    # approval used to credit the plan's whole profit up front; count that as
+    # accrued so the engine does not pay it a second time
+    cur.execute("""UPDATE investments SET current_profit = MAX(COALESCE(current_profit, 0),
+                       (SELECT COALESCE(profit_amount, 0) FROM investment_plans p WHERE p.id = investments.plan_id))
+                   WHERE status = 'active'""")
+    cur.execute(_ACCRUAL_RUNS_DDL)
+    cur.execute(_PORTFOLIO_BACKFILL)
+
+
+def _profit_adjustments(cur):
+    _add_columns(cur, 'investments', [('profit_adjustment', 'REAL NOT NULL DEFAULT 0')])
+    # admin edits so far are the investment's profit_adjustment ledger entries
+    cur.execute("""UPDATE investments SET profit_adjustment = (
+                       SELECT COALESCE(SUM(amount), 0) FROM ledger_entries
+                       WHERE kind = 'profit_adjustment' AND ref = 'investment:' || investments.id)""")
+
+
+# (version, description, list of SQL statements or a callable taking a cursor)
+MIGRATIONS = [
+    (1, 'baseline schema', _baseline),
+    (2, 'hot-path indexes', [
+        'CREATE INDEX IF NOT EXISTS idx_investments_user_id ON investments(user_id, id)',
+        'CREATE INDEX IF NOT EXISTS idx_investments_status ON investments(status)',
+        'CREATE INDEX IF NOT EXISTS idx_withdrawals_status ON withdrawals(status)',
+        'CREATE INDEX IF NOT EXISTS idx_withdrawals_user_id ON withdrawals(user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_assistant_logs_created_at ON assistant_logs(created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_assistant_logs_node_id ON assistant_logs(node_id)',
+        'CREATE INDEX IF NOT EXISTS idx_assistant_options_node_id ON assistant_options(node_id, display_order)',
+        # plan_stats.plan_id is its INTEGER PRIMARY KEY (the rowid), so lookups
+        # and the ON CONFLICT(plan_id) upsert are already keyed; nothing to add
+        'ANALYZE',
+    ]),
+    (3, 'export job tracking', [
+        # existing rows are finished synchronous exports
+        "ALTER TABLE assistant_exports ADD COLUMN status TEXT DEFAULT 'done'",
+        'ALTER TABLE assistant_exports ADD COLUMN rows_processed INTEGER DEFAULT 0',
+        'ALTER TABLE assistant_exports ADD COLUMN bytes_written INTEGER DEFAULT 0',
+        'ALTER TABLE assistant_exports ADD COLUMN error TEXT',
+        'ALTER TABLE assistant_exports ADD COLUMN updated_at TEXT',
+        'ALTER TABLE assistant_exports ADD COLUMN finished_at TEXT',
+        'CREATE INDEX IF NOT EXISTS idx_assistant_exports_status ON assistant_exports(status, id)',
+    ]),
+    (4, 'admin queue indexes', [
+        # pending queues page by id within a status; users are searched through
+        # the UNIQUE indexes on username and phone
+        'DROP INDEX IF EXISTS idx_investments_status',
+        'DROP INDEX IF EXISTS idx_withdrawals_status',
+        'CREATE INDEX IF NOT EXISTS idx_investments_status_id ON investments(status, id)',
+        'CREATE INDEX IF NOT EXISTS idx_withdrawals_status_id ON withdrawals(status, id)',
+    ]),
+    (5, 'materialized user portfolio', [_PORTFOLIO_DDL, _PORTFOLIO_BACKFILL]),
+    (6, 'content-addressed uploads', [
+        _UPLOAD_BLOBS_DDL,
+        'CREATE INDEX IF NOT EXISTS idx_upload_blobs_unreferenced ON upload_blobs(released_at) WHERE refcount = 0',
+    ]),
+    (7, 'rate refresh status', [_RATE_REFRESH_STATUS_DDL]),
+    (8, 'exchange rate history', [
+        _RATE_HISTORY_DDL,
+        'CREATE INDEX IF NOT EXISTS idx_exchange_rate_history_code ON exchange_rate_history(currency_code, effective_at)',
+        # seed with the current rates; earlier instants resolve to these
+        "INSERT INTO exchange_rate_history (currency_code, rate, effective_at) "
+        "SELECT UPPER(currency_code), rate, COALESCE(updated_at, datetime('now')) FROM exchange_rates WHERE rate IS NOT NULL",
+    ]),
+    (9, 'profit accrual', _profit_accrual),
+    (10, 'balance ledger', [
+        _LEDGER_DDL,
+        'CREATE INDEX IF NOT EXISTS idx_ledger_entries_user ON ledger_entries(user_id, id)',
+        # existing balances become each user's opening entry, so balance == SUM(amount) from here on
+        "INSERT INTO ledger_entries (user_id, amount, kind, ref, idempotency_key, created_at) "
+        "SELECT id, balance, 'opening', NULL, 'opening:' || id, datetime('now') FROM users WHERE COALESCE(balance, 0) != 0",
+    ]),
+    (11, 'admin profit adjustments', _profit_adjustments),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate():
+    """Apply pending migrations. Returns the list of versions applied."""
+    applied = []
+    conn = db.get_db()
+    try:
+        if current_version(conn) >= LATEST_VERSION:
+            return applied
+        for version, description, steps in MIGRATIONS:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # re-check under the write lock: another process may have won the race
+                if current_version(conn) >= version:
+                    conn.rollback()
+                    continue
+                cur = conn.cursor()
+                if callable(steps):
+                    steps(cur)
+                else:
+                    for statement in steps:
+                        cur.execute(statement)
+                cur.execute(f'PRAGMA user_version = {int(version)}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+    finally:
+        conn.close()
+    return applied
@@ -0,0 +1,72 @@
+"""Opaque cursor tokens for keyset pagination.
+
+A cursor is the sort key of the last (or first) row on a page, e.g.
+(created_at, id), serialised as url-safe base64 JSON so templates can pass it
+around without knowing what is inside.
+"""
+import base64
+import binascii
+import json
+
+
+def encode_cursor(*values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size=1):
+    """Return the list of `size` key values in `token`, or None if it is missing or malformed.
+
+    The last value is a row id and must be an integer; sort keys before it
+    must be strings, numbers or null. Anything else (lists, objects, ...)
+    would reach SQL as a bad parameter, so the token counts as malformed.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    *keys, row_id = values
+    if type(row_id) is not int or any(type(k) not in (str, int, float, type(None)) for k in keys):
+        return None
+    return values
+
+
+def id_page(cur, sql, params, id_column, after=None, before=None, per_page=50, descending=True):
+    """Run a keyset page of `sql` (a SELECT ending in its WHERE clause) ordered by `id_column`.
+
+    Rows must expose an `id` key. `after`/`before` are decoded single-value
+    cursors. Returns (rows, next_cursor, prev_cursor).
+    """
+    params = list(params)
+    forward = before is None
+    order = 'DESC' if descending == forward else 'ASC'
+    if after is not None:
+        sql += f" AND {id_column} {'<' if descending else '>'} ?"
+        params.append(after[0])
+    elif before is not None:
+        sql += f" AND {id_column} {'>' if descending else '<'} ?"
+        params.append(before[0])
+    # one extra row tells us whether another page exists
+    cur.execute(sql + f' ORDER BY {id_column} {order} LIMIT ?', params + [per_page + 1])
+    rows = cur.fetchall()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or not forward:
+            next_cursor = encode_cursor(rows[-1]['id'])
+        if after is not None or (before is not None and has_more):
+            prev_cursor = encode_cursor(rows[0]['id'])
+    return rows, next_cursor, prev_cursor
+
+
+def prefix_bounds(text):
+    """(low, high) such that `col >= low AND col < high` matches values starting with text, using an index."""
+    return text, text + '\U0010ffff'
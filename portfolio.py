@@ -0,0 +1,92 @@
+"""Materialized per-user portfolio summary (the user_portfolio table).
+
+dashboard() reads one row instead of re-adding a user's investments in Python.
+Every write that changes an investment or withdrawal status, amount or profit
+calls refresh(cur, user_id) on the same cursor before committing. The summary
+therefore moves in the same transaction as the change it reflects.
+"""
+from datetime import datetime
+
+SUMMARY_DDL = '''CREATE TABLE IF NOT EXISTS user_portfolio (
+    user_id INTEGER PRIMARY KEY,
+    active_principal REAL NOT NULL DEFAULT 0,
+    accrued_profit REAL NOT NULL DEFAULT 0,
+    active_investments INTEGER NOT NULL DEFAULT 0,
+    pending_investments INTEGER NOT NULL DEFAULT 0,
+    pending_withdrawals INTEGER NOT NULL DEFAULT 0,
+    last_activity TEXT,
+    FOREIGN KEY(user_id) REFERENCES users(id)
+)'''
+
+# Recomputes the summary for the users matched by {where} from their own rows
+# (investments and withdrawals are indexed by user_id), so repeated or
+# overlapping refreshes cannot drift. last_activity is the supplied timestamp,
+# or for a backfill the latest investment/withdrawal time.
+_REFRESH_SQL = '''INSERT INTO user_portfolio (user_id, active_principal, accrued_profit, active_investments,
+                                  pending_investments, pending_withdrawals, last_activity)
+    SELECT u.id,
+        COALESCE((SELECT SUM(amount_usd) FROM investments WHERE user_id = u.id AND status = 'active'), 0),
+        COALESCE((SELECT SUM(current_profit) FROM investments WHERE user_id = u.id AND status = 'active'), 0),
+        (SELECT COUNT(*) FROM investments WHERE user_id = u.id AND status = 'active'),
+        (SELECT COUNT(*) FROM investments WHERE user_id = u.id AND status = 'pending'),
+        (SELECT COUNT(*) FROM withdrawals WHERE user_id = u.id AND status = 'pending'),
+        COALESCE(?, (SELECT MAX(t) FROM (
+            SELECT MAX(created_at) AS t FROM investments WHERE user_id = u.id
+            UNION ALL SELECT MAX(requested_at) FROM withdrawals WHERE user_id = u.id)))
+    FROM users u {where}
+    ON CONFLICT(user_id) DO UPDATE SET
+        active_principal = excluded.active_principal,
+        accrued_profit = excluded.accrued_profit,
+        active_investments = excluded.active_investments,
+        pending_investments = excluded.pending_investments,
+        pending_withdrawals = excluded.pending_withdrawals,
+        last_activity = COALESCE(excluded.last_activity, user_portfolio.last_activity)'''
+
+EMPTY = {
+    'active_principal': 0.0,
+    'accrued_profit': 0.0,
+    'active_investments': 0,
+    'pending_investments': 0,
+    'pending_withdrawals': 0,
+    'last_activity': None,
+}
+
+
+def refresh(cur, user_id, when=None):
+    """Recompute user_id's summary on `cur`; the caller commits."""
+    if user_id is None:
+        return
+    when = when or datetime.utcnow().isoformat()
+    cur.execute(_REFRESH_SQL.format(where='WHERE u.id = ?'), (when, user_id))
+
+
+def refresh_many(cur, user_ids):
+    """Recompute several users' summaries in one statement (e.g. after a bulk update)."""
+    ids = sorted({int(u) for u in user_ids if u is not None})
+    if not ids:
+        return
+    when = datetime.utcnow().isoformat()
+    # chunked to stay under SQLite's bound-parameter limit
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        cur.execute(_REFRESH_SQL.format(where='WHERE u.id IN (%s)' % ','.join('?' * len(chunk))), [when] + chunk)
+
+
+def add_profit(cur, deltas_sql):
+    """Shift accrued_profit by per-user deltas from `deltas_sql` (a SELECT of user_id, delta).
+
+    For the accrual engine, which only moves current_profit of active
+    investments; cheaper than a full refresh of every affected user.
+    """
+    cur.execute(f'UPDATE user_portfolio SET accrued_profit = accrued_profit + d.delta FROM ({deltas_sql}) d '
+                'WHERE user_portfolio.user_id = d.user_id')
+
+
+def refresh_all(cur):
+    """Rebuild every user's summary (backfill / repair)."""
+    cur.execute(_REFRESH_SQL.format(where='WHERE 1=1'), (None,))
+
+
+def get_summary(conn, user_id):
+    row = conn.execute('SELECT * FROM user_portfolio WHERE user_id = ?', (user_id,)).fetchone()
+    return dict(row) if row else dict(EMPTY)
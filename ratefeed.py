@@ -0,0 +1,247 @@
+"""Scheduled exchange-rate refresh (base USD), run inside the app process.
+
+A provider returns {currency_code: rate}:
+  HttpProvider(url)      exchangerate.host-style JSON ({"rates": {...}})
+  FileProvider(path)     a JSON file, either {"rates": {...}} or a bare mapping
+  StaticProvider(rates)  a fixed table; SAMPLE_RATES is the built-in fixture
+RATES_PROVIDER picks one: 'http' (default), 'file:/path/to/rates.json' or 'sample'.
+
+refresh() fetches, then writes every rate (plus history rows for the changed
+ones) with executemany in a single transaction that also bumps
+currency.RATES_GENERATION. A scheduler thread calls it every RATES_REFRESH_INTERVAL seconds (0 disables the schedule), and
+the admin "Update Now" button wakes it through trigger(). The single
+rate_refresh_status row records attempts, successes, duration and errors, so
+every process reports the same status. Claiming that row also ensures only
+one process fetches per interval.
+"""
+import json
+import os
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+import currency
+import db
+
+API_URL = 'https://api.exchangerate.host/latest?base=USD'
+PROVIDER = os.environ.get('RATES_PROVIDER', 'http')
+REFRESH_INTERVAL = float(os.environ.get('RATES_REFRESH_INTERVAL', 3600))
+# after a failed attempt, wait this long before the scheduler tries again
+RETRY_AFTER = 300
+# a claim older than this is assumed to belong to a dead process
+STALE_CLAIM = 120
+FETCH_TIMEOUT = 10
+POLL_INTERVAL = 60.0
+
+SAMPLE_RATES = {
+    'USD': 1.0,
+    'NGN': 770.0,
+    'GBP': 0.79,
+    'EUR': 0.92,
+    'CAD': 1.36,
+    'PGK': 3.5
+}
+
+_stats = {'refreshes': 0, 'failures': 0}
+
+STATUS_DDL = '''CREATE TABLE IF NOT EXISTS rate_refresh_status (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    provider TEXT,
+    running_since TEXT,
+    last_attempt_at TEXT,
+    last_success_at TEXT,
+    last_duration REAL,
+    rates_count INTEGER,
+    last_error TEXT
+)'''
+
+
+class HttpProvider:
+    def __init__(self, url=API_URL, timeout=FETCH_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.name = 'http'
+
+    def fetch(self):
+        with urllib.request.urlopen(self.url, timeout=self.timeout) as resp:
+            data = json.load(resp)
+        return data.get('rates') or {}
+
+
+class FileProvider:
+    def __init__(self, path):
+        self.path = path
+        self.name = f'file:{path}'
+
+    def fetch(self):
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('rates', data) if isinstance(data, dict) else {}
+
+
+class StaticProvider:
+    def __init__(self, rates, name='sample'):
+        self.rates = rates
+        self.name = name
+
+    def fetch(self):
+        return dict(self.rates)
+
+
+def provider_from_setting(setting=None):
+    setting = setting or PROVIDER
+    if setting == 'sample':
+        return StaticProvider(SAMPLE_RATES)
+    if setting.startswith('file:'):
+        return FileProvider(setting[len('file:'):])
+    return HttpProvider()
+
+
+def _clean(rates):
+    out = {}
+    for code, rate in (rates or {}).items():
+        try:
+            value = float(rate)
+        except (TypeError, ValueError):
+            continue
+        if code and value > 0:
+            out[str(code).upper()] = value
+    return out
+
+
+def _claim(cur, force):
+    """Mark a refresh as running. Returns False if another one is running or none is due."""
+    now = datetime.utcnow()
+    cur.execute(STATUS_DDL)
+    cur.execute('INSERT OR IGNORE INTO rate_refresh_status (id) VALUES (1)')
+    sql = ('UPDATE rate_refresh_status SET running_since = ?, last_attempt_at = ? '
+           'WHERE id = 1 AND (running_since IS NULL OR running_since < ?)')
+    params = [now.isoformat(), now.isoformat(), (now - timedelta(seconds=STALE_CLAIM)).isoformat()]
+    if not force:
+        sql += (' AND (last_success_at IS NULL OR last_success_at < ?)'
+                ' AND (last_attempt_at IS NULL OR last_attempt_at < ?)')
+        params += [(now - timedelta(seconds=REFRESH_INTERVAL)).isoformat(),
+                   (now - timedelta(seconds=RETRY_AFTER)).isoformat()]
+    return bool(cur.execute(sql + ' RETURNING id', params).fetchall())
+
+
+def _has_rates():
+    conn = db.get_db(readonly=True)
+    try:
+        return conn.execute('SELECT 1 FROM exchange_rates LIMIT 1').fetchone() is not None
+    except Exception:
+        return False
+    finally:
+        conn.close()
+
+
+def refresh(force=False, provider=None):
+    """Fetch and store a full rate table. Returns a result dict, or None when skipped.
+
+    Without `force`, nothing happens unless the last success is older than
+    REFRESH_INTERVAL (and the last failure older than RETRY_AFTER).
+    """
+    provider = provider or provider_from_setting()
+    # the fetch runs on this thread; only the claim and the store go to the database writer
+    if not db.write_transaction(lambda cur: _claim(cur, force)):
+        return None
+    started = time.monotonic()
+    error = None
+    name = provider.name
+    try:
+        rates = _clean(provider.fetch())
+        if not rates:
+            raise ValueError('provider returned no rates')
+    except Exception as e:
+        error = str(e)[:500] or e.__class__.__name__
+        rates = {}
+        if not _has_rates():
+            # first run with no network: start from the fixture, as the old script did
+            rates, name = dict(SAMPLE_RATES), 'sample (fallback)'
+    now = datetime.utcnow().isoformat()
+    duration = round(time.monotonic() - started, 3)
+
+    def store(cur):
+        if rates:
+            currency.store_rates(cur, rates, now)
+            db.bump_generation(cur.connection, currency.RATES_GENERATION)
+        cur.execute('UPDATE rate_refresh_status SET running_since = NULL, provider = ?, last_duration = ?, '
+                    'last_error = ?, rates_count = ?, last_success_at = CASE WHEN ? THEN ? ELSE last_success_at END '
+                    'WHERE id = 1', (name, duration, error, len(rates), error is None, now))
+    try:
+        db.write_transaction(store)
+    except Exception:
+        db.write_transaction(lambda cur: cur.execute('UPDATE rate_refresh_status SET running_since = NULL WHERE id = 1'))
+        raise
+    if rates:
+        currency.invalidate_rates()
+    _stats['refreshes' if error is None else 'failures'] += 1
+    return {'provider': name, 'rates': len(rates), 'duration': duration, 'error': error}
+
+
+def status():
+    """Shared refresh status plus how stale the stored rates are, in seconds."""
+    conn = db.get_db(readonly=True)
+    try:
+        row = conn.execute('SELECT * FROM rate_refresh_status WHERE id = 1').fetchone()
+        newest = conn.execute('SELECT MAX(updated_at) FROM exchange_rates').fetchone()[0]
+    except Exception:
+        row, newest = None, None
+    finally:
+        conn.close()
+    out = dict(row) if row else {}
+    out.pop('id', None)
+    # age of the last full refresh; a hand-edited single rate does not make the table fresh
+    since = out.get('last_success_at') or newest
+    staleness = None
+    if since:
+        try:
+            staleness = round((datetime.utcnow() - datetime.fromisoformat(since)).total_seconds())
+        except ValueError:
+            pass
+    out['staleness_seconds'] = staleness
+    out['stale'] = staleness is None or (REFRESH_INTERVAL > 0 and staleness > 2 * REFRESH_INTERVAL)
+    out['interval'] = REFRESH_INTERVAL
+    out.update(_stats)
+    return out
+
+
+# --- scheduler ---
+_wakeup = threading.Event()
+_force = threading.Event()
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start():
+    """Start the scheduler thread (idempotent)."""
+    global _scheduler
+    if _scheduler is not None and _scheduler.is_alive():
+        return
+    with _scheduler_lock:
+        if _scheduler is not None and _scheduler.is_alive():
+            return
+        _scheduler = threading.Thread(target=_run, name='rate-refresh', daemon=True)
+        _scheduler.start()
+
+
+def trigger():
+    """Ask the scheduler for an immediate refresh; returns without waiting for it."""
+    _force.set()
+    start()
+    _wakeup.set()
+
+
+def _run():
+    while True:
+        force = _force.is_set()
+        _force.clear()
+        if force or REFRESH_INTERVAL > 0:
+            try:
+                refresh(force=force)
+            except Exception:
+                # the status row keeps the last error; keep the scheduler alive
+                pass
+        _wakeup.wait(min(POLL_INTERVAL, REFRESH_INTERVAL) if REFRESH_INTERVAL > 0 else None)
+        _wakeup.clear()
@@ -0,0 +1,146 @@
+"""Admin review of pending investments and withdrawals, one id or many at once.
+
+Each function takes a cursor inside the caller's transaction and a list of
+ids, and returns {id: outcome}. Outcomes are 'approved', 'rejected',
+'not found', 'not pending' or 'insufficient balance'. Only pending items
+change. The rows, their plans and their users are each fetched with one
+query, and the writes go out as executemany / IN-list statements. A batch of
+hundreds therefore costs a handful of statements and a single commit.
+Withdrawal debits go to the ledger in one ledger.post_many() call. Run
+these through db.write_transaction, so that balance checks and balance
+updates see the same data.
+"""
+from collections import Counter
+from datetime import datetime
+
+import ledger
+import portfolio
+
+MAX_BATCH = 500
+
+
+def parse_ids(values):
+    """Distinct positive integer ids from form values, in order, at most MAX_BATCH."""
+    ids = []
+    seen = set()
+    for v in values:
+        try:
+            i = int(v)
+        except (TypeError, ValueError):
+            continue
+        if i > 0 and i not in seen:
+            seen.add(i)
+            ids.append(i)
+    return ids[:MAX_BATCH]
+
+
+def _in(ids):
+    return ','.join('?' * len(ids))
+
+
+def _fetch(cur, sql, ids):
+    if not ids:
+        return {}
+    return {r['id']: r for r in cur.execute(sql.format(ids=_in(ids)), list(ids)).fetchall()}
+
+
+def _pending(rows, ids):
+    outcomes = {}
+    pending = []
+    for i in ids:
+        row = rows.get(i)
+        if row is None:
+            outcomes[i] = 'not found'
+        elif row['status'] != 'pending':
+            outcomes[i] = 'not pending'
+        else:
+            pending.append(row)
+    return outcomes, pending
+
+
+def approve_investments(cur, ids):
+    rows = _fetch(cur, 'SELECT id, user_id, plan_id, status, amount_usd FROM investments WHERE id IN ({ids})', ids)
+    outcomes, pending = _pending(rows, ids)
+    if not pending:
+        return outcomes
+    plans = _fetch(cur, 'SELECT id, minimum_amount FROM investment_plans WHERE id IN ({ids})',
+                   sorted({r['plan_id'] for r in pending if r['plan_id'] is not None}))
+    now = datetime.utcnow().isoformat()
+    updates = []
+    for r in pending:
+        # missing amount falls back to the plan minimum, as single approval always did
+        amount = r['amount_usd']
+        if amount is None and r['plan_id'] in plans:
+            try:
+                amount = float(plans[r['plan_id']]['minimum_amount'])
+            except (TypeError, ValueError):
+                amount = 0.0
+        updates.append((now, amount, r['id']))
+        outcomes[r['id']] = 'approved'
+    # profit is credited to the balance day by day by the accrual engine (accrual.py)
+    cur.executemany("UPDATE investments SET status = 'active', activated_at = ?, amount_usd = COALESCE(?, amount_usd), "
+                    "current_profit = COALESCE(current_profit, 0.0) WHERE id = ? AND status = 'pending'", updates)
+    investors = Counter(r['plan_id'] for r in pending if r['plan_id'] in plans)
+    try:
+        cur.executemany('INSERT INTO plan_stats (plan_id, total_views, total_investors) VALUES (?, 0, ?) '
+                        'ON CONFLICT(plan_id) DO UPDATE SET total_investors = total_investors + excluded.total_investors',
+                        sorted(investors.items()))
+    except Exception:
+        pass
+    portfolio.refresh_many(cur, [r['user_id'] for r in pending])
+    return outcomes
+
+
+def _reject(cur, table, ids):
+    rows = _fetch(cur, f'SELECT id, user_id, status FROM {table} WHERE id IN ({{ids}})', ids)
+    outcomes, pending = _pending(rows, ids)
+    if pending:
+        done = [r['id'] for r in pending]
+        cur.execute(f"UPDATE {table} SET status = 'rejected' WHERE status = 'pending' AND id IN ({_in(done)})", done)
+        outcomes.update((i, 'rejected') for i in done)
+        portfolio.refresh_many(cur, [r['user_id'] for r in pending])
+    return outcomes
+
+
+def reject_investments(cur, ids):
+    return _reject(cur, 'investments', ids)
+
+
+def reject_withdrawals(cur, ids):
+    return _reject(cur, 'withdrawals', ids)
+
+
+def approve_withdrawals(cur, ids):
+    rows = _fetch(cur, 'SELECT id, user_id, amount, status FROM withdrawals WHERE id IN ({ids})', ids)
+    outcomes, pending = _pending(rows, ids)
+    if not pending:
+        return outcomes
+    users = _fetch(cur, 'SELECT id, balance FROM users WHERE id IN ({ids})', sorted({r['user_id'] for r in pending}))
+    # several requests from one user draw on the same running balance, oldest first
+    balances = {u: float(row['balance'] or 0) for u, row in users.items()}
+    approved = []
+    for r in sorted(pending, key=lambda r: r['id']):
+        amount = float(r['amount'] or 0)
+        if r['user_id'] in balances and balances[r['user_id']] >= amount:
+            balances[r['user_id']] -= amount
+            approved.append(r)
+            outcomes[r['id']] = 'approved'
+        else:
+            outcomes[r['id']] = 'insufficient balance'
+    if approved:
+        done = [r['id'] for r in approved]
+        ledger.post_many(cur, [(r['user_id'], -float(r['amount'] or 0), f"withdrawal:{r['id']}", f"withdrawal:{r['id']}")
+                               for r in approved], 'withdrawal')
+        cur.execute(f"UPDATE withdrawals SET status = 'approved' WHERE status = 'pending' AND id IN ({_in(done)})", done)
+        portfolio.refresh_many(cur, [r['user_id'] for r in approved])
+    return outcomes
+
+
+def summarize(outcomes, done):
+    """Flash text for a batch: how many reached `done`, and why the rest did not."""
+    ok = sum(1 for o in outcomes.values() if o == done)
+    text = f'{ok} {done}'
+    skipped = [f'#{i} {o}' for i, o in outcomes.items() if o != done]
+    if skipped:
+        text += f"; {len(skipped)} skipped ({', '.join(skipped[:20])}{', ...' if len(skipped) > 20 else ''})"
+    return text
@@ -61,3 +61,9 @@ INSERT INTO withdrawal_settings (min_amount, max_amount) SELECT 10.0, 10000.0 WH
 -- Example plan
 INSERT INTO investment_plans (plan_name, minimum_amount, profit_amount, total_return, duration_days, capital_back, status, created_at, updated_at)
 SELECT 'Starter Plan', 100.0, 10.0, 110.0, 30, 1, 'active', datetime('now'), datetime('now') WHERE NOT EXISTS (SELECT 1 FROM investment_plans);
+
+-- Generation counters used to invalidate in-process caches across workers
+CREATE TABLE IF NOT EXISTS cache_generations (
+  name TEXT PRIMARY KEY,
+  generation INTEGER NOT NULL DEFAULT 0
+);
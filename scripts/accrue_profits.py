@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+"""Apply the daily profit accrual now (see accrual.py).
+The running app does this on its own schedule; use this from cron when it
+runs with ACCRUAL_CHECK_INTERVAL=0.
+Run: python scripts/accrue_profits.py
+"""
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+import accrual
+
+def main():
+    report = accrual.run()
+    if report is None:
+        print('Period', accrual.current_period()[0], 'already accrued')
+        return
+    print(f"Accrued {report['amount']} over {report['investments']} investments "
+          f"({report['users']} users) through {report['as_of']} in {report['duration']}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+"""Fingerprint and precompress static assets (see assets.py).
+Run: python scripts/build_assets.py
+"""
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+import assets
+
+def main():
+    manifest = assets.build()
+    for logical, hashed in sorted(manifest.items()):
+        print(f'{logical} -> {hashed}')
+    if assets.brotli is None:
+        print('brotli not installed: only .gz variants written')
+
+if __name__ == '__main__':
+    main()
@@ -5,13 +5,16 @@ import os
 from werkzeug.security import generate_password_hash
 from datetime import datetime
 import getpass
+import sys
 
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app.db')
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+from db import get_db
 
 
 def create_admin(username, email, password, country, currency_code, currency_symbol, currency_name):
     pw_hash = generate_password_hash(password)
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cur = conn.cursor()
     try:
         try:
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+"""Apply pending schema migrations (see migrations.py).
+Run: python scripts/migrate.py
+"""
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+import db
+import migrations
+
+def main():
+    applied = migrations.migrate()
+    conn = db.get_db()
+    version = migrations.current_version(conn)
+    conn.close()
+    if applied:
+        print('Applied migrations:', ', '.join(str(v) for v in applied))
+    else:
+        print('No migrations pending')
+    print('Schema version', version)
+
+if __name__ == '__main__':
+    main()
@@ -58,7 +58,51 @@
       container.appendChild(btn);
     });
     wrap.appendChild(container);
-    appendBotCard(wrap.outerHTML);
+    // append the element itself (not its HTML) so the click handlers survive
+    var div = document.createElement('div'); div.className = 'ai-msg bot'; div.appendChild(wrap);
+    messages.appendChild(div); messages.scrollTop = messages.scrollHeight;
+  }
+
+  function renderNode(res){
+    if(res.node && res.node.question) appendBotCard('<div class="ai-card"><h4>' + escapeHtml(res.node.question) + '</h4></div>');
+    if(Array.isArray(res.options) && res.options.length) renderOptions(res.options, res.node.id);
+  }
+
+  // --- decision tree snapshot ---
+  // The whole node/option graph is fetched once from /assistant/tree, kept in
+  // localStorage and revalidated with If-None-Match, then walked locally.
+  var TREE_KEY = 'assistantTree';
+  var tree = null;
+  var treeRequest = null;
+
+  function readStoredTree(){
+    try { var t = JSON.parse(window.localStorage.getItem(TREE_KEY)); return (t && t.version && t.nodes) ? t : null; }
+    catch(e){ return null; }
+  }
+
+  function storeTree(t){
+    try { window.localStorage.setItem(TREE_KEY, JSON.stringify(t)); } catch(e){}
+  }
+
+  function loadTree(){
+    if(tree) return Promise.resolve(tree);
+    if(treeRequest) return treeRequest;
+    var stored = readStoredTree();
+    var headers = stored ? {'If-None-Match': '"' + stored.version + '"'} : {};
+    treeRequest = fetch('/assistant/tree', {headers: headers}).then(function(r){
+      if(r.status === 304 && stored) return stored;
+      if(!r.ok) throw r;
+      return r.json().then(function(t){ storeTree(t); return t; });
+    }).catch(function(){
+      // offline or server error: a stale tree is better than none
+      if(stored) return stored;
+      throw new Error('tree unavailable');
+    }).then(function(t){ tree = t; return t; }, function(err){ treeRequest = null; throw err; });
+    return treeRequest;
+  }
+
+  function treeNode(nodeId){
+    return (tree && tree.nodes) ? tree.nodes[String(nodeId)] || null : null;
   }
 
   function handleOptionClick(nodeId, option){
@@ -74,11 +118,16 @@
     }
 
     if(option.next_node_id){
+      var local = treeNode(option.next_node_id);
+      if(local){ renderNode(local); return; }
+      // not in the snapshot (edited since it was cached): ask the server
       var t = showTyping();
       fetchJson('/assistant/node/' + option.next_node_id).then(function(res){
         if(t && t.parentNode) t.parentNode.removeChild(t);
-        if(res.node && res.node.question) appendBotCard('<div class="ai-card"><h4>' + escapeHtml(res.node.question) + '</h4></div>');
-        if(Array.isArray(res.options) && res.options.length) renderOptions(res.options, res.node.id);
+        renderNode(res);
+        // the snapshot is stale: revalidate it now so the next click is local again
+        tree = null; treeRequest = null;
+        loadTree().catch(function(){});
       }).catch(function(){ if(t && t.parentNode) t.parentNode.removeChild(t); appendBotCard('<div class="ai-card"><h4>Oops</h4><p>Failed to load response.</p></div>'); });
     }
   }
@@ -89,14 +138,14 @@
     clearMessages();
     // try database-driven assistant first, fall back to scripted greeting
     scan && (scan.style.display = 'block');
-    fetchJson('/assistant/start').then(function(res){
+    loadTree().then(function(t){
       scan && (scan.style.display = 'none');
-      if(res.error){
+      var root = t.root_id != null ? treeNode(t.root_id) : null;
+      if(!root){
         showGreeting();
         return;
       }
-      if(res.node && res.node.question) appendBotCard('<div class="ai-card"><h4>' + escapeHtml(res.node.question) + '</h4></div>');
-      if(Array.isArray(res.options) && res.options.length) renderOptions(res.options, res.node.id);
+      renderNode(root);
     }).catch(function(){ scan && (scan.style.display = 'none'); showGreeting(); });
   }
 
@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# a throwaway database, no background schedulers, no network
+_tmp = tempfile.mkdtemp(prefix='app-tests-')
+os.environ.setdefault('APP_DB_PATH', os.path.join(_tmp, 'app.db'))
+os.environ.setdefault('RATES_PROVIDER', 'sample')
+for _name in ('RATES_REFRESH_INTERVAL', 'ACCRUAL_CHECK_INTERVAL', 'LEDGER_RECONCILE_INTERVAL'):
+    os.environ.setdefault(_name, '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app_module():
+    import app
+    app.create_app()
+    app.app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def admin_client(app_module):
+    client = app_module.app.test_client()
+    client.post('/register', data={'username': 'admin', 'password': 'pw', 'phone': 'admin-phone'})
+    client.post('/login', data={'username': 'admin', 'password': 'pw'})
+    return client
+
+
+@pytest.fixture
+def uploads(app_module, tmp_path, monkeypatch):
+    """Point the blob store (and the app's upload folder) at a temporary directory."""
+    import blobstore
+    monkeypatch.setattr(blobstore, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def admin_id(admin_client):
+    import db
+    conn = db.get_db(readonly=True)
+    try:
+        return conn.execute("SELECT id FROM users WHERE username = 'admin'").fetchone()[0]
+    finally:
+        conn.close()
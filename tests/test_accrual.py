@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+import accrual
+import db
+
+
+def test_admin_correction_survives_the_next_run(admin_client):
+    conn = db.get_db(readonly=True)
+    user_id = conn.execute("SELECT id FROM users WHERE username = 'admin'").fetchone()[0]
+    conn.close()
+    now = datetime(2030, 1, 11, 12)
+
+    def create(cur):
+        plan_id = cur.execute("INSERT INTO investment_plans (plan_name, minimum_amount, profit_amount, duration_days) "
+                              "VALUES ('Accrual plan', 10, 30, 30)").lastrowid
+        return cur.execute("INSERT INTO investments (user_id, plan_id, status, amount_usd, current_profit, activated_at, created_at) "
+                           "VALUES (?, ?, 'active', 10, 0, ?, ?)",
+                           (user_id, plan_id, (now - timedelta(days=10)).replace(hour=0).isoformat(), now.isoformat())).lastrowid
+    inv_id = db.write_transaction(create)
+
+    def profit():
+        conn = db.get_db(readonly=True)
+        try:
+            return conn.execute('SELECT current_profit FROM investments WHERE id = ?', (inv_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    accrual.run(now)
+    assert profit() == 10
+    # the admin takes 6 back; the next day's run adds only that day's profit
+    admin_client.post(f'/admin/investments/{inv_id}/edit', data={'current_profit': '4', 'idempotency_key': 'lower'})
+    assert profit() == 4
+    accrual.run(now + timedelta(days=1))
+    assert profit() == 5
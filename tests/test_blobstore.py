@@ -0,0 +1,53 @@
+import io
+import os
+
+import blobstore
+import db
+
+
+def _refcount(name):
+    conn = db.get_db(readonly=True)
+    try:
+        return conn.execute('SELECT refcount FROM upload_blobs WHERE name = ?', (name,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_plan_delete_releases_proof_blobs(admin_client, admin_id, uploads):
+    name, created = blobstore.ingest(io.BytesIO(b'proof bytes for the plan delete test'), '.png')
+    assert created
+
+    def create(cur):
+        plan_id = cur.execute("INSERT INTO investment_plans (plan_name, minimum_amount, profit_amount, duration_days) "
+                              "VALUES ('Doomed plan', 10, 0, 30)").lastrowid
+        cur.execute("INSERT INTO investments (user_id, plan_id, status, proof_image, amount_usd, created_at) "
+                    "VALUES (?, ?, 'pending', ?, 10, datetime('now'))", (admin_id, plan_id, name))
+        blobstore.retain(cur, name)
+        return plan_id
+    plan_id = db.write_transaction(create)
+    assert _refcount(name) == 1
+
+    admin_client.post(f'/admin/plans/{plan_id}/delete')
+
+    assert _refcount(name) == 0
+    assert blobstore.collect(grace=-1) >= 1
+    assert not os.path.exists(blobstore.path_for(name))
+
+
+def test_upload_proof_rejects_foreign_investment(app_module, admin_client, admin_id, uploads):
+    def create(cur):
+        plan_id = cur.execute("INSERT INTO investment_plans (plan_name, minimum_amount, profit_amount, duration_days) "
+                              "VALUES ('Other plan', 10, 0, 30)").lastrowid
+        return cur.execute("INSERT INTO investments (user_id, plan_id, status, amount_usd, created_at) "
+                           "VALUES (?, ?, 'pending', 10, datetime('now'))", (admin_id, plan_id)).lastrowid
+    investment_id = db.write_transaction(create)
+
+    other = app_module.app.test_client()
+    other.post('/register', data={'username': 'mallory', 'password': 'pw', 'phone': 'mallory-phone'})
+    other.post('/login', data={'username': 'mallory', 'password': 'pw'})
+    png = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+    resp = other.post(f'/upload_proof/{investment_id}', data={'proof': (io.BytesIO(png), 'proof.png')},
+                      content_type='multipart/form-data', follow_redirects=True)
+
+    assert b'Investment not found' in resp.data
+    assert not any(files for _, _, files in os.walk(uploads))
@@ -0,0 +1,20 @@
+import currency
+import db
+
+
+def test_invalidate_rates_refreshes_history(app_module):
+    def store(rate, when):
+        def job(cur):
+            currency.store_rates(cur, {'XTS': rate}, when)
+            db.bump_generation(cur.connection, currency.RATES_GENERATION)
+        db.write_transaction(job)
+        currency.invalidate_rates()
+
+    store(100.0, '2024-01-01T00:00:00')
+    assert currency.rate_at('XTS', '2024-06-01T00:00:00') == 100.0
+
+    store(200.0, '2024-03-01T00:00:00')
+    # seen at once in this process, without waiting for the generation check
+    assert currency.get_rate('XTS') == 200.0
+    assert currency.rate_at('XTS', '2024-06-01T00:00:00') == 200.0
+    assert currency.rate_at('XTS', '2024-02-01T00:00:00') == 100.0
@@ -0,0 +1,75 @@
+import db
+import ledger
+
+
+def _investment(user_id):
+    def create(cur):
+        plan_id = cur.execute("INSERT INTO investment_plans (plan_name, minimum_amount, profit_amount, duration_days) "
+                              "VALUES ('Test plan', 10, 0, 30)").lastrowid
+        return cur.execute("INSERT INTO investments (user_id, plan_id, status, amount_usd, current_profit, created_at) "
+                           "VALUES (?, ?, 'active', 10, 0, datetime('now'))", (user_id, plan_id)).lastrowid
+    return db.write_transaction(create)
+
+
+def _state(inv_id, user_id):
+    conn = db.get_db(readonly=True)
+    try:
+        profit = conn.execute('SELECT current_profit FROM investments WHERE id = ?', (inv_id,)).fetchone()[0]
+        balance = conn.execute('SELECT balance FROM users WHERE id = ?', (user_id,)).fetchone()[0]
+        entries = conn.execute("SELECT COUNT(*) FROM ledger_entries WHERE ref = ?", (f'investment:{inv_id}',)).fetchone()[0]
+    finally:
+        conn.close()
+    return profit, balance, entries
+
+
+def test_resubmitted_edit_with_different_amount_changes_nothing(admin_client):
+    conn = db.get_db(readonly=True)
+    user_id = conn.execute("SELECT id FROM users WHERE username = 'admin'").fetchone()[0]
+    conn.close()
+    inv_id = _investment(user_id)
+    _, opening, _ = _state(inv_id, user_id)
+
+    admin_client.post(f'/admin/investments/{inv_id}/edit', data={'current_profit': '5', 'idempotency_key': 'form-1'})
+    admin_client.post(f'/admin/investments/{inv_id}/edit', data={'current_profit': '8', 'idempotency_key': 'form-1'})
+
+    profit, balance, entries = _state(inv_id, user_id)
+    assert profit == 5
+    assert balance - (opening or 0) == 5
+    assert entries == 1
+    assert ledger.reconcile() == []
+
+
+def test_bulk_withdrawal_approval_posts_ledger_entries_in_one_batch(app_module, admin_client, monkeypatch):
+    client = app_module.app.test_client()
+    client.post('/register', data={'username': 'saver', 'password': 'pw', 'phone': 'saver-phone'})
+    conn = db.get_db(readonly=True)
+    user_id = conn.execute("SELECT id FROM users WHERE username = 'saver'").fetchone()[0]
+    conn.close()
+
+    def seed(cur):
+        ledger.post(cur, user_id, 100, 'deposit', key=f'test-deposit:{user_id}')
+        return [cur.execute("INSERT INTO withdrawals (user_id, amount, status, requested_at) "
+                            "VALUES (?, ?, 'pending', datetime('now'))", (user_id, amount)).lastrowid
+                for amount in (30, 40, 50)]
+    first, second, third = db.write_transaction(seed)
+
+    def one_by_one(*args, **kwargs):
+        raise AssertionError('bulk approval must not post entries one at a time')
+    monkeypatch.setattr(ledger, 'post', one_by_one)
+
+    resp = admin_client.post('/admin/withdrawals/bulk', json={'action': 'approve', 'ids': [first, second, third]})
+    outcomes = {r['id']: r['outcome'] for r in resp.get_json()['results']}
+    assert outcomes == {first: 'approved', second: 'approved', third: 'insufficient balance'}
+
+    admin_client.post('/admin/withdrawals/bulk', json={'action': 'approve', 'ids': [first, second]})
+
+    conn = db.get_db(readonly=True)
+    try:
+        balance = conn.execute('SELECT balance FROM users WHERE id = ?', (user_id,)).fetchone()[0]
+        keys = [r[0] for r in conn.execute("SELECT idempotency_key FROM ledger_entries WHERE user_id = ? AND kind = 'withdrawal' "
+                                           "ORDER BY id", (user_id,))]
+    finally:
+        conn.close()
+    assert balance == 30
+    assert keys == [f'withdrawal:{first}', f'withdrawal:{second}']
+    assert ledger.reconcile() == []
@@ -0,0 +1,13 @@
+import time
+
+import logqueue
+
+
+def test_flush_includes_rows_the_writer_already_picked_up(app_module):
+    for _ in range(5):
+        logqueue.enqueue('node', 'option', None, '{}')
+        # give the background writer time to wake, but not to finish its batch wait
+        time.sleep(logqueue.BATCH_WAIT / 5)
+        logqueue.flush()
+        stats = logqueue.stats()
+        assert stats['written'] == stats['queued'] - stats['dropped']
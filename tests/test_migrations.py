@@ -0,0 +1,29 @@
+import sqlite3
+
+import db
+import migrations
+import portfolio
+
+
+def test_migrations_do_not_depend_on_live_module_sql(tmp_path, monkeypatch):
+    # a later edit to a module's SQL must not change what an old migration does
+    monkeypatch.setattr(portfolio, '_REFRESH_SQL', 'SELECT broken {where}')
+    for module, name in (('accrual', 'RUNS_DDL'), ('blobstore', 'BLOBS_DDL'), ('currency', 'HISTORY_DDL'),
+                         ('ledger', 'LEDGER_DDL'), ('portfolio', 'SUMMARY_DDL'), ('ratefeed', 'STATUS_DDL')):
+        monkeypatch.setattr(__import__(module), name, 'CREATE TABLE broken (')
+    monkeypatch.setattr(db, 'GENERATIONS_DDL', 'CREATE TABLE broken (')
+    path = str(tmp_path / 'fresh.db')
+    pool = db.ConnectionPool(path, 1)
+    monkeypatch.setattr(db, 'writer_pool', pool)
+    try:
+        assert migrations.migrate() == [version for version, _, _ in migrations.MIGRATIONS]
+    finally:
+        pool.close_all()
+
+    conn = sqlite3.connect(path)
+    try:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    assert {'user_portfolio', 'upload_blobs', 'rate_refresh_status', 'exchange_rate_history',
+            'accrual_runs', 'ledger_entries', 'cache_generations'} <= tables
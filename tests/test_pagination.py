@@ -0,0 +1,18 @@
+import pagination
+
+
+def test_cursor_round_trip():
+    token = pagination.encode_cursor('2030-01-01T00:00:00', 42)
+    assert pagination.decode_cursor(token, 2) == ['2030-01-01T00:00:00', 42]
+
+
+def test_crafted_cursor_values_are_rejected():
+    for values in ([[1]], [{'a': 1}], ['7'], [True], [1.5], [[1], 2], [{'x': 1}, 2]):
+        token = pagination.encode_cursor(*values)
+        assert pagination.decode_cursor(token, len(values)) is None, values
+
+
+def test_crafted_cursor_falls_back_to_the_first_page(admin_client):
+    token = pagination.encode_cursor([1], {'a': 1})
+    assert admin_client.get(f'/admin/assistant/logs?after={token}').status_code == 200
+    assert admin_client.get(f'/?after={pagination.encode_cursor([1])}').status_code == 200
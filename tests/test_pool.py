@@ -0,0 +1,44 @@
+import catalog
+import currency
+import db
+import exports
+
+
+def _single_reader(monkeypatch):
+    """Leave one reader connection, so a route holding it across a cache miss times out."""
+    monkeypatch.setattr(db, 'reader_pool', db.ConnectionPool(db.DB_PATH, 1, readonly=True, timeout=0.5))
+    catalog.invalidate()
+    currency.invalidate_rates()
+
+
+def test_pages_release_reader_before_cached_lookups(admin_client, monkeypatch):
+    plan_id = db.write_transaction(lambda cur: cur.execute(
+        "INSERT INTO investment_plans (plan_name, minimum_amount, profit_amount, duration_days) "
+        "VALUES ('Pool plan', 10, 1, 30)").lastrowid)
+    _single_reader(monkeypatch)
+
+    assert admin_client.get('/dashboard').status_code == 200
+    catalog.invalidate()
+    currency.invalidate_rates()
+    assert admin_client.get(f'/plans/{plan_id}').status_code == 200
+
+
+def test_export_stream_holds_no_reader_between_chunks(admin_client, monkeypatch, tmp_path):
+    db.write_transaction(lambda cur: cur.executemany(
+        "INSERT INTO assistant_logs (node_id, option_id, user_id, metadata, created_at) VALUES (NULL, NULL, NULL, '{}', ?)",
+        [(f'2024-01-01 00:00:{i:02d}',) for i in range(5)]))
+    monkeypatch.setattr(exports, 'EXPORT_FOLDER', str(tmp_path))
+    monkeypatch.setattr(exports, 'CHUNK_ROWS', 2)
+    _single_reader(monkeypatch)
+
+    resp = admin_client.get('/admin/assistant/logs/export?start_date=2024-01-01&end_date=2024-01-02', buffered=False)
+    chunks = iter(resp.response)
+    body = [next(chunks), next(chunks)]
+    # mid-download the only reader is free again
+    db.get_db(readonly=True).close()
+    body.extend(chunks)
+    resp.close()
+
+    lines = b''.join(body).decode().splitlines()
+    assert len(lines) == 6
+    assert lines[1].split(',')[1] == '2024-01-01 00:00:04'
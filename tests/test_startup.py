@@ -0,0 +1,29 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# what a spawned image worker does with `python app.py`: re-run the script as __mp_main__
+WORKER_IMPORT = '''
+import runpy, threading
+runpy.run_path('app.py', run_name='__mp_main__')
+print(sorted(t.name for t in threading.enumerate() if t is not threading.main_thread()))
+'''
+
+
+def test_importing_app_does_not_migrate_or_start_threads(tmp_path):
+    db_path = str(tmp_path / 'worker.db')
+    env = dict(os.environ, APP_DB_PATH=db_path, RATES_REFRESH_INTERVAL='3600',
+               ACCRUAL_CHECK_INTERVAL='3600', LEDGER_RECONCILE_INTERVAL='3600')
+    out = subprocess.run([sys.executable, '-c', WORKER_IMPORT], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+
+    assert out.strip() == '[]'
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            assert conn.execute('PRAGMA user_version').fetchone()[0] == 0
+        finally:
+            conn.close()
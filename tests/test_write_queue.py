@@ -0,0 +1,54 @@
+import sqlite3
+import threading
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    """A write queue of its own on a scratch database, failing fast on a held lock."""
+    monkeypatch.setattr(db, 'BUSY_TIMEOUT_MS', 10)
+    monkeypatch.setattr(db, 'WRITE_BACKOFF', 0.001)
+    path = str(tmp_path / 'queue.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE t (v INTEGER)')
+    conn.commit()
+    conn.close()
+    return db.WriteQueue(path)
+
+
+def test_attempts_bound_busy_retries(queue):
+    blocker = sqlite3.connect(queue.path, isolation_level=None)
+    blocker.execute('BEGIN IMMEDIATE')
+    before = db.transaction_stats['retries']
+    try:
+        future = queue.submit(lambda cur: cur.execute('INSERT INTO t VALUES (1)'), attempts=2)
+        with pytest.raises(sqlite3.OperationalError):
+            future.result(timeout=10)
+    finally:
+        blocker.rollback()
+        blocker.close()
+    assert db.transaction_stats['retries'] - before == 1
+
+
+def test_exclusive_job_gets_a_commit_of_its_own(queue):
+    started, release = threading.Event(), threading.Event()
+
+    def hold(cur):
+        started.set()
+        release.wait(10)
+    blocker = queue.submit(hold)
+    assert started.wait(10)
+
+    # queued while the writer is busy; each job notes how many commits came before it
+    def job(cur):
+        cur.execute('INSERT INTO t VALUES (1)')
+        return queue.batches
+    futures = [queue.submit(job), queue.submit(job), queue.submit(job, exclusive=True),
+               queue.submit(job), queue.submit(job)]
+    release.set()
+    blocker.result(timeout=10)
+
+    assert [f.result(timeout=10) for f in futures] == [1, 1, 2, 3, 3]
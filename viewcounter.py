@@ -0,0 +1,110 @@
+"""Write-behind buffer for plan page view counts.
+
+plan_detail() records a view in memory; a background thread folds the pending
+deltas into plan_stats with one batched UPSERT every FLUSH_INTERVAL seconds, or
+sooner once FLUSH_THRESHOLD views are pending, and once more at shutdown.
+Displayed counts are the persisted total plus the pending delta.
+"""
+import atexit
+import threading
+
+import db
+
+FLUSH_INTERVAL = 5.0
+FLUSH_THRESHOLD = 500
+
+_pending = {}
+_pending_total = 0
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_wakeup = threading.Event()
+_thread = None
+
+# metrics
+flushes = 0
+flushed_views = 0
+flush_errors = 0
+
+UPSERT_SQL = '''INSERT INTO plan_stats (plan_id, total_views, total_investors)
+    SELECT id, ?, 0 FROM investment_plans WHERE id = ?
+    ON CONFLICT(plan_id) DO UPDATE SET total_views = total_views + excluded.total_views'''
+
+
+def _ensure_thread():
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_run, name='plan-view-flusher', daemon=True)
+        _thread.start()
+
+
+def _run():
+    while True:
+        _wakeup.wait(FLUSH_INTERVAL)
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception:
+            # keep the flusher alive; the deltas were put back for the next pass
+            pass
+
+
+def record_view(plan_id):
+    global _pending_total
+    with _lock:
+        _pending[plan_id] = _pending.get(plan_id, 0) + 1
+        _pending_total += 1
+        over = _pending_total >= FLUSH_THRESHOLD
+    _ensure_thread()
+    if over:
+        _wakeup.set()
+
+
+def pending_views(plan_id):
+    return _pending.get(plan_id, 0)
+
+
+def flush():
+    """Write all pending deltas in one transaction. Returns the number of views written."""
+    global _pending, _pending_total, flushes, flushed_views, flush_errors
+    with _flush_lock:
+        with _lock:
+            batch, _pending = _pending, {}
+            _pending_total = 0
+        if not batch:
+            return 0
+        try:
+            db.write_transaction(lambda cur: cur.executemany(UPSERT_SQL, [(count, plan_id) for plan_id, count in batch.items()]))
+        except Exception:
+            flush_errors += 1
+            # merge the batch back so no views are lost
+            with _lock:
+                for plan_id, count in batch.items():
+                    _pending[plan_id] = _pending.get(plan_id, 0) + count
+                    _pending_total += count
+            raise
+        written = sum(batch.values())
+        flushes += 1
+        flushed_views += written
+        return written
+
+
+def stats():
+    return {
+        'pending_views': _pending_total,
+        'pending_plans': len(_pending),
+        'flushes': flushes,
+        'flushed_views': flushed_views,
+        'flush_errors': flush_errors,
+    }
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        pass